@@ -0,0 +1,88 @@
+"""Orders/sec placed one per frame vs in batch frames, served end to end.
+
+The client is in lockstep: it sends the next frame once the previous one is
+answered, after --rtt milliseconds of simulated network round trip. With
+--durable every reply waits for its journal write:
+
+    python -m benchmarks.bench_batch --orders 20000 --rtt 1 [--durable]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import fastapi
+from server.ntpro_server import NTProServer
+from server.order_journal import OrderJournal
+from server.storage import MemoryStorage
+
+BATCH_SIZES = (1, 10, 100, 1000)
+
+
+class ScriptedSocket:
+    def __init__(self, frames: list[str], rtt: float):
+        self.client = 'bench'
+        self.scope = {'subprotocols': []}
+        self.query_params = {}
+        self.frames = frames[::-1]
+        self.rtt = rtt
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def receive(self):
+        if not self.frames:
+            return {'type': 'websocket.disconnect'}
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+        return {'type': 'websocket.receive', 'text': self.frames.pop()}
+
+    async def send_text(self, text):
+        pass
+
+
+def place_order(rng: random.Random) -> dict:
+    return {'messageType': 3, 'message': {'instrument': 2, 'side': rng.choice((1, 2)), 'amount': rng.randint(1, 10),
+                                          'price': rng.randint(3000, 3100) / 100}}
+
+
+def frames(orders: int, size: int) -> list[str]:
+    rng = random.Random(1)
+    messages = [place_order(rng) for _ in range(orders)]
+    if size == 1:
+        return [json.dumps(message) for message in messages]
+    return [json.dumps({'messageType': 9, 'message': {'messages': messages[start:start + size]}})
+            for start in range(0, orders, size)]
+
+
+async def serve(orders: int, size: int, rtt: float, durable: bool) -> float:
+    server = NTProServer(storage=MemoryStorage())
+    server.journal = OrderJournal(server.storage.write_orders, durable=durable)
+    websocket = ScriptedSocket(frames(orders, size), rtt)
+    await server.connect(websocket)
+    started = time.perf_counter()
+    try:
+        await server.serve(websocket)
+    except fastapi.WebSocketDisconnect:
+        pass
+    elapsed = time.perf_counter() - started
+    await server.disconnect(websocket)
+    return orders / elapsed
+
+
+def main(orders: int, rtt: float, durable: bool):
+    for size in BATCH_SIZES:
+        # One order per frame with durable writes waits a flush interval per order.
+        count = min(orders, 200) if durable and size == 1 else orders
+        rate = asyncio.run(serve(count, size, rtt / 1000, durable))
+        print(f'{"single" if size == 1 else f"batch of {size}":<14} {rate:>10.0f} orders/s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--rtt', type=float, default=0, help='simulated round trip, ms')
+    parser.add_argument('--durable', action='store_true', help='reply after the journal write')
+    args = parser.parse_args()
+    main(args.orders, args.rtt, args.durable)
@@ -0,0 +1,66 @@
+"""Quote-to-last-subscriber latency of the market data fan-out.
+
+Subscribes 1k and 10k in-memory sockets to one instrument and measures the
+time from gen_quote() until the last socket has received its frame:
+
+    python -m benchmarks.bench_broadcast --rounds 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+from bidict import bidict
+from server.connection import ClientConnection
+from server.enums import Instrument
+from server.message_processors import gen_quote
+from server.ntpro_server import NTProServer
+from server.order_store import ClientOrders
+from starlette.datastructures import Address
+
+
+class MemorySocket:
+    def __init__(self, number: int):
+        self.client = Address('bench', number)
+        self.received_at = 0.0
+
+    async def send_text(self, text: str):
+        await asyncio.sleep(0)
+        self.received_at = time.perf_counter()
+
+
+def subscribe_all(server: NTProServer, sockets: int) -> list[MemorySocket]:
+    clients = [MemorySocket(number) for number in range(sockets)]
+    for websocket in clients:
+        subscription_id = uuid.uuid4()
+        server.connections[websocket.client] = ClientConnection(websocket)
+        server.orders[websocket.client] = ClientOrders()
+        for instrument in Instrument:
+            server.subscribes.setdefault(websocket.client, bidict())[subscription_id] = instrument
+            server.subscribers[instrument][websocket.client] = subscription_id
+            subscription_id = uuid.uuid4()
+    return clients
+
+
+async def main(rounds: int):
+    for sockets in (1_000, 10_000):
+        server = NTProServer()
+        clients = subscribe_all(server, sockets)
+        latencies = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            await gen_quote(server, Instrument.eur_usd)
+            while any(client.received_at < started for client in clients):
+                await asyncio.sleep(0)
+            latencies.append(max(client.received_at for client in clients) - started)
+        for connection in server.connections.values():
+            connection.close()
+        print(f'{sockets:>6} sockets: median {statistics.median(latencies) * 1000:8.2f} ms  '
+              f'max {max(latencies) * 1000:8.2f} ms to the last subscriber')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=20)
+    asyncio.run(main(parser.parse_args().rounds))
@@ -0,0 +1,48 @@
+"""Orders/sec through the shared database pool with 1, 10 and 100 concurrent clients.
+
+Requires a migrated Postgres database configured through the usual DB_* variables:
+
+    python -m benchmarks.bench_db_pool --orders 2000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from decimal import Decimal
+
+from server.enums import Instrument, OrderSide
+from server.models.base import OrderIn
+from server.models.dbase import database
+from server.utils import write_orders
+
+
+async def run_client(number: int, orders: int):
+    for _ in range(orders):
+        order = OrderIn(side=OrderSide.buy, price=Decimal('35.5'), amount=10, instrument=Instrument.eur_usd)
+        await write_orders([dict(uuid=uuid.uuid4(), address=f'bench:{number}', **order.dict())], [])
+
+
+async def run(clients: int, total_orders: int) -> float:
+    per_client = max(total_orders // clients, 1)
+    started = time.perf_counter()
+    await asyncio.gather(*(run_client(number, per_client) for number in range(clients)))
+    return per_client * clients / (time.perf_counter() - started)
+
+
+async def main(total_orders: int):
+    await database.connect()
+    try:
+        for clients in (1, 10, 100):
+            rate = await run(clients, total_orders)
+            stats = database.stats.as_dict()
+            print(f'{clients:>4} clients: {rate:>9.1f} orders/sec  '
+                  f'peak in use {stats["peak_in_use"]}/{stats["max_size"]}  '
+                  f'max acquire wait {stats["acquire_wait_max"] * 1000:.2f} ms')
+    finally:
+        await database.disconnect()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=2000)
+    asyncio.run(main(parser.parse_args().orders))
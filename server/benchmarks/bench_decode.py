@@ -0,0 +1,38 @@
+"""Client frame decode time per message type: ClientEnvelope two-pass parsing vs the dispatching decoder.
+
+    python -m benchmarks.bench_decode --repeat 20000
+"""
+import argparse
+import json
+import timeit
+
+from server import decoders
+from server.models import client_messages
+
+FRAMES = {
+    'SubscribeMarketData': r'{"messageType": 1, "message": {"instrument": 1}}',
+    'UnsubscribeMarketData': r'{"messageType": 2, "message": {"subscriptionId": "0c11e37fc1e1433ea2732c39600ea577"}}',
+    'PlaceOrder': r'{"messageType": 3, "message": {"instrument": 2, "side": 1, "amount": 3, "price": 20.5}}',
+    'CancelOrder': r'{"messageType": 4, "message": {"orderId": "0c11e37fc1e1433ea2732c39600ea577"}}',
+    'GetOrders': r'{"messageType": 5, "message": {}}',
+    'GetMarketDataSnapshot': r'{"messageType": 7, "message": {"instrument": 1, "depth": 3}}',
+}
+
+
+def envelope_decode(raw):
+    return client_messages.ClientEnvelope.parse_obj(json.loads(raw)).get_parsed_message()
+
+
+def main(repeat: int):
+    print(f'{"message":<24} {"envelope":>12} {"decoder":>12} {"msgs/s":>10}')
+    for name, raw in FRAMES.items():
+        timings = [min(timeit.repeat(lambda: decode(raw), number=repeat, repeat=3)) / repeat
+                   for decode in (envelope_decode, decoders.decode)]
+        print(f'{name:<24} {timings[0] * 1e6:9.2f} us {timings[1] * 1e6:9.2f} us {1 / timings[1]:10.0f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=20000)
+    args = parser.parse_args()
+    main(args.repeat)
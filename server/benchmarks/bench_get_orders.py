@@ -0,0 +1,74 @@
+"""GetOrders cost for a client with many orders: the old single-frame reply vs
+indexed queries, cursor pages and the streamed reply.
+
+The "stall" is the longest stretch the event loop spends on one frame.
+
+    python -m benchmarks.bench_get_orders --orders 100000
+"""
+import argparse
+import random
+import time
+import uuid
+from decimal import Decimal
+
+from server import serializers
+from server.enums import Instrument, OrderSide, OrderStatus
+from server.message_processors import orders_out
+from server.models import server_messages
+from server.models.base import OrderOut
+from server.order_store import GET_ORDERS_FRAME_SIZE, ClientOrders
+from server.records import OrderRecord, to_fixed
+
+
+def make_orders(count: int) -> ClientOrders:
+    orders = ClientOrders()
+    for _ in range(count):
+        order_id = uuid.uuid4()
+        orders.add(order_id, OrderRecord(random.choice(list(Instrument)), random.choice(list(OrderSide)),
+                                         to_fixed(Decimal(random.randint(1, 100))), random.randint(1, 10)))
+        if random.random() < 0.99:
+            orders.set_status(order_id, random.choice([OrderStatus.filled, OrderStatus.rejected,
+                                                       OrderStatus.cancelled]))
+    return orders
+
+
+def timed(action) -> float:
+    started = time.perf_counter()
+    action()
+    return time.perf_counter() - started
+
+
+def single_frame(orders: ClientOrders):
+    serializers.serialize(server_messages.OrdersList(
+        orders=[OrderOut(uuid=order_id, **order.row()) for order_id, order in orders.items()]))
+
+
+def streamed(orders: ClientOrders) -> float:
+    page, _ = orders.query()
+    return max(timed(lambda: serializers.serialize(server_messages.OrdersList(
+        orders=orders_out(page[start:start + GET_ORDERS_FRAME_SIZE]), partial=True)))
+        for start in range(0, len(page), GET_ORDERS_FRAME_SIZE))
+
+
+def main(count: int):
+    orders = make_orders(count)
+    print(f'{count} orders, {orders.count(OrderStatus.active)} active')
+    print(f'single OrdersList frame        stall {timed(lambda: single_frame(orders)) * 1000:9.2f} ms')
+    print(f'streamed, {GET_ORDERS_FRAME_SIZE} per frame       stall {streamed(orders) * 1000:9.2f} ms')
+
+    queries = {
+        'active orders': dict(status=OrderStatus.active),
+        'active EUR/USD': dict(status=OrderStatus.active, instrument=Instrument.eur_usd),
+        'first page of 100': dict(limit=100),
+        'page of 100 at the end': dict(after=count - 200, limit=100),
+    }
+    for name, query in queries.items():
+        seconds = timed(lambda: serializers.serialize(server_messages.OrdersList(
+            orders=orders_out(orders.query(**query)[0]))))
+        print(f'{name:<30} query+encode {seconds * 1000:9.2f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=100_000)
+    main(parser.parse_args().orders)
@@ -0,0 +1,113 @@
+"""What idle connections cost the server: memory, tasks, CPU and loop wakeups.
+
+Opens --connections websockets that send nothing, each with its reader running
+like the websocket endpoint does, then leaves the loop alone for --duration
+seconds:
+
+    python -m benchmarks.bench_idle --connections 10000 --duration 10
+
+Quote generation is off unless --market-data is given, so that the numbers
+are the cost of the connections and the background tasks alone.
+"""
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+
+import fastapi
+from server.ntpro_server import NTProServer
+from server.storage import MemoryStorage
+
+
+class IdleSocket:
+    def __init__(self, number: int):
+        self.client = ('idle', number)
+        self.scope = {'subprotocols': []}
+        self.query_params = {}
+        self.closed = asyncio.get_running_loop().create_future()
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def receive(self):
+        await self.closed
+        return {'type': 'websocket.disconnect'}
+
+    async def send_text(self, text):
+        pass
+
+
+async def serve(server: NTProServer, websocket: IdleSocket):
+    try:
+        await server.serve(websocket)
+    except fastapi.WebSocketDisconnect:
+        pass
+
+
+class WakeupCounter:
+    """Counts how often the loop returns from waiting for I/O or a timer."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.count = 0
+        self.selector = loop._selector
+        self.select = self.selector.select
+        self.selector.select = self._select
+
+    def _select(self, timeout=None):
+        self.count += 1
+        return self.select(timeout)
+
+    def remove(self):
+        self.selector.select = self.select
+
+
+async def measure(connections: int, duration: float, market_data: bool):
+    server = NTProServer(storage=MemoryStorage())
+    if not market_data:
+        server.market_data.rates = {}
+    await server.start()
+    await asyncio.sleep(0.1)
+    tasks_before = len(asyncio.all_tasks())
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sockets = [IdleSocket(number) for number in range(connections)]
+    readers = []
+    for websocket in sockets:
+        await server.connect(websocket)
+        readers.append(asyncio.get_running_loop().create_task(serve(server, websocket)))
+    await asyncio.sleep(0.1)
+    gc.collect()
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    tasks = len(asyncio.all_tasks()) - tasks_before
+
+    counter = WakeupCounter(asyncio.get_running_loop())
+    started, cpu_started = time.perf_counter(), time.process_time()
+    await asyncio.sleep(duration)
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    counter.remove()
+
+    for websocket in sockets:
+        websocket.closed.set_result(None)
+    await asyncio.gather(*readers)
+    for websocket in sockets:
+        await server.disconnect(websocket)
+    await server.stop()
+
+    print(f'{connections} idle connections')
+    print(f'  memory   {memory / connections:10.0f} bytes/connection')
+    print(f'  tasks    {tasks / connections:10.2f} per connection')
+    print(f'  cpu      {cpu / elapsed * 100:10.3f} %')
+    # One of the wakeups per second is the sleep of this benchmark.
+    print(f'  wakeups  {counter.count / elapsed:10.1f} per second')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--connections', type=int, default=10_000)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--market-data', action='store_true', help='keep generating quotes')
+    args = parser.parse_args()
+    asyncio.run(measure(args.connections, args.duration, args.market_data))
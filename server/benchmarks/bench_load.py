@@ -0,0 +1,339 @@
+"""End-to-end load test of the websocket API.
+
+Starts the app in this process (``--mode inprocess``), as a uvicorn
+subprocess (``--mode uvicorn``) or targets a running server (``--url``) and
+drives simulated clients. Every client keeps one request in flight and picks
+the next one from the weighted ``--mix``. Prints a summary to stderr and the
+results as JSON to stdout or ``--output``:
+
+    python -m benchmarks.bench_load --clients 100 --duration 30 --mix subscribe=1,place=5,cancel=2,get_orders=1
+
+Cancels race the order engine, so some of them are answered with an error
+that the order is already filled or rejected.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import websockets
+
+KINDS = ('subscribe', 'place', 'cancel', 'get_orders')
+REQUEST_TIMEOUT = 10.0
+MEMORY_SAMPLE_INTERVAL = 0.5
+
+SUCCESS, ERROR, EXECUTION_REPORT, MARKET_DATA_UPDATE, ORDERS_LIST = 1, 2, 3, 4, 5
+MARKET_DATA_DELTA = 9
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for item in filter(None, mix.split(',')):
+        kind, weight = item.split('=')
+        if kind.strip() not in KINDS:
+            raise ValueError(f'Unknown message kind {kind!r}, expected one of {", ".join(KINDS)}')
+        weights[kind.strip()] = float(weight)
+    return weights
+
+
+def percentile(ordered: list[float], fraction: float) -> float | None:
+    if not ordered:
+        return None
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def rss(pid: int) -> int | None:
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.timeouts: dict[str, int] = defaultdict(int)
+        self.market_data = 0
+        self.notifications = 0
+        self.failed_clients = 0
+
+
+class Client:
+    def __init__(self, url: str, weights: dict[str, float], stats: Stats, rng: random.Random, think: float):
+        self.url = url
+        self.kinds = list(weights)
+        self.weights = list(weights.values())
+        self.stats = stats
+        self.random = rng
+        self.think = think
+        self.subscriptions: dict[int, str] = {}
+        self.active_orders: set[str] = set()
+        self._pending: tuple | None = None
+
+    async def run(self, deadline: float):
+        try:
+            async with websockets.connect(self.url, max_queue=None, max_size=None) as websocket:
+                reader = asyncio.get_running_loop().create_task(self._read(websocket))
+                try:
+                    while time.perf_counter() < deadline:
+                        await self._request(websocket)
+                        if self.think:
+                            await asyncio.sleep(self.think)
+                finally:
+                    reader.cancel()
+        except (OSError, websockets.WebSocketException):
+            self.stats.failed_clients += 1
+
+    async def _request(self, websocket):
+        kind = self.random.choices(self.kinds, self.weights)[0]
+        instrument = self.random.randint(1, 3)
+        if kind == 'subscribe' and instrument in self.subscriptions:
+            kind, message = 'unsubscribe', {'messageType': 2, 'message': {
+                'subscriptionId': self.subscriptions.pop(instrument)}}
+            matches = self._reply_of(SUCCESS)
+        elif kind == 'subscribe':
+            message = {'messageType': 1, 'message': {'instrument': instrument}}
+            matches = self._reply_of(SUCCESS)
+        elif kind == 'cancel' and self.active_orders:
+            order_id = self.random.choice(list(self.active_orders))
+            message = {'messageType': 4, 'message': {'orderId': order_id}}
+            matches = self._cancel_reply(order_id)
+        elif kind == 'get_orders':
+            message = {'messageType': 5, 'message': {'limit': 100}}
+            matches = self._orders_reply
+        else:
+            kind, message = 'place', {'messageType': 3, 'message': {
+                'instrument': instrument, 'side': self.random.randint(1, 2),
+                'amount': self.random.randint(1, 10), 'price': round(self.random.uniform(30, 40), 2)}}
+            matches = self._place_reply
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending = (matches, future)
+        started = time.perf_counter()
+        await websocket.send(json.dumps(message))
+        try:
+            reply = await asyncio.wait_for(future, REQUEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.stats.timeouts[kind] += 1
+            return
+        finally:
+            self._pending = None
+        self.stats.latencies[kind].append(time.perf_counter() - started)
+        if reply['messageType'] == ERROR:
+            self.stats.errors[kind] += 1
+        elif kind == 'subscribe':
+            self.subscriptions[instrument] = reply['message']['subscriptionId']
+
+    @staticmethod
+    def _reply_of(message_type: int):
+        return lambda message: message['messageType'] in (message_type, ERROR)
+
+    @staticmethod
+    def _place_reply(message: dict) -> bool:
+        return message['messageType'] == ERROR or (
+            message['messageType'] == EXECUTION_REPORT and message['message']['orderStatus'] == 'active')
+
+    @staticmethod
+    def _cancel_reply(order_id: str):
+        return lambda message: message['messageType'] == ERROR or (
+            message['messageType'] == EXECUTION_REPORT and message['message']['orderId'] == order_id
+            and message['message']['orderStatus'] == 'cancelled')
+
+    @staticmethod
+    def _orders_reply(message: dict) -> bool:
+        return message['messageType'] == ERROR or (
+            message['messageType'] == ORDERS_LIST and not message['message'].get('partial'))
+
+    async def _read(self, websocket):
+        async for raw in websocket:
+            message = json.loads(raw)
+            if message['messageType'] in (MARKET_DATA_UPDATE, MARKET_DATA_DELTA):
+                self.stats.market_data += 1
+                continue
+            if message['messageType'] == EXECUTION_REPORT:
+                report = message['message']
+                if report['orderStatus'] == 'active':
+                    self.active_orders.add(report['orderId'])
+                else:
+                    self.active_orders.discard(report['orderId'])
+            if self._pending is not None and self._pending[0](message) and not self._pending[1].done():
+                self._pending[1].set_result(message)
+            else:
+                self.stats.notifications += 1
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+async def wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+        else:
+            writer.close()
+            return
+
+
+async def sample_memory(pid: int, samples: list[int]):
+    while True:
+        value = rss(pid)
+        if value is not None:
+            samples.append(value)
+        await asyncio.sleep(MEMORY_SAMPLE_INTERVAL)
+
+
+async def drive(url: str, pid: int | None, args: argparse.Namespace) -> dict:
+    weights = parse_mix(args.mix)
+    stats = Stats()
+    rng = random.Random(args.seed)
+    clients = [Client(url, weights, stats, random.Random(rng.random()), args.think) for _ in range(args.clients)]
+
+    memory = []
+    sampler = asyncio.get_running_loop().create_task(sample_memory(pid, memory)) if pid else None
+    started = time.perf_counter()
+    deadline = started + args.ramp + args.duration
+    tasks = []
+    for client in clients:
+        tasks.append(asyncio.get_running_loop().create_task(client.run(deadline)))
+        if args.ramp:
+            await asyncio.sleep(args.ramp / len(clients))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    if sampler is not None:
+        sampler.cancel()
+
+    per_type = {}
+    for kind in sorted(set(stats.latencies) | set(stats.timeouts)):
+        latencies = sorted(stats.latencies[kind])
+        per_type[kind] = {
+            'count': len(latencies),
+            'errors': stats.errors[kind],
+            'timeouts': stats.timeouts[kind],
+            'per_second': len(latencies) / elapsed,
+            'p50_ms': _ms(percentile(latencies, 0.5)),
+            'p99_ms': _ms(percentile(latencies, 0.99)),
+            'p999_ms': _ms(percentile(latencies, 0.999)),
+            'max_ms': _ms(latencies[-1] if latencies else None),
+        }
+    requests = sum(entry['count'] for entry in per_type.values())
+    return {
+        'config': {'url': url, 'mode': args.mode, 'clients': args.clients, 'duration': args.duration,
+                   'ramp': args.ramp, 'mix': weights, 'think': args.think, 'storage': args.storage},
+        'elapsed': elapsed,
+        'requests': requests,
+        'requests_per_second': requests / elapsed,
+        'market_data_per_second': stats.market_data / elapsed,
+        'notifications': stats.notifications,
+        'failed_clients': stats.failed_clients,
+        'per_type': per_type,
+        'memory': {
+            'start_bytes': memory[0] if memory else None,
+            'end_bytes': memory[-1] if memory else None,
+            'peak_bytes': max(memory) if memory else None,
+            'growth_bytes': memory[-1] - memory[0] if memory else None,
+        },
+    }
+
+
+def _ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+async def run_inprocess(args: argparse.Namespace) -> dict:
+    # The clients share the process and the CPU with the server.
+    os.environ.setdefault('STORAGE', args.storage)
+    import uvicorn
+    from server.app import api
+
+    port = args.port or free_port()
+    server = uvicorn.Server(uvicorn.Config(api, host='127.0.0.1', port=port, log_level='warning'))
+    task = asyncio.get_running_loop().create_task(server.serve())
+    await wait_for_port(port)
+    try:
+        return await drive(f'ws://127.0.0.1:{port}/ws/', os.getpid(), args)
+    finally:
+        server.should_exit = True
+        await task
+
+
+async def run_uvicorn(args: argparse.Namespace) -> dict:
+    port = args.port or free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'server.app:api', '--port', str(port), '--log-level', 'warning'],
+        env={**os.environ, 'STORAGE': os.environ.get('STORAGE', args.storage)})
+    try:
+        await wait_for_port(port)
+        return await drive(f'ws://127.0.0.1:{port}/ws/', process.pid, args)
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def summary(results: dict) -> str:
+    lines = [f'{results["requests_per_second"]:.1f} requests/sec, '
+             f'{results["market_data_per_second"]:.1f} market data messages/sec, '
+             f'{results["failed_clients"]} failed clients']
+    for kind, entry in results['per_type'].items():
+        lines.append(f'  {kind:<12} {entry["count"]:>8} ok {entry["errors"]:>6} errors {entry["timeouts"]:>4} timeouts  '
+                     f'p50 {entry["p50_ms"]} ms  p99 {entry["p99_ms"]} ms  p999 {entry["p999_ms"]} ms')
+    memory = results['memory']
+    if memory['growth_bytes'] is not None:
+        lines.append(f'  memory {memory["start_bytes"] / 2 ** 20:.1f} -> {memory["end_bytes"] / 2 ** 20:.1f} MiB, '
+                     f'peak {memory["peak_bytes"] / 2 ** 20:.1f} MiB')
+    return '\n'.join(lines)
+
+
+async def main(args: argparse.Namespace):
+    if args.url:
+        args.mode = 'external'
+        results = await drive(args.url, args.pid, args)
+    elif args.mode == 'uvicorn':
+        results = await run_uvicorn(args)
+    else:
+        results = await run_inprocess(args)
+
+    print(summary(results), file=sys.stderr)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mode', choices=['inprocess', 'uvicorn'], default='inprocess')
+    parser.add_argument('--url', help='drive an already running server, e.g. ws://127.0.0.1:8000/ws/')
+    parser.add_argument('--pid', type=int, help='pid of that server, to track its memory')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--storage', default='memory', help='STORAGE of the started server')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--ramp', type=float, default=1, help='seconds to spread the connects over')
+    parser.add_argument('--mix', default='subscribe=1,place=5,cancel=2,get_orders=1')
+    parser.add_argument('--think', type=float, default=0, help='pause between the requests of a client')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    asyncio.run(main(parser.parse_args()))
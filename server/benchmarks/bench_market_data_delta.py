@@ -0,0 +1,47 @@
+"""Frame size and encode time of a full MarketDataUpdate vs a one-quote MarketDataDelta by window depth.
+
+    python -m benchmarks.bench_market_data_delta --depths 10 100 1000 --repeat 2000
+"""
+import argparse
+import timeit
+from decimal import Decimal
+from random import uniform
+
+from server import binary_protocol, serializers
+from server.enums import Instrument
+from server.message_processors import BROADCAST_SUBSCRIPTION_ID
+from server.models import server_messages
+from server.models.base import Quote
+
+
+def random_quote() -> Quote:
+    return Quote(bid=Decimal.from_float(uniform(30, 40)), offer=Decimal.from_float(uniform(30, 40)),
+                 min_amount=Decimal.from_float(uniform(30, 40)), max_amount=Decimal.from_float(uniform(30, 40)))
+
+
+def main(depths: list[int], repeat: int):
+    print(f'{"depth":>6} {"message":<18} {"json bytes":>10} {"json encode":>14} '
+          f'{"binary bytes":>12} {"binary encode":>14}')
+    for depth in depths:
+        quotes = [random_quote() for _ in range(depth)]
+        messages = [
+            server_messages.MarketDataUpdate(subscription_id=BROADCAST_SUBSCRIPTION_ID, instrument=Instrument.eur_usd,
+                                             quotes=quotes, sequence=depth),
+            server_messages.MarketDataDelta(subscription_id=BROADCAST_SUBSCRIPTION_ID, instrument=Instrument.eur_usd,
+                                            sequence=depth, quotes=quotes[-1:], removed=1),
+        ]
+        for message in messages:
+            row = [f'{depth:>6} {message.__class__.__name__:<18}']
+            for encode in (serializers.serialize, binary_protocol.encode):
+                size = len(encode(message))
+                seconds = min(timeit.repeat(lambda: encode(message), number=repeat, repeat=3)) / repeat
+                row.append(f'{size:>10} {seconds * 1e6:11.2f} us')
+            print(' '.join(row))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--depths', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+    main(args.depths, args.repeat)
@@ -0,0 +1,86 @@
+"""Bytes per quote and per order: pydantic models vs the compact records.
+
+Holds --count quotes and orders in each representation and reports the traced
+memory per item and how long a full garbage collection takes with them alive:
+
+    python -m benchmarks.bench_memory --count 1000000
+
+Quotes are compared as a list of ``Quote`` models with ``Decimal.from_float``
+prices (what the history used to keep) against a ``QuoteHistory`` of the same
+capacity; orders as ``OrderIn`` models against ``OrderRecord``.
+"""
+import argparse
+import datetime
+import gc
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+
+from server.enums import Instrument, OrderSide
+from server.models.base import OrderIn, Quote
+from server.quote_history import QuoteHistory
+from server.records import OrderRecord, to_fixed, to_ns
+
+START = datetime.datetime(2023, 1, 1)
+
+
+def quote_models(count: int, rng: random.Random) -> list:
+    quotes = []
+    for number in range(count):
+        values = sorted(rng.uniform(30, 40) for _ in range(4))
+        quotes.append(Quote.construct(
+            bid=Decimal.from_float(values[1]), offer=Decimal.from_float(values[2]),
+            min_amount=Decimal.from_float(values[0]), max_amount=Decimal.from_float(values[3]),
+            timestamp=START + datetime.timedelta(microseconds=number)))
+    return quotes
+
+
+def quote_history(count: int, rng: random.Random) -> QuoteHistory:
+    history = QuoteHistory(count)
+    for number in range(count):
+        min_amount, bid, offer, max_amount = sorted(to_fixed(rng.uniform(30, 40)) for _ in range(4))
+        history.append(bid, offer, min_amount, max_amount, to_ns(START + datetime.timedelta(microseconds=number)))
+    return history
+
+
+def order_fields(number: int, rng: random.Random) -> dict:
+    created = START + datetime.timedelta(microseconds=number)
+    return dict(instrument=rng.choice(list(Instrument)), side=rng.choice(list(OrderSide)),
+                price=Decimal(rng.randint(3000, 4000)) / 100, amount=rng.randint(1, 100),
+                creation_time=created, change_time=created)
+
+
+def order_models(count: int, rng: random.Random) -> list:
+    return [OrderIn.construct(**order_fields(number, rng)) for number in range(count)]
+
+
+def order_records(count: int, rng: random.Random) -> list:
+    return [OrderRecord.from_model(OrderIn.construct(**order_fields(number, rng))) for number in range(count)]
+
+
+def measure(build, count: int) -> tuple[float, float]:
+    gc.collect()
+    tracemalloc.start()
+    held = build(count, random.Random(1))
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    started = time.perf_counter()
+    gc.collect()
+    collect = time.perf_counter() - started
+    del held
+    return memory / count, collect
+
+
+def main(count: int):
+    for kind, candidates in (('quote', (('Quote models', quote_models), ('QuoteHistory', quote_history))),
+                             ('order', (('OrderIn models', order_models), ('OrderRecord', order_records)))):
+        for name, build in candidates:
+            per_item, collect = measure(build, count)
+            print(f'{name:<15} {count} {kind}s  {per_item:8.1f} bytes/{kind}  full gc {collect * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=1_000_000)
+    main(parser.parse_args().count)
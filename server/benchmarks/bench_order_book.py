@@ -0,0 +1,62 @@
+"""Matching throughput and latency of OrderBook with a deep book.
+
+Rests --resting sell orders over --levels price levels, then sends crossing
+buy orders of random size and reports orders/sec and latency percentiles.
+Prices are fixed-point integers as in the server; --decimal uses Decimal
+prices instead for comparison:
+
+    python -m benchmarks.bench_order_book --resting 1000000 [--decimal]
+"""
+import argparse
+import random
+import time
+import uuid
+from decimal import Decimal
+
+from server.enums import OrderSide
+from server.order_book import OrderBook
+from server.records import to_fixed
+
+
+def percentile(samples: list, fraction: float) -> float:
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def main(resting: int, levels: int, incoming: int, decimal: bool):
+    rng = random.Random(1)
+    prices = [Decimal(100) + Decimal(level) / 100 for level in range(levels)]
+    if not decimal:
+        prices = [to_fixed(price) for price in prices]
+    book = OrderBook()
+
+    started = time.perf_counter()
+    for _ in range(resting):
+        book.add(uuid.uuid4(), OrderSide.sell, rng.choice(prices), rng.randint(1, 10))
+    print(f'rested {len(book)} orders in {time.perf_counter() - started:.1f}s')
+
+    latencies = []
+    fills = 0
+    started = time.perf_counter()
+    for _ in range(incoming):
+        order_id, price, amount = uuid.uuid4(), rng.choice(prices), rng.randint(1, 20)
+        order_started = time.perf_counter()
+        fills += len(book.add(order_id, OrderSide.buy, price, amount))
+        book.cancel(order_id)
+        latencies.append(time.perf_counter() - order_started)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f'{incoming / elapsed:,.0f} orders/sec, {fills} fills, '
+          f'p50 {percentile(latencies, 0.5) * 1e6:.1f} us, '
+          f'p99 {percentile(latencies, 0.99) * 1e6:.1f} us, '
+          f'max {latencies[-1] * 1e6:.1f} us')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resting', type=int, default=1_000_000)
+    parser.add_argument('--levels', type=int, default=1000)
+    parser.add_argument('--incoming', type=int, default=100_000)
+    parser.add_argument('--decimal', action='store_true', help='Decimal prices instead of fixed-point')
+    args = parser.parse_args()
+    main(args.resting, args.levels, args.incoming, args.decimal)
@@ -0,0 +1,73 @@
+"""Order persistence with one INSERT per order vs. the write-behind journal.
+
+Requires a migrated Postgres database configured through the usual DB_* variables:
+
+    python -m benchmarks.bench_order_journal --clients 100 --orders 5000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from decimal import Decimal
+
+from server.enums import Instrument, OrderSide
+from server.models.dbase import database
+from server.order_journal import OrderJournal
+from server.records import OrderRecord, to_fixed
+from server.utils import write_orders
+
+
+def new_order():
+    return OrderRecord(Instrument.eur_usd, OrderSide.buy, to_fixed(Decimal('35.5')), 10)
+
+
+async def inline_client(number: int, orders: int, latencies: list):
+    for _ in range(orders):
+        order = new_order()
+        started = time.perf_counter()
+        await write_orders([dict(uuid=uuid.uuid4(), address=f'bench:{number}', **order.row())], [])
+        latencies.append(time.perf_counter() - started)
+
+
+async def journal_client(journal: OrderJournal, number: int, orders: int, latencies: list):
+    for _ in range(orders):
+        started = time.perf_counter()
+        await journal.insert(f'bench:{number}', uuid.uuid4(), new_order())
+        latencies.append(time.perf_counter() - started)
+
+
+def report(name: str, total: int, elapsed: float, latencies: list):
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f'{name:<16} {total / elapsed:>10.1f} orders/sec  p99 reply latency {p99:.3f} ms')
+
+
+async def main(clients: int, total_orders: int):
+    per_client = max(total_orders // clients, 1)
+    total = per_client * clients
+    await database.connect()
+    try:
+        latencies = []
+        started = time.perf_counter()
+        await asyncio.gather(*(inline_client(number, per_client, latencies) for number in range(clients)))
+        report('inline', total, time.perf_counter() - started, latencies)
+
+        for durable in (False, True):
+            journal = OrderJournal(write_orders, durable=durable)
+            await journal.start()
+            latencies = []
+            started = time.perf_counter()
+            await asyncio.gather(*(journal_client(journal, number, per_client, latencies)
+                                   for number in range(clients)))
+            await journal.stop()
+            report('journal durable' if durable else 'journal', total, time.perf_counter() - started, latencies)
+    finally:
+        await database.disconnect()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=100)
+    parser.add_argument('--orders', type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.clients, args.orders))
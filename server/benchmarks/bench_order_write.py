@@ -0,0 +1,51 @@
+"""Per-order database latency of the journal writes with and without the
+prepared statement cache (DB_PREPARED_STATEMENTS).
+
+Every order is inserted and then updated in its own transaction, as the
+journal does under light load. Requires a migrated Postgres database
+configured through the usual DB_* variables:
+
+    python -m benchmarks.bench_order_write --orders 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+from server import utils
+from server.enums import Instrument, OrderSide, OrderStatus
+from server.models.base import OrderIn
+from server.models.dbase import database
+
+
+async def run(orders: int) -> list[float]:
+    timings = []
+    for _ in range(orders):
+        order_id = uuid.uuid4()
+        order = OrderIn(side=OrderSide.buy, price=Decimal('35.5'), amount=10, instrument=Instrument.eur_usd)
+        started = time.perf_counter()
+        await utils.write_orders([dict(uuid=order_id, address='bench:write', account=None, **order.dict())], [])
+        await utils.write_orders([], [dict(uuid=order_id, status=OrderStatus.filled, change_time=order.change_time)])
+        timings.append((time.perf_counter() - started) * 1000 / 2)
+    return sorted(timings)
+
+
+async def main(orders: int):
+    await database.connect()
+    try:
+        for prepared in (False, True):
+            utils.DB_PREPARED_STATEMENTS = prepared
+            await run(min(orders, 100))
+            timings = await run(orders)
+            print(f'prepared={prepared!s:<5}  p50 {statistics.median(timings):.3f} ms  '
+                  f'p99 {timings[int(len(timings) * 0.99) - 1]:.3f} ms  per write')
+    finally:
+        await database.disconnect()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=2000)
+    asyncio.run(main(parser.parse_args().orders))
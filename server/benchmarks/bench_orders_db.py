@@ -0,0 +1,102 @@
+"""Latency of the server's order queries against a seeded orders table.
+
+Requires a migrated Postgres database configured through the usual DB_*
+variables. Seeds ``--rows`` orders of ``--accounts`` accounts (1% active,
+creation times spread over a year) unless the table already holds them,
+then times every query and prints the plan's top node:
+
+    python -m benchmarks.bench_orders_db --rows 10000000
+"""
+import argparse
+import asyncio
+import datetime
+import enum
+import json
+import random
+import statistics
+import time
+
+from server.models.dbase import database
+from server.utils import account_orders_query, read_order, retention_batch_query
+from sqlalchemy.dialects import postgresql
+
+SEED_CHUNK = 1_000_000
+SEED_QUERY = '''
+INSERT INTO orders (uuid, instrument, side, status, amount, price, address, account, creation_time, change_time)
+SELECT md5('bench' || i)::uuid,
+       (ARRAY['eur_usd', 'eur_rub', 'usd_rub'])[1 + i % 3]::instrument,
+       (ARRAY['buy', 'sell'])[1 + i % 2]::orderside,
+       (CASE WHEN i % 100 = 0 THEN 'active'
+             ELSE (ARRAY['filled', 'rejected', 'cancelled'])[1 + i % 3] END)::orderstatus,
+       1 + i % 10,
+       30 + (i % 1000) / 100.0,
+       'bench:' || i % :accounts,
+       'bench-' || i % :accounts,
+       timestamp '2025-01-01' + i * (interval '1 year' / :rows),
+       timestamp '2025-01-01' + i * (interval '1 year' / :rows) + interval '10 seconds'
+FROM generate_series(:start, :stop - 1) AS i
+ON CONFLICT DO NOTHING
+'''
+
+
+def compiled(query) -> tuple[str, dict]:
+    statement = query.compile(dialect=postgresql.dialect(paramstyle='named'))
+    # Raw SQL is sent without column types, so enums go as their labels.
+    return str(statement), {name: value.name if isinstance(value, enum.Enum) else value
+                            for name, value in statement.params.items()}
+
+
+async def seed(rows: int, accounts: int):
+    async with database.connection() as connection:
+        present = await connection.fetch_val("SELECT count(*) FROM orders WHERE address LIKE 'bench:%'")
+        if present >= rows:
+            return
+        for start in range(0, rows, SEED_CHUNK):
+            started = time.perf_counter()
+            await connection.execute(SEED_QUERY, values={
+                'accounts': accounts, 'rows': rows, 'start': start, 'stop': min(start + SEED_CHUNK, rows)})
+            print(f'seeded {min(start + SEED_CHUNK, rows):>10} rows in {time.perf_counter() - started:.1f} s')
+        await connection.execute('ANALYZE orders')
+
+
+async def measure(name: str, query, runs: int):
+    sql, values = compiled(query)
+    async with database.connection() as connection:
+        plan = await connection.fetch_val(f'EXPLAIN (FORMAT JSON) {sql}', values=values)
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            await connection.fetch_all(query)
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    node = (json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']
+    print(f'{name:<18} p50 {statistics.median(timings):>8.2f} ms  '
+          f'p99 {timings[int(len(timings) * 0.99) - 1]:>8.2f} ms  {node["Node Type"]}')
+
+
+async def main(rows: int, accounts: int, runs: int):
+    await database.connect()
+    try:
+        await seed(rows, accounts)
+        account = f'bench-{random.randrange(accounts)}'
+        await measure('active orders', account_orders_query(account, active=True, limit=10000), runs)
+        await measure('history', account_orders_query(account, active=False, limit=10000), runs)
+        await measure('retention batch', retention_batch_query(datetime.datetime(2025, 3, 1), 10000), runs)
+        async with database.connection() as connection:
+            order_id = await connection.fetch_val("SELECT uuid FROM orders WHERE account = :account LIMIT 1",
+                                                  values={'account': account})
+        started = time.perf_counter()
+        for _ in range(runs):
+            await read_order(order_id)
+        print(f'{"order by uuid":<18} avg {(time.perf_counter() - started) / runs * 1000:>8.2f} ms')
+    finally:
+        await database.disconnect()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--accounts', type=int, default=10_000)
+    parser.add_argument('--runs', type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.accounts, args.runs))
@@ -0,0 +1,114 @@
+"""Reply latency per message type under mixed traffic, lockstep vs pipelined.
+
+One connection sends --rate requests per second regardless of the replies:
+placed orders (durable, so the reply waits for a journal flush every
+--flush-ms), cancels of earlier orders, market data snapshots and order lists.
+Latency is measured from the moment a frame is due, so the time it waits
+unread behind slower requests is included:
+
+    python -m benchmarks.bench_pipeline --requests 1000 --rate 200 --flush-ms 20
+
+``in flight 1`` is the old read loop, which processed one request at a time.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import fastapi
+from server.ntpro_server import NTProServer
+from server.order_journal import OrderJournal
+from server.pipeline import PIPELINE_MAX_IN_FLIGHT
+from server.storage import MemoryStorage
+
+MIX = (('place_order', 0.2), ('cancel_order', 0.1), ('market_data_snapshot', 0.5), ('get_orders', 0.2))
+
+
+class PipelinedSocket:
+    def __init__(self, requests: int, rate: float):
+        self.client = 'bench'
+        self.scope = {'subprotocols': []}
+        self.query_params = {}
+        self.rng = random.Random(1)
+        self.kinds = self.rng.choices([kind for kind, _ in MIX], [weight for _, weight in MIX], k=requests)
+        self.interval = 1 / rate
+        self.started = None
+        self.sent = 0
+        self.pending: dict[int, tuple[str, float]] = {}
+        self.latencies: dict[str, list[float]] = {kind: [] for kind, _ in MIX}
+        self.orders: list[str] = []
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    def frame(self, kind: str) -> dict:
+        if kind == 'cancel_order' and self.orders:
+            return {'messageType': 4, 'message': {'orderId': self.orders.pop(self.rng.randrange(len(self.orders)))}}
+        if kind == 'place_order':
+            return {'messageType': 3, 'message': {'instrument': 2, 'side': self.rng.choice((1, 2)), 'amount': 1,
+                                                  'price': self.rng.randint(2000, 2100) / 100}}
+        if kind == 'get_orders':
+            return {'messageType': 5, 'message': {}}
+        return {'messageType': 7, 'message': {'instrument': 1}}
+
+    async def receive(self):
+        if self.started is None:
+            self.started = time.perf_counter()
+        if self.sent == len(self.kinds):
+            return {'type': 'websocket.disconnect'}
+        due = self.started + self.sent * self.interval
+        await asyncio.sleep(max(due - time.perf_counter(), 0))
+        kind = self.kinds[self.sent]
+        frame = dict(self.frame(kind), correlationId=self.sent)
+        self.pending[self.sent] = (kind, due)
+        self.sent += 1
+        return {'type': 'websocket.receive', 'text': json.dumps(frame)}
+
+    async def send_text(self, text):
+        reply = json.loads(text)
+        request = self.pending.pop(reply.get('correlationId'), None)
+        if request is None:
+            return
+        kind, due = request
+        self.latencies[kind].append(time.perf_counter() - due)
+        if kind == 'place_order' and reply['messageType'] == 3 and reply['message']['orderStatus'] == 1:
+            self.orders.append(reply['message']['orderId'])
+
+
+async def serve(requests: int, rate: float, flush: float, max_in_flight: int) -> PipelinedSocket:
+    server = NTProServer(storage=MemoryStorage())
+    server.journal = OrderJournal(server.storage.write_orders, flush_interval=flush, durable=True)
+    server.max_in_flight = max_in_flight
+    websocket = PipelinedSocket(requests, rate)
+    await server.connect(websocket)
+    try:
+        await server.serve(websocket)
+    except fastapi.WebSocketDisconnect:
+        pass
+    await server.disconnect(websocket)
+    return websocket
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    return statistics.quantiles(values, n=100, method='inclusive')[round(fraction * 100) - 1]
+
+
+def main(requests: int, rate: float, flush_ms: float):
+    for max_in_flight in (1, PIPELINE_MAX_IN_FLIGHT):
+        websocket = asyncio.run(serve(requests, rate, flush_ms / 1000, max_in_flight))
+        print(f'in flight {max_in_flight}')
+        for kind, latencies in websocket.latencies.items():
+            if len(latencies) > 1:
+                print(f'  {kind:<22} {len(latencies):5}  p50 {percentile(latencies, 0.5) * 1000:8.2f} ms  '
+                      f'p99 {percentile(latencies, 0.99) * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=200, help='requests per second')
+    parser.add_argument('--flush-ms', type=float, default=20, help='journal flush interval')
+    args = parser.parse_args()
+    main(args.requests, args.rate, args.flush_ms)
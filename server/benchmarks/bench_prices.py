@@ -0,0 +1,50 @@
+"""Quote generation cost and market data payload size: Decimal.from_float vs tick-rounded fixed-point.
+
+    python -m benchmarks.bench_prices --quotes 100000
+"""
+import argparse
+import random
+import time
+import uuid
+from decimal import Decimal
+
+from server import binary_protocol, serializers
+from server.enums import Instrument
+from server.models.base import Quote
+from server.models.server_messages import MarketDataUpdate
+from server.quote_history import MARKET_DATA_QUOTES
+from server.records import now_ns, quote_model, round_to_tick, to_fixed
+
+
+def from_float(rng: random.Random) -> Quote:
+    values = sorted(rng.uniform(30, 40) for _ in range(4))
+    return Quote(bid=Decimal.from_float(values[1]), offer=Decimal.from_float(values[2]),
+                 min_amount=Decimal.from_float(values[0]), max_amount=Decimal.from_float(values[3]))
+
+
+def fixed_point(rng: random.Random) -> tuple:
+    min_amount, bid, offer, max_amount = sorted(round_to_tick(Instrument.eur_usd, to_fixed(rng.uniform(30, 40)))
+                                                for _ in range(4))
+    return bid, offer, min_amount, max_amount, now_ns()
+
+
+def main(quotes: int):
+    # What gen_quote produced before and produces now; models are built only for the payload.
+    for name, generate, model in (('Decimal.from_float', from_float, lambda quote: quote),
+                                  ('fixed-point ticks', fixed_point, lambda quote: quote_model(*quote))):
+        rng = random.Random(1)
+        started = time.perf_counter()
+        for _ in range(quotes):
+            generate(rng)
+        elapsed = time.perf_counter() - started
+        update = MarketDataUpdate(subscription_id=uuid.uuid4(), instrument=Instrument.eur_usd, sequence=1,
+                                  quotes=[model(generate(rng)) for _ in range(MARKET_DATA_QUOTES)])
+        print(f'{name:<20} {elapsed / quotes * 1e6:7.2f} us/quote  '
+              f'update {len(serializers.serialize(update)):5} bytes json, '
+              f'{len(binary_protocol.encode(update)):4} bytes binary')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quotes', type=int, default=100_000)
+    main(parser.parse_args().quotes)
@@ -0,0 +1,60 @@
+"""Memory and MarketDataUpdate cost after a day of quotes: unbounded list vs ring buffer.
+
+Simulates 24h of quotes of one instrument at --rate quotes/sec and reports the
+memory held by the history and the time to encode one MarketDataUpdate:
+
+    python -m benchmarks.bench_quote_history --rate 1
+"""
+import argparse
+import datetime
+import time
+import tracemalloc
+import uuid
+from random import uniform
+
+from server.enums import Instrument
+from server.models.server_messages import MarketDataUpdate
+from server.ntpro_server import NTProServer
+from server.quote_history import MARKET_DATA_QUOTES, QuoteHistory
+from server.records import quote_model, to_fixed, to_ns
+
+DAY = 24 * 60 * 60
+
+
+def simulate(history, quotes: int):
+    started = datetime.datetime(2023, 1, 1)
+    for second in range(quotes):
+        min_amount, bid, offer, max_amount = sorted(to_fixed(uniform(30, 40)) for _ in range(4))
+        quote = bid, offer, min_amount, max_amount, to_ns(started + datetime.timedelta(seconds=second))
+        if isinstance(history, list):
+            history.append(quote_model(*quote))
+        else:
+            history.append(*quote)
+
+
+def encode_time(quotes: list, repeat: int = 5) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        NTProServer.serialize(MarketDataUpdate(
+            subscription_id=uuid.uuid4(), instrument=Instrument.eur_usd, quotes=quotes))
+    return (time.perf_counter() - started) / repeat
+
+
+def main(rate: float):
+    quotes = int(DAY * rate)
+    for name, history, latest in (
+            ('unbounded list', [], lambda history: history),
+            ('ring buffer', QuoteHistory(), lambda history: history.latest(MARKET_DATA_QUOTES))):
+        tracemalloc.start()
+        simulate(history, quotes)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        payload = latest(history)
+        print(f'{name:<15} {quotes} quotes  held {memory / 2 ** 20:9.1f} MiB  '
+              f'MarketDataUpdate with {len(payload)} quotes: {encode_time(payload) * 1000:9.3f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rate', type=float, default=1.0, help='quotes per second')
+    main(parser.parse_args().rate)
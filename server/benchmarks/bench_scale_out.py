@@ -0,0 +1,90 @@
+"""Subscribers per core as the number of workers sharing a state bus broker grows.
+
+Every worker process gets the same number of in-memory subscribers to all
+instruments; the elected worker generates quotes at a fixed rate and the
+broker fans them out. Subscribers per core is the number of subscribers a
+fully busy core would keep up with:
+
+    python -m benchmarks.bench_scale_out --max-workers 4 --subscribers 500 --rate 50
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks.bench_broadcast import subscribe_all
+from server import broker
+from server.enums import Instrument
+from server.market_data import MarketDataEngine
+from server.ntpro_server import NTProServer
+from server.order_journal import OrderJournal
+from server.state_bus import BrokerBus
+
+
+async def discard(inserts, updates):
+    pass
+
+
+async def run_worker(path: str, subscribers: int, rate: float, seconds: float) -> dict:
+    server = NTProServer(BrokerBus(path))
+    server.journal = OrderJournal(discard)
+    server.market_data = MarketDataEngine(server, rates=dict.fromkeys(Instrument, rate))
+    subscribe_all(server, subscribers)
+    await server.start()
+    await asyncio.sleep(1)
+    sent = sum(connection.sent for connection in server.connections.values())
+    cpu, started = time.process_time(), time.perf_counter()
+    await asyncio.sleep(seconds)
+    elapsed = time.perf_counter() - started
+    result = {'sent': sum(connection.sent for connection in server.connections.values()) - sent,
+              'cpu': (time.process_time() - cpu) / elapsed,
+              'elapsed': elapsed}
+    for connection in server.connections.values():
+        connection.close()
+    await server.stop()
+    return result
+
+
+def worker(path: str, subscribers: int, rate: float, seconds: float, results: multiprocessing.Queue):
+    results.put(asyncio.run(run_worker(path, subscribers, rate, seconds)))
+
+
+def run_broker(path: str):
+    asyncio.run(broker.main(path))
+
+
+def main(max_workers: int, subscribers: int, rate: float, seconds: float):
+    path = os.path.join(tempfile.mkdtemp(), 'bus.sock')
+    broker_process = multiprocessing.Process(target=run_broker, args=(path,), daemon=True)
+    broker_process.start()
+    while not os.path.exists(path):
+        time.sleep(0.01)
+
+    quotes_per_second = rate * len(Instrument)
+    print(f'{"workers":>7} {"subscribers":>11} {"frames/s":>10} {"cpu/worker":>10} {"subscribers/core":>16}')
+    for workers in range(1, max_workers + 1):
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=worker, args=(path, subscribers, rate, seconds, results))
+                     for _ in range(workers)]
+        for process in processes:
+            process.start()
+        stats = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        frames = sum(stat['sent'] / stat['elapsed'] for stat in stats)
+        cpu = sum(stat['cpu'] for stat in stats) / workers
+        per_core = frames / quotes_per_second / (cpu * workers)
+        print(f'{workers:>7} {subscribers * workers:>11} {frames:>10.0f} {cpu:>9.0%} {per_core:>16.0f}')
+    broker_process.terminate()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--subscribers', type=int, default=500)
+    parser.add_argument('--rate', type=float, default=50)
+    parser.add_argument('--seconds', type=float, default=3)
+    args = parser.parse_args()
+    main(args.max_workers, args.subscribers, args.rate, args.seconds)
@@ -0,0 +1,47 @@
+"""MarketDataUpdate encode time: pydantic ServerEnvelope vs the precompiled serializer.
+
+    python -m benchmarks.bench_serializers --quotes 10 --repeat 20000
+"""
+import argparse
+import timeit
+import uuid
+from decimal import Decimal
+from random import uniform
+
+from server import serializers
+from server.enums import Instrument
+from server.models import server_messages
+from server.models.base import Quote
+
+
+def pydantic_serialize(message):
+    return server_messages.ServerEnvelope(message_type=message.get_type(),
+                                          message=message.dict(by_alias=True)).json(by_alias=True)
+
+
+def main(quotes: int, repeat: int):
+    message = server_messages.MarketDataUpdate(
+        subscription_id=uuid.uuid4(), instrument=Instrument.eur_usd,
+        quotes=[Quote(bid=Decimal.from_float(uniform(30, 40)), offer=Decimal.from_float(uniform(30, 40)),
+                      min_amount=Decimal.from_float(uniform(30, 40)), max_amount=Decimal.from_float(uniform(30, 40)))
+                for _ in range(quotes)])
+
+    candidates = [('pydantic', pydantic_serialize),
+                  ('precompiled json', lambda message: serializers._dumps_json(serializers.to_envelope(message)))]
+    if serializers.orjson is not None:
+        candidates.append(('precompiled orjson',
+                           lambda message: serializers._dumps_orjson(serializers.to_envelope(message))))
+
+    baseline = None
+    for name, serialize in candidates:
+        seconds = min(timeit.repeat(lambda: serialize(message), number=repeat, repeat=3)) / repeat
+        baseline = baseline or seconds
+        print(f'{name:<20} {seconds * 1e6:8.2f} us/message  x{baseline / seconds:.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quotes', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20000)
+    args = parser.parse_args()
+    main(args.quotes, args.repeat)
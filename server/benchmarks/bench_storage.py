@@ -0,0 +1,68 @@
+"""Per-order write latency and account reads for every storage backend, i.e.
+how much the database adds on top of the in-memory baseline. Every order
+is written in its own transaction, as the journal does under light load.
+
+Postgres is skipped unless it is listed; it needs a migrated database
+configured through the usual DB_* variables:
+
+    python -m benchmarks.bench_storage --backends memory,sqlite,postgres --clients 50 --orders 5000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from decimal import Decimal
+
+from server.enums import Instrument, OrderSide
+from server.models.base import OrderIn
+from server.storage import MemoryStorage, OrderStorage, PostgresStorage, SqliteStorage
+
+
+async def client(storage: OrderStorage, number: int, orders: int, latencies: list):
+    for _ in range(orders):
+        order = OrderIn(side=OrderSide.buy, price=Decimal('35.5'), amount=10, instrument=Instrument.eur_usd)
+        row = dict(uuid=uuid.uuid4(), address=f'bench:{number}', account=f'bench-{number}', **order.dict())
+        started = time.perf_counter()
+        await storage.write_orders([row], [])
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(storage: OrderStorage, clients: int, per_client: int):
+    await storage.connect()
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(client(storage, number, per_client, latencies) for number in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for number in range(clients):
+        await storage.read_account_orders(f'bench-{number}', active=True, limit=per_client)
+    read = (time.perf_counter() - started) / clients
+    await storage.disconnect()
+
+    latencies.sort()
+    print(f'{storage.__class__.__name__:<16} {clients * per_client / elapsed:>9.1f} orders/sec  '
+          f'p50 {latencies[len(latencies) // 2] * 1000:.3f} ms  '
+          f'p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.3f} ms  '
+          f'account read {read * 1000:.3f} ms')
+
+
+async def main(backends: list[str], clients: int, total_orders: int):
+    per_client = max(total_orders // clients, 1)
+    with tempfile.TemporaryDirectory() as directory:
+        storages = {'memory': MemoryStorage(),
+                    'sqlite': SqliteStorage(os.path.join(directory, 'bench.sqlite3')),
+                    'postgres': PostgresStorage()}
+        for backend in backends:
+            await run(storages[backend], clients, per_client)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backends', default='memory,sqlite')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--orders', type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.backends.split(','), args.clients, args.orders))
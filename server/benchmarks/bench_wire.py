@@ -0,0 +1,68 @@
+"""Bytes on the wire and encode/decode time of the JSON and binary (MessagePack) protocols.
+
+Client messages are decoded into models the way the server does it, server
+messages only into plain values the way a client would.
+
+    python -m benchmarks.bench_wire --quotes 10 --orders 100 --repeat 5000
+"""
+import argparse
+import datetime
+import json
+import timeit
+import uuid
+from decimal import Decimal
+from random import choice, randint, uniform
+
+from server import binary_protocol, decoders, serializers
+from server.enums import Instrument, OrderSide, OrderStatus
+from server.models import client_messages, server_messages
+from server.models.base import OrderOut, Quote
+
+
+def random_price() -> Decimal:
+    return Decimal(f'{uniform(30, 40):.5f}')
+
+
+def json_encode_client(message):
+    return json.dumps({'messageType': int(message.get_type()), 'message': json.loads(message.json(by_alias=True))})
+
+
+def main(quotes: int, orders: int, repeat: int):
+    now = datetime.datetime.now()
+    messages = [
+        server_messages.MarketDataUpdate(
+            subscription_id=uuid.uuid4(), instrument=Instrument.eur_usd,
+            quotes=[Quote(bid=random_price(), offer=random_price(), min_amount=random_price(),
+                          max_amount=random_price()) for _ in range(quotes)]),
+        server_messages.OrdersList(orders=[
+            OrderOut(uuid=uuid.uuid4(), side=choice(list(OrderSide)), price=random_price(), amount=randint(1, 100),
+                     instrument=choice(list(Instrument)), status=choice(list(OrderStatus)),
+                     creation_time=now, change_time=now) for _ in range(orders)]),
+        server_messages.ExecutionReport(order_id=uuid.uuid4(), order_status=OrderStatus.filled),
+        client_messages.PlaceOrder(instrument=1, side=OrderSide.buy, amount=Decimal(3), price=random_price()),
+    ]
+
+    print(f'{"message":<18} {"mode":<8} {"bytes":>8} {"encode":>12} {"decode":>12}')
+    for message in messages:
+        if isinstance(message, client_messages.ClientMessage):
+            modes = [('json', json_encode_client, decoders.decode),
+                     ('binary', binary_protocol.encode, binary_protocol.decode)]
+        else:
+            modes = [('json', serializers.serialize, json.loads),
+                     ('binary', binary_protocol.encode, binary_protocol.unpackb)]
+        for mode, encode, decode in modes:
+            raw = encode(message)
+            size = len(raw.encode() if isinstance(raw, str) else raw)
+            encode_time = min(timeit.repeat(lambda: encode(message), number=repeat, repeat=3)) / repeat
+            decode_time = min(timeit.repeat(lambda: decode(raw), number=repeat, repeat=3)) / repeat
+            print(f'{message.__class__.__name__:<18} {mode:<8} {size:>8} '
+                  f'{encode_time * 1e6:9.2f} us {decode_time * 1e6:9.2f} us')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quotes', type=int, default=10)
+    parser.add_argument('--orders', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=5000)
+    args = parser.parse_args()
+    main(args.quotes, args.orders, args.repeat)
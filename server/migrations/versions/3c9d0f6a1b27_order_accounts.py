@@ -0,0 +1,26 @@
+"""order accounts
+
+Revision ID: 3c9d0f6a1b27
+Revises: 7e8364c20c54
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3c9d0f6a1b27'
+down_revision = '7e8364c20c54'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('orders', sa.Column('account', sa.String(), nullable=True))
+    op.create_index('ix_orders_account_status_creation_time', 'orders',
+                    ['account', 'status', 'creation_time'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_orders_account_status_creation_time', table_name='orders')
+    op.drop_column('orders', 'account')
@@ -0,0 +1,27 @@
+"""bounded order prices
+
+Revision ID: 5b2e9f8d4c61
+Revises: 8a41e7c5d913
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5b2e9f8d4c61'
+down_revision = '8a41e7c5d913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    for table in ('orders', 'orders_archive'):
+        op.alter_column(table, 'price', type_=sa.DECIMAL(18, 8), existing_type=sa.DECIMAL(),
+                        existing_nullable=False, postgresql_using='round(price, 8)')
+
+
+def downgrade() -> None:
+    for table in ('orders', 'orders_archive'):
+        op.alter_column(table, 'price', type_=sa.DECIMAL(), existing_type=sa.DECIMAL(18, 8),
+                        existing_nullable=False)
@@ -0,0 +1,48 @@
+"""orders indexes and archive
+
+Revision ID: 8a41e7c5d913
+Revises: 3c9d0f6a1b27
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '8a41e7c5d913'
+down_revision = '3c9d0f6a1b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_orders_address_status_creation_time', 'orders',
+                    ['address', 'status', 'creation_time'], unique=False)
+    op.create_index('ix_orders_finished_change_time', 'orders', ['change_time'], unique=False,
+                    postgresql_where=sa.text("status <> 'active'"))
+    op.create_table('orders_archive',
+    sa.Column('uuid', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('instrument', postgresql.ENUM(name='instrument', create_type=False), nullable=False),
+    sa.Column('side', postgresql.ENUM(name='orderside', create_type=False), nullable=False),
+    sa.Column('status', postgresql.ENUM(name='orderstatus', create_type=False), nullable=False),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('price', sa.DECIMAL(), nullable=False),
+    sa.Column('address', sa.String(), nullable=False),
+    sa.Column('account', sa.String(), nullable=True),
+    sa.Column('creation_time', sa.DateTime(), nullable=False),
+    sa.Column('change_time', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('uuid')
+    )
+    op.create_index('ix_orders_archive_account_creation_time', 'orders_archive',
+                    ['account', 'creation_time'], unique=False)
+    op.create_index('ix_orders_archive_address_creation_time', 'orders_archive',
+                    ['address', 'creation_time'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_orders_archive_address_creation_time', table_name='orders_archive')
+    op.drop_index('ix_orders_archive_account_creation_time', table_name='orders_archive')
+    op.drop_table('orders_archive')
+    op.drop_index('ix_orders_finished_change_time', table_name='orders')
+    op.drop_index('ix_orders_address_status_creation_time', table_name='orders')
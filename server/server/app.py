@@ -1,7 +1,9 @@
 import mimetypes
 import pathlib
+import uuid
 
 import fastapi
+from server import metrics
 from server.ntpro_server import NTProServer
 from websockets.exceptions import ConnectionClosedOK
 
@@ -10,6 +12,18 @@ server = NTProServer()
 html = (pathlib.Path('server') / pathlib.Path('index.html')).read_text()
 
 
+@api.on_event('startup')
+async def startup():
+    await server.storage.connect()
+    await server.start()
+
+
+@api.on_event('shutdown')
+async def shutdown():
+    await server.stop()
+    await server.storage.disconnect()
+
+
 @api.get('/')
 async def get():
     return fastapi.responses.HTMLResponse(html)
@@ -22,6 +36,31 @@ async def get(path: pathlib.Path):
     return fastapi.responses.PlainTextResponse(static_file, media_type=mime_type)
 
 
+@api.get('/stats')
+async def stats():
+    return {'database': server.storage.stats(),
+            'order_journal': server.journal.stats(),
+            'market_data': server.market_data.stats(),
+            'order_engine': server.order_engine.stats(),
+            'order_retention': server.retention.stats(),
+            'state_bus': server.bus.stats(),
+            'server': server.stats()}
+
+
+@api.get('/metrics')
+async def get_metrics():
+    return fastapi.responses.PlainTextResponse(metrics.render(metrics.METRICS + server.collect_metrics()),
+                                               media_type='text/plain; version=0.0.4')
+
+
+@api.get('/orders/{order_id}')
+async def get_order(order_id: uuid.UUID):
+    order = await server.get_order(order_id)
+    if order is None:
+        raise fastapi.HTTPException(status_code=404, detail='The order does not exist')
+    return order
+
+
 @api.websocket('/ws/')
 async def websocket_endpoint(websocket: fastapi.WebSocket):
     await server.connect(websocket)
@@ -29,4 +68,6 @@ async def websocket_endpoint(websocket: fastapi.WebSocket):
     try:
         await server.serve(websocket)
     except (fastapi.WebSocketDisconnect, ConnectionClosedOK):
+        pass
+    finally:
         await server.disconnect(websocket)
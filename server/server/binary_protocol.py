@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import datetime
+import decimal
+import enum
+import typing
+import uuid
+from typing import Any, Callable
+
+import msgpack
+import pydantic
+from server.models import client_messages, server_messages
+from server.models.base import CorrelationId, Message, OrderOut, Quote, check_correlation_id
+from server.records import EPOCH, MICROSECOND, PRICE_DECIMALS
+
+SUBPROTOCOL = 'ntpro.msgpack'
+
+Converter = Callable[[Any], Any]
+
+CLIENT_MESSAGE_CLASSES = {int(message_type): message_class for message_class, message_type
+                          in client_messages._CLIENT_MESSAGE_TYPE_BY_CLASS.items()}
+SERVER_MESSAGE_CLASSES = {int(message_type): message_class for message_class, message_type
+                          in server_messages._SERVER_MESSAGE_TYPE_BY_CLASS.items()}
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def packb(value: Any) -> bytes:
+    return msgpack.packb(value)
+
+
+def unpackb(data: bytes) -> Any:
+    # Field tags are integer map keys.
+    return msgpack.unpackb(data, strict_map_key=False)
+
+
+# Messages are ``[messageType, {tag: value}]`` with the tags of FIELD_TAGS.
+# Decimals are integers scaled by 10 ** PRICE_DECIMALS, UUIDs are 16 bytes and
+# datetimes are microseconds since the epoch.
+
+# Tags are part of the protocol: a field keeps its tag for good, a new field
+# takes the next free one and the tag of a removed field is not reused.
+FIELD_TAGS: dict[type[pydantic.BaseModel], dict[str, int]] = {
+    client_messages.SubscribeMarketData: {'instrument': 1, 'mode': 2},
+    client_messages.UnsubscribeMarketData: {'subscription_id': 1},
+    client_messages.PlaceOrder: {'instrument': 1, 'side': 2, 'amount': 3, 'price': 4},
+    client_messages.CancelOrder: {'order_id': 1},
+    client_messages.GetOrders: {'status': 1, 'instrument': 2, 'since': 3, 'until': 4, 'cursor': 5, 'limit': 6},
+    client_messages.GetMarketDataSnapshot: {'instrument': 1, 'depth': 2},
+    client_messages.ResnapshotMarketData: {'subscription_id': 1},
+    client_messages.Batch: {'messages': 1},
+    server_messages.SuccessInfo: {'subscription_id': 1},
+    server_messages.ErrorInfo: {'reason': 1},
+    server_messages.ExecutionReport: {'order_id': 1, 'order_status': 2},
+    server_messages.MarketDataUpdate: {'subscription_id': 1, 'instrument': 2, 'quotes': 3, 'sequence': 4},
+    server_messages.OrdersList: {'orders': 1, 'next_cursor': 2, 'partial': 3},
+    server_messages.MarketDataSnapshot: {'instrument': 1, 'quotes': 2},
+    server_messages.TradeReport: {'order_id': 1, 'instrument': 2, 'side': 3, 'price': 4, 'amount': 5,
+                                  'remaining_amount': 6},
+    server_messages.MarketDataDelta: {'subscription_id': 1, 'instrument': 2, 'sequence': 3, 'quotes': 4,
+                                      'removed': 5},
+    server_messages.BatchResult: {'results': 1},
+    Quote: {'bid': 1, 'offer': 2, 'min_amount': 3, 'max_amount': 4, 'timestamp': 5},
+    OrderOut: {'creation_time': 1, 'change_time': 2, 'status': 3, 'side': 4, 'price': 5, 'amount': 6,
+               'instrument': 7, 'uuid': 8},
+}
+
+def encode_decimal(value: decimal.Decimal) -> int:
+    return int(value.scaleb(PRICE_DECIMALS).to_integral_value())
+
+
+def decode_decimal(value: Any) -> Any:
+    return decimal.Decimal(value).scaleb(-PRICE_DECIMALS) if type(value) is int else value
+
+
+def encode_datetime(value: datetime.datetime) -> int:
+    return (value - EPOCH) // MICROSECOND
+
+
+def decode_datetime(value: Any) -> Any:
+    return EPOCH + value * MICROSECOND if type(value) is int else value
+
+
+def _optional(converter: Converter) -> Converter:
+    return lambda value: None if value is None else converter(value)
+
+
+def _type_converters(type_: Any) -> tuple[Converter | None, Converter | None]:
+    if typing.get_origin(type_) is list:
+        item_encoder, item_decoder = _type_converters(typing.get_args(type_)[0])
+        return (None if item_encoder is None else lambda values: [item_encoder(value) for value in values],
+                None if item_decoder is None else lambda values: [item_decoder(value) for value in values]
+                if type(values) is list else values)
+    if isinstance(type_, type):
+        if issubclass(type_, pydantic.BaseModel):
+            return model_encoder(type_), model_decoder(type_)
+        if issubclass(type_, enum.Enum):
+            return (lambda value: value.value), None
+        if issubclass(type_, decimal.Decimal):
+            return encode_decimal, decode_decimal
+        if issubclass(type_, uuid.UUID):
+            return (lambda value: value.bytes), None
+        if issubclass(type_, datetime.datetime):
+            return encode_datetime, decode_datetime
+        if issubclass(type_, (str, int, float, bool)):
+            return None, None
+    if type_ is Any:
+        return None, None
+    raise TypeError(f'No binary converter for {type_!r}')
+
+
+def _fields(model: type[pydantic.BaseModel]):
+    tags = FIELD_TAGS.get(model, {})
+    untagged = [name for name in model.__fields__ if name not in tags]
+    if untagged:
+        raise TypeError(f'No binary field tags for {model.__name__}: {", ".join(untagged)}')
+    for field in model.__fields__.values():
+        tag = tags[field.name]
+        encoder, decoder = _type_converters(field.outer_type_)
+        if encoder is not None and field.allow_none:
+            encoder = _optional(encoder)
+        yield tag, field.name, encoder, decoder
+
+
+def model_encoder(model: type[pydantic.BaseModel]) -> Converter:
+    fields = [(tag, name, encoder) for tag, name, encoder, _ in _fields(model)]
+
+    def encode(message: pydantic.BaseModel) -> dict:
+        values = message.__dict__
+        return {tag: values[name] if encoder is None else encoder(values[name])
+                for tag, name, encoder in fields}
+
+    return encode
+
+
+def model_decoder(model: type[pydantic.BaseModel]) -> Converter:
+    fields = {tag: (name, decoder) for tag, name, _, decoder in _fields(model)}
+
+    def decode(values: Any) -> Any:
+        if type(values) is not dict:
+            return values
+        decoded = {}
+        for tag, value in values.items():
+            field = fields.get(tag)
+            if field is None:
+                raise DecodeError(f'Unknown field tag {tag!r} for {model.__name__}')
+            name, decoder = field
+            decoded[name] = value if decoder is None else decoder(value)
+        return decoded
+
+    return decode
+
+
+_MESSAGE_CLASSES = (*client_messages._CLIENT_MESSAGE_TYPE_BY_CLASS, *server_messages._SERVER_MESSAGE_TYPE_BY_CLASS)
+_ENCODERS = {message_class: model_encoder(message_class) for message_class in _MESSAGE_CLASSES}
+_DECODERS = {message_class: model_decoder(message_class) for message_class in _MESSAGE_CLASSES}
+
+
+def to_envelope(message: Message) -> list:
+    return [int(message.get_type()), _ENCODERS[message.__class__](message)]
+
+
+def encode(message: Message, correlation_id: CorrelationId | None = None) -> bytes:
+    envelope = to_envelope(message)
+    if correlation_id is not None:
+        envelope.append(correlation_id)
+    return packb(envelope)
+
+
+def unwrap(raw: str | bytes) -> tuple[Any, CorrelationId | None]:
+    """The ``[messageType, message]`` pair of a frame and its optional third element, the correlation id."""
+    if not isinstance(raw, (bytes, bytearray)):
+        raise DecodeError('The message is not a binary frame')
+    try:
+        data = unpackb(raw)
+    except Exception:
+        raise DecodeError('The message is not a valid MessagePack') from None
+    if type(data) is list and len(data) == 3:
+        try:
+            return data[:2], check_correlation_id(data[2])
+        except ValueError as ex:
+            raise DecodeError(str(ex)) from None
+    return data, None
+
+
+def decode(raw: str | bytes, message_classes: dict[int, type[Message]] = CLIENT_MESSAGE_CLASSES) -> Message:
+    if not isinstance(raw, (bytes, bytearray)):
+        raise DecodeError('The message is not a binary frame')
+    try:
+        data = unpackb(raw)
+    except Exception:
+        raise DecodeError('The message is not a valid MessagePack') from None
+    return decode_envelope(data, message_classes)
+
+
+def decode_envelope(data: Any, message_classes: dict[int, type[Message]] = CLIENT_MESSAGE_CLASSES) -> Message:
+    if type(data) is not list or len(data) != 2 or type(data[0]) is not int or type(data[1]) is not dict:
+        raise DecodeError('The message is not a [messageType, message] pair')
+    message_class = message_classes.get(data[0])
+    if message_class is None:
+        raise DecodeError(f'Unknown messageType {data[0]}')
+    return message_class.parse_obj(_DECODERS[message_class](data[1]))
@@ -0,0 +1,90 @@
+"""State bus broker shared by the server workers.
+
+    python -m server.broker --path /tmp/ntpro-bus.sock
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import Any
+
+from server.state_bus import STATE_BUS_PATH, frame, read_frame, store_value
+
+logger = logging.getLogger(__name__)
+
+
+class Broker:
+    """Fans published frames out to the subscribed workers, keeps the shared
+    key-value store and hands the leader role to the oldest connected
+    candidate."""
+
+    def __init__(self):
+        self.subscribers: dict[str, set[asyncio.StreamWriter]] = defaultdict(set)
+        self.store: dict[str, dict[str, Any]] = defaultdict(dict)
+        self.candidates: list[asyncio.StreamWriter] = []
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                message, data = await read_frame(reader)
+                self.dispatch(writer, message, data)
+        except (asyncio.IncompleteReadError, OSError):
+            pass
+        except Exception:
+            logger.exception('Dropping a worker that sent a malformed frame')
+        finally:
+            self.disconnect(writer)
+            writer.close()
+
+    def dispatch(self, writer: asyncio.StreamWriter, message: list, data: bytes):
+        kind = message[0]
+        if kind == 'pub':
+            published = len(data).to_bytes(4, 'big') + data
+            for subscriber in self.subscribers[message[1]]:
+                subscriber.write(published)
+        elif kind == 'sub':
+            self.subscribers[message[1]].add(writer)
+        elif kind == 'put':
+            _, namespace, key, value = message
+            store_value(self.store[namespace], key, value)
+        elif kind == 'get':
+            _, request_id, namespace, key = message
+            writer.write(frame(['got', request_id, self.store[namespace].get(key)]))
+        elif kind == 'lead':
+            if writer not in self.candidates:
+                self.candidates.append(writer)
+                if len(self.candidates) == 1:
+                    writer.write(frame(['leader']))
+
+    def disconnect(self, writer: asyncio.StreamWriter):
+        for subscribers in self.subscribers.values():
+            subscribers.discard(writer)
+        if writer in self.candidates:
+            was_leader = self.candidates[0] is writer
+            self.candidates.remove(writer)
+            if was_leader and self.candidates:
+                self.candidates[0].write(frame(['leader']))
+
+
+async def serve(path: str = STATE_BUS_PATH) -> asyncio.AbstractServer:
+    if os.path.exists(path):
+        os.unlink(path)
+    return await asyncio.start_unix_server(Broker().handle, path)
+
+
+async def main(path: str):
+    server = await serve(path)
+    logger.info('State bus broker listening on %s', path)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--path', default=STATE_BUS_PATH)
+    args = parser.parse_args()
+    asyncio.run(main(args.path))
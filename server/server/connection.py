@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+from collections import OrderedDict, deque
+from typing import Hashable
+
+import fastapi
+from server.enums import SlowConsumerPolicy
+from server.wire import JSON, Codec, Frame
+
+OUTBOUND_QUEUE_SIZE = int(os.getenv('OUTBOUND_QUEUE_SIZE', '256'))
+SLOW_CONSUMER_POLICY = SlowConsumerPolicy[os.getenv('SLOW_CONSUMER_POLICY', 'conflate')]
+SLOW_CONSUMER_CLOSE_CODE = 1008
+CLOSE_TIMEOUT = 5
+
+
+class ClientConnection:
+    """Outbound side of a websocket, written by a task that only runs while
+    something is queued, so an idle connection holds no task.
+
+    Replies and execution reports are queued in ``messages`` and are never
+    dropped; a client that lets ``queue_size`` of them pile up is
+    disconnected. Market data is queued separately and the slow-consumer
+    ``policy`` decides what happens when that queue is full; the connection
+    remembers which subscriptions lost a frame so that they get a full
+    snapshot next instead of a delta.
+    """
+
+    def __init__(self, websocket: fastapi.WebSocket, *,
+                 queue_size: int = OUTBOUND_QUEUE_SIZE,
+                 policy: SlowConsumerPolicy = SLOW_CONSUMER_POLICY,
+                 codec: Codec = JSON):
+        self.websocket = websocket
+        self.codec = codec
+        self.queue_size = queue_size
+        self.policy = policy
+        self.sent = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.peak_depth = 0
+        self.closed = False
+        self._messages: deque[Frame] = deque()
+        self._market_data: OrderedDict[Hashable, tuple[Hashable, Frame]] = OrderedDict()
+        self._gaps: set[Hashable] = set()
+        self._snapshots: dict[Hashable, int] = {}
+        self._sequence = itertools.count()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._writer: asyncio.Task | None = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._messages) + len(self._market_data)
+
+    def send(self, frame: Frame):
+        if self.closed:
+            return
+        if len(self._messages) >= self.queue_size:
+            self.close(SLOW_CONSUMER_CLOSE_CODE)
+            return
+        self._messages.append(frame)
+        if len(self._messages) >= self.queue_size // 2:
+            self._writable.clear()
+        self._queued()
+
+    def send_market_data(self, key: Hashable, frame: Frame, *, snapshot: bool = True):
+        """Queue a frame of the subscription ``key``; a ``snapshot`` makes up
+        for the frames of it that were dropped or conflated away before."""
+        if self.closed:
+            return
+        if snapshot:
+            self._gaps.discard(key)
+        if self.policy is SlowConsumerPolicy.conflate:
+            queued = key
+            if queued in self._market_data:
+                self._market_data[queued] = (key, frame)
+                self.conflated += 1
+                return
+        else:
+            queued = next(self._sequence)
+            if snapshot:
+                self._snapshots[key] = queued
+
+        if len(self._market_data) >= self.queue_size:
+            if self.policy is SlowConsumerPolicy.disconnect:
+                self.close(SLOW_CONSUMER_CLOSE_CODE)
+                return
+            position, (dropped, _) = self._market_data.popitem(last=False)
+            # A later snapshot of the subscription still in the queue covers it.
+            if self.policy is SlowConsumerPolicy.conflate or self._snapshots.get(dropped, -1) <= position:
+                self._gaps.add(dropped)
+            self.dropped += 1
+        self._market_data[queued] = (key, frame)
+        self._queued()
+
+    async def drain(self):
+        await self._writable.wait()
+
+    def needs_snapshot(self, key: Hashable) -> bool:
+        """Whether a delta of the subscription ``key`` would not apply to what
+        the client gets: one of its frames was dropped, or its queued frame
+        would be conflated away."""
+        if key in self._gaps:
+            return True
+        return self.policy is SlowConsumerPolicy.conflate and key in self._market_data
+
+    def forget(self, key: Hashable):
+        self._gaps.discard(key)
+        self._snapshots.pop(key, None)
+
+    def close(self, code: int | None = None):
+        if self.closed:
+            return
+        self.closed = True
+        if self._writer is not None:
+            self._writer.cancel()
+        self._writable.set()
+        self._messages.clear()
+        self._market_data.clear()
+        self._gaps.clear()
+        self._snapshots.clear()
+        if code is not None:
+            asyncio.get_running_loop().create_task(self._close_websocket(code))
+
+    def stats(self) -> dict:
+        return {
+            'queue_depth': self.depth,
+            'peak_queue_depth': self.peak_depth,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'conflated': self.conflated,
+        }
+
+    def _queued(self):
+        self.peak_depth = max(self.peak_depth, self.depth)
+        if self._writer is None:
+            self._writer = asyncio.get_running_loop().create_task(self._write())
+
+    async def _write(self):
+        while True:
+            if self._messages:
+                frame = self._messages.popleft()
+                if len(self._messages) < self.queue_size // 2:
+                    self._writable.set()
+            elif self._market_data:
+                _, (_, frame) = self._market_data.popitem(last=False)
+            else:
+                self._writer = None
+                return
+            try:
+                if type(frame) is str:
+                    await self.websocket.send_text(frame)
+                else:
+                    await self.websocket.send_bytes(frame)
+            except Exception:
+                self.close()
+                return
+            self.sent += 1
+
+    async def _close_websocket(self, code: int):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), timeout=CLOSE_TIMEOUT)
+        except Exception:
+            pass
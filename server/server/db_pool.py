@@ -0,0 +1,126 @@
+import asyncio
+import contextlib
+import logging
+import time
+
+import databases
+
+logger = logging.getLogger(__name__)
+
+
+class DatabasePoolTimeout(Exception):
+    pass
+
+
+class PoolStats:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.in_use = 0
+        self.waiting = 0
+        self.peak_in_use = 0
+        self.acquires = 0
+        self.acquire_timeouts = 0
+        self.acquire_wait_total = 0.0
+        self.acquire_wait_max = 0.0
+
+    def record_acquire(self, waited: float):
+        self.acquires += 1
+        self.in_use += 1
+        self.peak_in_use = max(self.peak_in_use, self.in_use)
+        self.acquire_wait_total += waited
+        self.acquire_wait_max = max(self.acquire_wait_max, waited)
+
+    def as_dict(self) -> dict:
+        return {
+            'max_size': self.max_size,
+            'in_use': self.in_use,
+            'waiting': self.waiting,
+            'saturation': self.in_use / self.max_size,
+            'peak_in_use': self.peak_in_use,
+            'acquires': self.acquires,
+            'acquire_timeouts': self.acquire_timeouts,
+            'acquire_wait_avg': self.acquire_wait_total / self.acquires if self.acquires else 0.0,
+            'acquire_wait_max': self.acquire_wait_max,
+        }
+
+
+class DatabasePool:
+    """Long-lived asyncpg pool shared by every connection of the process.
+
+    The pool is opened by the application startup hook. When the app runs
+    without lifespan events (``TestClient`` outside a ``with`` block, where
+    every websocket session gets its own event loop) it is opened lazily on
+    first use in the running loop, and has to be disconnected in that loop
+    before another one uses it: asyncpg cannot close it from elsewhere.
+    """
+
+    def __init__(self, url: str, *, min_size: int, max_size: int, acquire_timeout: float):
+        self.url = url
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.stats = PoolStats(max_size)
+        self._database: databases.Database | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._ready: asyncio.Future | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    @property
+    def is_connected(self) -> bool:
+        return self._database is not None and self._database.is_connected
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            await asyncio.shield(self._ready)
+            return
+
+        if self.is_connected:
+            logger.warning('Leaving the database pool of another event loop open')
+        self._loop = loop
+        self._ready = loop.create_future()
+        self._slots = asyncio.Semaphore(self.max_size)
+        self._database = databases.Database(self.url, min_size=self.min_size, max_size=self.max_size)
+        try:
+            await self._database.connect()
+        except BaseException as ex:
+            self._ready.set_exception(ex)
+            self._ready.exception()
+            self._loop = None
+            raise
+        self._ready.set_result(None)
+
+    async def disconnect(self):
+        database, loop = self._database, self._loop
+        self._database = self._loop = self._ready = self._slots = None
+        if database is None:
+            return
+        if loop is asyncio.get_running_loop():
+            await database.disconnect()
+        elif database.is_connected:
+            logger.warning('Leaving the database pool of another event loop open')
+
+    @contextlib.asynccontextmanager
+    async def connection(self) -> databases.core.Connection:
+        if self._loop is not asyncio.get_running_loop() or not self._ready.done():
+            await self.connect()
+
+        started = time.perf_counter()
+        self.stats.waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.stats.acquire_timeouts += 1
+            raise DatabasePoolTimeout(
+                f'No database connection available within {self.acquire_timeout}s') from None
+        finally:
+            self.stats.waiting -= 1
+
+        self.stats.record_acquire(time.perf_counter() - started)
+        slots = self._slots
+        try:
+            async with self._database.connection() as connection:
+                yield connection
+        finally:
+            self.stats.in_use -= 1
+            slots.release()
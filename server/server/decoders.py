@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import json
+
+from typing import Any
+
+from server.models import client_messages
+from server.models.base import CorrelationId, check_correlation_id
+from server.serializers import JSON_BACKEND, orjson
+
+_loads = orjson.loads if JSON_BACKEND == 'orjson' and orjson is not None else json.loads
+
+_MESSAGE_CLASS_BY_TYPE = {
+    int(message_type): message_class
+    for message_class, message_type in client_messages._CLIENT_MESSAGE_TYPE_BY_CLASS.items()
+}
+_ENVELOPE_KEYS = {'messageType', 'message'}
+
+
+def decode(raw: str | bytes) -> client_messages.ClientMessage:
+    """Parse a client frame into its concrete ClientMessage in a single pass.
+
+    Well-formed envelopes are dispatched on ``messageType`` through a
+    precomputed table and only the concrete message is validated. Anything
+    else goes through ``ClientEnvelope`` so the error messages stay the same.
+    """
+    return decode_envelope(_loads(raw))
+
+
+def unwrap(raw: str | bytes) -> tuple[Any, CorrelationId | None]:
+    """The envelope of a client frame without its optional ``correlationId``."""
+    data = _loads(raw)
+    if type(data) is dict and 'correlationId' in data:
+        return data, check_correlation_id(data.pop('correlationId'))
+    return data, None
+
+
+def decode_envelope(data: Any) -> client_messages.ClientMessage:
+    if type(data) is dict and data.keys() == _ENVELOPE_KEYS and type(data['messageType']) is int:
+        message_class = _MESSAGE_CLASS_BY_TYPE.get(data['messageType'])
+        message = data['message']
+        if message_class is not None and type(message) is dict:
+            return message_class.parse_obj(message)
+    return client_messages.ClientEnvelope.parse_obj(data).get_parsed_message()
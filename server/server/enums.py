@@ -10,6 +10,9 @@ class ClientMessageType(enum.IntEnum):
     cancel_order = enum.auto()
     get_orders = enum.auto()
     save_order = enum.auto()
+    get_market_data_snapshot = enum.auto()
+    resnapshot_market_data = enum.auto()
+    batch = enum.auto()
 
 
 class ServerMessageType(enum.IntEnum):
@@ -19,6 +22,15 @@ class ServerMessageType(enum.IntEnum):
     market_data_update = enum.auto()
     orders_list = enum.auto()
     order_saved = enum.auto()
+    market_data_snapshot = enum.auto()
+    trade_report = enum.auto()
+    market_data_delta = enum.auto()
+    batch_result = enum.auto()
+
+
+class MarketDataMode(enum.Enum):
+    full = enum.auto()
+    incremental = enum.auto()
 
 
 class OrderSide(enum.Enum):
@@ -37,3 +49,9 @@ class Instrument(enum.Enum):
     eur_usd = enum.auto()
     eur_rub = enum.auto()
     usd_rub = enum.auto()
+
+
+class SlowConsumerPolicy(enum.Enum):
+    drop_oldest = enum.auto()
+    conflate = enum.auto()
+    disconnect = enum.auto()
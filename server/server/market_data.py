@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+from typing import TYPE_CHECKING
+
+from server.enums import Instrument
+from server.message_processors import gen_quote
+from server.pytest_conditions import RUN_FROM_PYTEST
+
+if TYPE_CHECKING:
+    from server.ntpro_server import NTProServer
+
+MARKET_DATA_RATE = float(os.getenv('MARKET_DATA_RATE', '2' if RUN_FROM_PYTEST else '0.5'))
+MARKET_DATA_RATES = os.getenv('MARKET_DATA_RATES', '')
+MARKET_DATA_SEED = int(os.getenv('MARKET_DATA_SEED')) if os.getenv('MARKET_DATA_SEED') else None
+MARKET_DATA_HIGH_RATE = os.getenv('MARKET_DATA_HIGH_RATE', 'false').lower() in ('1', 'true', 'yes')
+HIGH_RATE = 1000.0
+MAX_QUOTES_PER_WAKEUP = 100
+
+
+def parse_rates(rates: str, default: float) -> dict[Instrument, float]:
+    per_instrument = dict.fromkeys(Instrument, default)
+    for item in filter(None, rates.split(',')):
+        name, rate = item.split('=')
+        per_instrument[Instrument[name.strip()]] = float(rate)
+    return per_instrument
+
+
+def configured_rates() -> dict[Instrument, float]:
+    if MARKET_DATA_HIGH_RATE:
+        return dict.fromkeys(Instrument, HIGH_RATE)
+    return parse_rates(MARKET_DATA_RATES, MARKET_DATA_RATE)
+
+
+class MarketDataEngine:
+    """Generates quotes for every instrument at a fixed rate and broadcasts them.
+
+    One task serves all instruments. When it wakes up late, or the rate is
+    higher than the loop can sleep for, it generates every quote that is due
+    (at most ``MAX_QUOTES_PER_WAKEUP`` per instrument), so the quote rate does
+    not depend on the number of connections.
+    """
+
+    def __init__(self, server: NTProServer, *,
+                 rates: dict[Instrument, float] | None = None,
+                 seed: int | None = None):
+        self.server = server
+        self.rates = {instrument: rate for instrument, rate in (rates or configured_rates()).items() if rate > 0}
+        self.random = random.Random(seed if seed is not None else MARKET_DATA_SEED)
+        self.generated = 0
+        self.max_lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return (self._task is not None and not self._task.done()
+                and self._task.get_loop() is asyncio.get_running_loop())
+
+    async def start(self):
+        if not self.is_running and self.rates:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if not self.is_running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = {instrument: loop.time() + 1 / rate for instrument, rate in self.rates.items()}
+        while True:
+            await asyncio.sleep(max(min(next_tick.values()) - loop.time(), 0))
+            now = loop.time()
+            for instrument, due in next_tick.items():
+                if due > now:
+                    continue
+                rate = self.rates[instrument]
+                count = min(int((now - due) * rate) + 1, MAX_QUOTES_PER_WAKEUP)
+                for _ in range(count):
+                    await gen_quote(self.server, instrument, self.random)
+                self.generated += count
+                self.max_lag = max(self.max_lag, now - due)
+                next_tick[instrument] = max(due + count / rate, now)
+
+    def stats(self) -> dict:
+        return {
+            'rates': {instrument.name: rate for instrument, rate in self.rates.items()},
+            'generated': self.generated,
+            'max_lag': self.max_lag,
+        }
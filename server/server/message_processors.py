@@ -1,19 +1,21 @@
 from __future__ import annotations
 
-from datetime import datetime
-from decimal import Decimal
-from random import choice, uniform
+import random
+from random import choice
 from typing import TYPE_CHECKING
-from uuid import uuid4
+from uuid import UUID, uuid4
 
-import asyncpg
 from bidict import ValueDuplicationError
-from server.enums import Instrument, OrderStatus
+from server.enums import ClientMessageType, Instrument, MarketDataMode, OrderStatus
 from server.models import server_messages
-from server.models.base import OrderIn, OrderOut, Quote
-from server.models.dbase import database, orders_table
+from server.models.base import OrderIn, OrderOut
+from server.order_store import GET_ORDERS_FRAME_SIZE, ClientOrders
 from server.pytest_conditions import RUN_FROM_PYTEST
-from server.utils import create_order, update_order
+from server.quote_history import MARKET_DATA_QUOTES, QuoteValues
+from server.records import OrderRecord, from_fixed, now_ns, round_to_tick, to_fixed
+
+
+BROADCAST_SUBSCRIPTION_ID = UUID(int=0)
 
 
 def instrument_condition():
@@ -25,6 +27,8 @@ if TYPE_CHECKING:
     from server.models import client_messages
     from server.ntpro_server import NTProServer
 
+    from server import wire
+
 
 async def subscribe_market_data_processor(
         server: NTProServer,
@@ -37,6 +41,10 @@ async def subscribe_market_data_processor(
         server.subscribes[websocket.client].update({uuid: instrument})
     except ValueDuplicationError:
         return server_messages.ErrorInfo(reason='The subscribe already exists')
+    server.subscribers[instrument][websocket.client] = uuid
+    if message.mode == MarketDataMode.incremental:
+        server.delta_subscriptions.add(uuid)
+        return [server_messages.SuccessInfo(subscription_id=uuid), market_data_snapshot(server, instrument, uuid)]
     return server_messages.SuccessInfo(subscription_id=uuid)
 
 
@@ -47,22 +55,72 @@ async def unsubscribe_market_data_processor(
 ):
     uuid = message.dict().get('subscription_id')
     try:
-        server.subscribes[websocket.client].pop(uuid)
+        instrument = server.subscribes[websocket.client].pop(uuid)
     except KeyError:
         return server_messages.ErrorInfo(reason='The subscribe does not exist')
+    server.subscribers[instrument].pop(websocket.client, None)
+    server.delta_subscriptions.discard(uuid)
+    server.connections[websocket.client].forget(uuid)
     return server_messages.SuccessInfo(subscription_id=uuid)
 
 
+async def resnapshot_market_data_processor(
+        server: NTProServer,
+        websocket: fastapi.WebSocket,
+        message: client_messages.ResnapshotMarketData,
+):
+    instrument = server.subscribes[websocket.client].get(message.subscription_id)
+    if instrument is None:
+        return server_messages.ErrorInfo(reason='The subscribe does not exist')
+    return market_data_snapshot(server, instrument, message.subscription_id)
+
+
+def market_data_snapshot(server: NTProServer, instrument: Instrument,
+                         subscription_id: UUID) -> server_messages.MarketDataUpdate:
+    quotes = server.quotes[instrument]
+    return server_messages.MarketDataUpdate(subscription_id=subscription_id, instrument=instrument,
+                                            quotes=quotes.latest(MARKET_DATA_QUOTES), sequence=quotes.sequence)
+
+
 async def place_order_processor(
         server: NTProServer,
         websocket: fastapi.WebSocket,
         message: client_messages.PlaceOrder,
 ):
-    new_order = OrderIn(**message.dict())
+    new_order = OrderRecord.from_model(OrderIn(**message.dict()))
     uuid = uuid4()
-    server.orders[websocket.client][uuid] = new_order
-    uuid_from_db = await create_order(websocket, uuid, new_order)
-    return server_messages.ExecutionReport(order_id=uuid_from_db, order_status=new_order.status)
+    orders = server.orders[websocket.client]
+    orders.add(uuid, new_order)
+    await server.journal.insert(str(websocket.client), uuid, new_order, orders.account)
+    responses = [server_messages.ExecutionReport(order_id=uuid, order_status=new_order.status)]
+
+    fills = server.order_books[new_order.instrument].add(
+        uuid, new_order.side, new_order.price, new_order.amount, orders)
+    for fill in fills:
+        maker_orders = fill.maker.owner
+        if maker_orders.websocket is not None and fill.maker.order_id in maker_orders:
+            for report in await fill_order(server, maker_orders, fill.maker.order_id, fill.price,
+                                           fill.amount, fill.maker.amount):
+                await server.send(report, maker_orders.websocket)
+        responses.extend(await fill_order(server, orders, uuid, fill.price,
+                                          fill.amount, fill.taker_remaining))
+
+    if new_order.status == OrderStatus.active:
+        server.order_engine.schedule(orders, uuid)
+    return responses
+
+
+async def fill_order(server: NTProServer, orders: ClientOrders, order_id: UUID,
+                     price: int, amount: int, remaining_amount: int):
+    order = orders[order_id]
+    reports = [server_messages.TradeReport(
+        order_id=order_id, instrument=order.instrument, side=order.side,
+        price=from_fixed(price), amount=amount, remaining_amount=remaining_amount)]
+    if not remaining_amount:
+        orders.set_status(order_id, OrderStatus.filled)
+        await server.journal.update(order_id, order)
+        reports.append(server_messages.ExecutionReport(order_id=order_id, order_status=order.status))
+    return reports
 
 
 async def cancel_order_processor(
@@ -74,14 +132,14 @@ async def cancel_order_processor(
     try:
         order = server.orders[websocket.client].get(uuid)
         if order.status == OrderStatus.active:
-            order.status = OrderStatus.cancelled
-            order.change_time = datetime.now()
-            uuid_from_db = await update_order(uuid, order)
+            server.orders[websocket.client].set_status(uuid, OrderStatus.cancelled)
+            server.order_books[order.instrument].cancel(uuid)
+            await server.journal.update(uuid, order)
         else:
             return server_messages.ErrorInfo(
                 reason=f'The order is {order.status.name}')
         return server_messages.ExecutionReport(
-            order_id=uuid_from_db, order_status=order.status)
+            order_id=uuid, order_status=order.status)
     except AttributeError:
         return server_messages.ErrorInfo(reason='The order does not exist')
 
@@ -89,46 +147,105 @@ async def cancel_order_processor(
 async def get_orders_processor(
         server: NTProServer,
         websocket: fastapi.WebSocket,
-        message: client_messages.PlaceOrder
+        message: client_messages.GetOrders
 ):
-    orders_list = [
-        OrderOut(uuid=uuid, **values.dict()) for uuid, values in server.orders[websocket.client].items()
-    ]
-    return server_messages.OrdersList(orders=orders_list)
+    client_orders = server.orders[websocket.client]
+    if message.status != OrderStatus.active:
+        await server.load_history(client_orders)
+    orders, next_cursor = client_orders.query(
+        status=message.status, instrument=message.instrument, since=message.since, until=message.until,
+        after=message.cursor, limit=message.limit)
 
+    # Large results go out in several frames so that building them does not
+    # stall the loop and the client's outbound queue gets a chance to drain.
+    frames = [orders[start:start + GET_ORDERS_FRAME_SIZE]
+              for start in range(0, len(orders), GET_ORDERS_FRAME_SIZE)] or [[]]
+    for frame in frames[:-1]:
+        await server.send(server_messages.OrdersList(orders=orders_out(frame), partial=True), websocket)
+        await server.drain(websocket)
+    return server_messages.OrdersList(orders=orders_out(frames[-1]), next_cursor=next_cursor)
 
-async def gen_order(server: NTProServer, websocket: fastapi.WebSocket):
-    orders = server.orders[websocket.client]
-    active_orders_keys = [key for key, value in orders.items() if value.status == OrderStatus.active]
-    if not active_orders_keys:
+
+def orders_out(orders: list[tuple[UUID, OrderRecord]]) -> list[OrderOut]:
+    return [order.to_out(uuid) for uuid, order in orders]
+
+
+async def get_market_data_snapshot_processor(
+        server: NTProServer,
+        websocket: fastapi.WebSocket,
+        message: client_messages.GetMarketDataSnapshot,
+):
+    quotes = server.quotes[message.instrument].latest(message.depth)
+    return server_messages.MarketDataSnapshot(instrument=message.instrument, quotes=quotes)
+
+
+async def batch_processor(
+        server: NTProServer,
+        websocket: fastapi.WebSocket,
+        message: client_messages.Batch,
+):
+    # Items run one after another so that they apply in order; their journal
+    # writes go to the database together.
+    codec = server.connections[websocket.client].codec
+    results, writes = [], []
+    async with server.journal.batch() as waiters:
+        for item in message.messages:
+            written = len(waiters)
+            responses = await process_item(server, websocket, codec, item)
+            results.append([codec.to_envelope(response) for response in responses])
+            writes.append(waiters[written:])
+    # A write the journal could not save fails only the item that made it.
+    for index, item_writes in enumerate(writes):
+        error = next((waiter.exception() for waiter in item_writes if waiter.exception() is not None), None)
+        if error is not None:
+            results[index] = [codec.to_envelope(server_messages.ErrorInfo(reason=str(error)))]
+    return server_messages.BatchResult(results=results)
+
+
+async def process_item(server: NTProServer, websocket: fastapi.WebSocket, codec: wire.Codec, item) -> list:
+    try:
+        message = codec.decode_envelope(item)
+        if message.get_type() == ClientMessageType.batch:
+            return [server_messages.ErrorInfo(reason='Batches cannot be nested')]
+        responses = await message.process(server, websocket)
+    except ValueError as ex:
+        # Validation and decoding errors of the item.
+        return [server_messages.ErrorInfo(reason=str(ex))]
+    return responses if isinstance(responses, list) else [responses]
+
+
+async def gen_order(server: NTProServer, orders: ClientOrders, order_id: UUID):
+    order = orders.get(order_id)
+    if orders.websocket is None or order is None or order.status != OrderStatus.active:
         return
 
-    key_change = choice(active_orders_keys)
-    order_change = orders[key_change]
-    order_change.status = choice([OrderStatus.filled, OrderStatus.rejected])
+    server.order_books[order.instrument].cancel(order_id)
+    orders.set_status(order_id, choice([OrderStatus.filled, OrderStatus.rejected]))
+    await server.journal.update(order_id, order)
     await server.send(server_messages.ExecutionReport(
-        order_id=key_change,
-        order_status=order_change.status),
-        websocket
+        order_id=order_id,
+        order_status=order.status),
+        orders.websocket
     )
 
 
-async def gen_quote(server: NTProServer):
-    instrument = choice(list(Instrument))
-    quote_values = sorted([uniform(30, 40) for _ in range(4)])
-    server.quotes[instrument].append(Quote(
-        bid=Decimal.from_float(quote_values[1]),
-        offer=Decimal.from_float(quote_values[2]),
-        min_amount=Decimal.from_float(quote_values[0]),
-        max_amount=Decimal.from_float(quote_values[3])))
-
-    for client, client_subscribes in server.subscribes.items():
-        if instrument in client_subscribes.values():
-            websocket = server.connections.get(client)
-            await server.send(
-                server_messages.MarketDataUpdate(
-                    subscription_id=client_subscribes.inverse.get(instrument),
-                    instrument=instrument,
-                    quotes=server.quotes[instrument]),
-                websocket
-            )
+async def gen_quote(server: NTProServer, instrument: Instrument, rng: random.Random = random):
+    min_amount, bid, offer, max_amount = sorted([round_to_tick(instrument, to_fixed(rng.uniform(30, 40)))
+                                                 for _ in range(4)])
+    await server.publish_quote(instrument, (bid, offer, min_amount, max_amount, now_ns()))
+
+
+async def fan_out_quote(server: NTProServer, instrument: Instrument, quote: QuoteValues):
+    quotes = server.quotes[instrument]
+    quotes.append(*quote)
+
+    update = market_data_snapshot(server, instrument, BROADCAST_SUBSCRIPTION_ID)
+    delta = None
+    if server.delta_subscriptions:
+        delta = server_messages.MarketDataDelta(
+            subscription_id=BROADCAST_SUBSCRIPTION_ID,
+            instrument=instrument,
+            sequence=update.sequence,
+            quotes=[quotes.last()],
+            removed=int(update.sequence > len(update.quotes)))
+    await server.broadcast(instrument, update, delta)
@@ -0,0 +1,153 @@
+"""Metrics in the Prometheus text format.
+
+Hot paths only touch plain counters: ``Histogram.observe`` is a dict lookup,
+a bisection over the bucket bounds and two additions. Gauges of the server
+state are built when ``/metrics`` is scraped.
+"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import functools
+import math
+import os
+import time
+from typing import Iterable
+
+METRICS_LOOP_LAG_INTERVAL = float(os.getenv('METRICS_LOOP_LAG_INTERVAL', '0.5'))
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, values)) + '}'
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values: dict[tuple, float] = {}
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} gauge'
+        for labels, value in self.values.items():
+            yield f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}'
+
+
+class _Series:
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self, buckets: int):
+        self.counts = [0] * (buckets + 1)
+        self.sum = 0.0
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.series: dict[tuple, _Series] = {}
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = _Series(len(self.buckets))
+        series.counts[bisect.bisect_left(self.buckets, value)] += 1
+        series.sum += value
+
+    def time(self, *labels):
+        """Decorator observing how long a coroutine function takes."""
+        def decorator(function):
+            @functools.wraps(function)
+            async def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - started, *labels)
+            return timed
+        return decorator
+
+    def render(self) -> Iterable[str]:
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        for labels, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series.counts):
+                cumulative += count
+                bucket_labels = _labels(self.labelnames + ('le',), labels + (_number(bound),))
+                yield f'{self.name}_bucket{bucket_labels} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(series.sum)}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}'
+
+
+MESSAGE_PROCESS_SECONDS = Histogram(
+    'ntpro_message_process_seconds', 'Time spent processing a client message', ('message_type',))
+SEND_SECONDS = Histogram(
+    'ntpro_send_seconds', 'Time spent encoding and queueing a reply or report')
+SEND_QUEUE_DEPTH = Histogram(
+    'ntpro_send_queue_depth', 'Outbound queue depth of the connection when a message is sent', buckets=DEPTH_BUCKETS)
+DB_SECONDS = Histogram(
+    'ntpro_db_seconds', 'Duration of order storage calls', ('backend', 'operation'))
+LOOP_LAG_SECONDS = Histogram(
+    'ntpro_event_loop_lag_seconds', 'How late the event loop runs a scheduled wakeup')
+
+METRICS = [MESSAGE_PROCESS_SECONDS, SEND_SECONDS, SEND_QUEUE_DEPTH, DB_SECONDS, LOOP_LAG_SECONDS]
+
+
+def render(metrics: Iterable[Gauge | Histogram]) -> str:
+    return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+
+class LoopLagMonitor:
+    """Sleeps for ``interval`` in a loop and records how late it wakes up."""
+
+    def __init__(self, interval: float = METRICS_LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.last_lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return (self._task is not None and not self._task.done()
+                and self._task.get_loop() is asyncio.get_running_loop())
+
+    async def start(self):
+        if not self.is_running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if not self.is_running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(loop.time() - started - self.interval, 0.0)
+            LOOP_LAG_SECONDS.observe(self.last_lag)
@@ -5,7 +5,7 @@ import asyncio
 import datetime
 import decimal
 import uuid
-from typing import TypeVar
+from typing import Any, TypeVar
 
 import pydantic
 from server.enums import (ClientMessageType, Instrument, OrderSide,
@@ -37,6 +37,17 @@ class Envelope(pydantic.BaseModel, abc.ABC):
         ...
 
 
+CORRELATION_ID_MAX_LENGTH = 64
+CorrelationId = str | int
+
+
+def check_correlation_id(value: Any) -> CorrelationId:
+    """Correlation ids are echoed back in the replies to a request."""
+    if (type(value) is str and len(value) <= CORRELATION_ID_MAX_LENGTH) or type(value) is int:
+        return value
+    raise ValueError(f'correlationId must be an integer or a string of up to {CORRELATION_ID_MAX_LENGTH} characters')
+
+
 class Message(pydantic.BaseModel, abc.ABC):
     class Config(Camel):
         frozen = True
@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import datetime
 import decimal
+import os
 import uuid
-from typing import TYPE_CHECKING, TypeVar
+from typing import TYPE_CHECKING, Any, TypeVar
 
 import bidict as bidict
 import fastapi
@@ -10,11 +12,15 @@ import pydantic
 from server.models.base import Envelope, Message
 from server.models.server_messages import ServerMessageT
 
-from server import enums, message_processors
+from server import enums, message_processors, records
 
 if TYPE_CHECKING:
     from server.ntpro_server import NTProServer
 
+_INSTRUMENT_VALUES = {instrument.value for instrument in enums.Instrument}
+
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', '1000'))
+
 
 class ClientEnvelope(Envelope):
     message_type: enums.ClientMessageType
@@ -24,15 +30,22 @@ class ClientEnvelope(Envelope):
 
 
 class ClientMessage(Message):
-    async def process(self: ClientMessageT, server: NTProServer, websocket: fastapi.WebSocket) -> ServerMessageT:
+    async def process(self: ClientMessageT, server: NTProServer,
+                      websocket: fastapi.WebSocket) -> ServerMessageT | list[ServerMessageT]:
         return await _MESSAGE_PROCESSOR_BY_CLASS[self.__class__](server, websocket, self)
 
     def get_type(self: ClientMessageT) -> enums.ClientMessageType:
         return _CLIENT_MESSAGE_TYPE_BY_CLASS[self.__class__]
 
+    def ordering_keys(self) -> tuple | None:
+        """Requests of a connection sharing a key are processed in arrival order,
+        None orders the request after and before everything else."""
+        return ()
+
 
 class SubscribeMarketData(ClientMessage):
     instrument: enums.Instrument
+    mode: enums.MarketDataMode = enums.MarketDataMode.full
 
 
 class UnsubscribeMarketData(ClientMessage):
@@ -42,21 +55,70 @@ class UnsubscribeMarketData(ClientMessage):
 class PlaceOrder(ClientMessage):
     instrument: int
     side: enums.OrderSide
-    amount: pydantic.condecimal(gt=decimal.Decimal())
-    price: pydantic.condecimal(gt=decimal.Decimal())
+    amount: pydantic.condecimal(gt=decimal.Decimal(), le=records.MAX_AMOUNT)
+    price: pydantic.condecimal(gt=decimal.Decimal(), lt=records.MAX_PRICE)
+
+    @pydantic.validator('price')
+    def price_on_tick(cls, price, values):
+        # Unknown instruments are rejected when the order is created.
+        if values.get('instrument') not in _INSTRUMENT_VALUES:
+            return price
+        return records.tick_price(enums.Instrument(values['instrument']), price)
 
 
 class CancelOrder(ClientMessage):
     order_id: uuid.UUID
 
+    def ordering_keys(self) -> tuple | None:
+        return (self.order_id,)
+
 
 class GetOrders(ClientMessage):
-    pass
+    status: enums.OrderStatus | None = None
+    instrument: enums.Instrument | None = None
+    since: datetime.datetime | None = None
+    until: datetime.datetime | None = None
+    cursor: pydantic.conint(ge=0) | None = None
+    limit: pydantic.conint(gt=0) | None = None
+
+    @pydantic.validator('since', 'until')
+    def local_time(cls, value):
+        # Order times are naive server local time; JS clients send UTC with "Z".
+        if value is not None and value.tzinfo is not None:
+            return value.astimezone().replace(tzinfo=None)
+        return value
 
 
 class SaveOrder(ClientMessage):
     order_id: uuid.UUID
 
+    def ordering_keys(self) -> tuple | None:
+        return (self.order_id,)
+
+
+class GetMarketDataSnapshot(ClientMessage):
+    instrument: enums.Instrument
+    depth: pydantic.conint(gt=0) | None = None
+
+
+class ResnapshotMarketData(ClientMessage):
+    subscription_id: uuid.UUID
+
+
+class Batch(ClientMessage):
+    # Envelopes in the connection's format, validated one by one when processed
+    # so that a bad item only fails itself.
+    messages: list[Any]
+
+    @pydantic.validator('messages')
+    def batch_size(cls, messages):
+        if not 0 < len(messages) <= BATCH_MAX_SIZE:
+            raise ValueError(f'A batch holds from 1 to {BATCH_MAX_SIZE} messages')
+        return messages
+
+    def ordering_keys(self) -> tuple | None:
+        return None
+
 
 _MESSAGE_PROCESSOR_BY_CLASS = {
     SubscribeMarketData: message_processors.subscribe_market_data_processor,
@@ -64,6 +126,9 @@ _MESSAGE_PROCESSOR_BY_CLASS = {
     PlaceOrder: message_processors.place_order_processor,
     CancelOrder: message_processors.cancel_order_processor,
     GetOrders: message_processors.get_orders_processor,
+    GetMarketDataSnapshot: message_processors.get_market_data_snapshot_processor,
+    ResnapshotMarketData: message_processors.resnapshot_market_data_processor,
+    Batch: message_processors.batch_processor,
 }
 
 _CLIENT_MESSAGE_TYPE_BY_CLASS = bidict.bidict(
@@ -73,6 +138,9 @@ _CLIENT_MESSAGE_TYPE_BY_CLASS = bidict.bidict(
         PlaceOrder: enums.ClientMessageType.place_order,
         CancelOrder: enums.ClientMessageType.cancel_order,
         GetOrders: enums.ClientMessageType.get_orders,
+        GetMarketDataSnapshot: enums.ClientMessageType.get_market_data_snapshot,
+        ResnapshotMarketData: enums.ClientMessageType.resnapshot_market_data,
+        Batch: enums.ClientMessageType.batch,
     }
 )
 
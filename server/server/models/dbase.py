@@ -1,12 +1,13 @@
 import os
 from functools import partial
 
-import databases
 import sqlalchemy
 from dotenv import load_dotenv
+from server.db_pool import DatabasePool
 from server.enums import Instrument, OrderSide, OrderStatus
 from server.pytest_conditions import RUN_FROM_PYTEST
-from sqlalchemy import Column, DateTime, Integer, String
+from server.records import PRICE_DECIMALS, PRICE_MAX_DIGITS
+from sqlalchemy import Column, DateTime, Index, Integer, String
 from sqlalchemy.dialects.postgresql import ENUM, UUID
 from sqlalchemy.types import DECIMAL
 
@@ -17,30 +18,61 @@ POSTGRES_USER = os.getenv("POSTGRES_USER", "user")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "password")
 DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_PORT = os.getenv("DB_PORT", "5432")
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "5"))
 
 if RUN_FROM_PYTEST:
     TEST_DB_NAME = 'test_db'
     TEST_SQLALCHEMY_DATABASE_URL = (
         f'postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{DB_HOST}:{DB_PORT}/{TEST_DB_NAME}')
-    database = databases.Database(TEST_SQLALCHEMY_DATABASE_URL)
+    DATABASE_URL = TEST_SQLALCHEMY_DATABASE_URL
 else:
     SQLALCHEMY_DATABASE_URL = (
         f'postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}')
-    database = databases.Database(SQLALCHEMY_DATABASE_URL)
+    DATABASE_URL = SQLALCHEMY_DATABASE_URL
+
+database = DatabasePool(DATABASE_URL,
+                        min_size=DB_POOL_MIN_SIZE,
+                        max_size=DB_POOL_MAX_SIZE,
+                        acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT)
 
 ReqColumn = partial(Column, nullable=False)
 metadata = sqlalchemy.MetaData()
 
+# Partial index predicate and retention filter must match literally for the
+# planner to use the index.
+finished_orders = sqlalchemy.text("status <> 'active'")
+
+
+def order_columns():
+    return [
+        ReqColumn('uuid', UUID(as_uuid=True), primary_key=True),
+        ReqColumn('instrument', ENUM(Instrument)),
+        ReqColumn('side', ENUM(OrderSide)),
+        ReqColumn('status', ENUM(OrderStatus)),
+        ReqColumn('amount', Integer),
+        ReqColumn('price', DECIMAL(PRICE_MAX_DIGITS, PRICE_DECIMALS)),
+        ReqColumn('address', String),
+        Column('account', String),
+        ReqColumn('creation_time', DateTime()),
+        ReqColumn('change_time', DateTime()),
+    ]
+
+
 orders_table = sqlalchemy.Table(
     'orders',
     metadata,
-    ReqColumn('uuid', UUID(as_uuid=True), primary_key=True),
-    ReqColumn('instrument', ENUM(Instrument)),
-    ReqColumn('side', ENUM(OrderSide)),
-    ReqColumn('status', ENUM(OrderStatus)),
-    ReqColumn('amount', Integer),
-    ReqColumn('price', DECIMAL),
-    ReqColumn('address', String),
-    ReqColumn('creation_time', DateTime()),
-    ReqColumn('change_time', DateTime()),
+    *order_columns(),
+    Index('ix_orders_account_status_creation_time', 'account', 'status', 'creation_time'),
+    Index('ix_orders_address_status_creation_time', 'address', 'status', 'creation_time'),
+    Index('ix_orders_finished_change_time', 'change_time', postgresql_where=finished_orders),
+)
+
+orders_archive_table = sqlalchemy.Table(
+    'orders_archive',
+    metadata,
+    *order_columns(),
+    Index('ix_orders_archive_account_creation_time', 'account', 'creation_time'),
+    Index('ix_orders_archive_address_creation_time', 'address', 'creation_time'),
 )
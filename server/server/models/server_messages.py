@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import decimal
 import uuid
-from typing import TypeVar
+from typing import Any, TypeVar
 
 import bidict as bidict
 from server.models.base import Envelope, Message, OrderOut, Quote
@@ -27,14 +28,44 @@ class ExecutionReport(ServerMessage):
     order_status: enums.OrderStatus
 
 
+class TradeReport(ServerMessage):
+    order_id: uuid.UUID
+    instrument: enums.Instrument
+    side: enums.OrderSide
+    price: decimal.Decimal
+    amount: int
+    remaining_amount: int
+
+
 class MarketDataUpdate(ServerMessage):
     subscription_id: uuid.UUID
     instrument: enums.Instrument
     quotes: list[Quote]
+    sequence: int | None = None
+
+
+class MarketDataDelta(ServerMessage):
+    subscription_id: uuid.UUID
+    instrument: enums.Instrument
+    sequence: int
+    quotes: list[Quote]
+    removed: int
 
 
 class OrdersList(ServerMessage):
     orders: list[OrderOut]
+    next_cursor: int | None = None
+    partial: bool = False
+
+
+class MarketDataSnapshot(ServerMessage):
+    instrument: enums.Instrument
+    quotes: list[Quote]
+
+
+class BatchResult(ServerMessage):
+    # Per batch item, in order, the envelopes of its replies in the connection's format.
+    results: list[list[Any]]
 
 
 class ServerEnvelope(Envelope):
@@ -57,6 +88,10 @@ _SERVER_MESSAGE_TYPE_BY_CLASS = bidict.bidict(
         ExecutionReport: enums.ServerMessageType.execution_report,
         MarketDataUpdate: enums.ServerMessageType.market_data_update,
         OrdersList: enums.ServerMessageType.orders_list,
+        MarketDataSnapshot: enums.ServerMessageType.market_data_snapshot,
+        TradeReport: enums.ServerMessageType.trade_report,
+        MarketDataDelta: enums.ServerMessageType.market_data_delta,
+        BatchResult: enums.ServerMessageType.batch_result,
     }
 )
 ServerMessageT = TypeVar('ServerMessageT', bound=ServerMessage)
@@ -1,70 +1,320 @@
 import asyncio
+import contextvars
+import datetime
+import decimal
+import enum
+import itertools
 import json
+import time
 import uuid
-from random import randrange
-from typing import List
+from collections import OrderedDict
 
 import fastapi
 import pydantic
 import starlette.datastructures
 from bidict import bidict
-from server.enums import Instrument
-from server.message_processors import gen_order, gen_quote
-from server.models import base, client_messages, server_messages
-from server.pytest_conditions import RUN_FROM_PYTEST
+from server.connection import ClientConnection
+from server.enums import Instrument, OrderStatus
+from server.market_data import MarketDataEngine
+from server.models import base, server_messages
+from server.order_book import OrderBook
+from server.order_engine import OrderEngine
+from server.order_journal import JournalWriteError, OrderJournal
+from server.order_retention import OrderRetention
+from server.order_store import (ACCOUNT_ACTIVE_ORDERS_LIMIT, ACCOUNT_CACHE_SIZE,
+                                ACCOUNT_HISTORY_LIMIT, ClientOrders)
+from server.pipeline import PIPELINE_MAX_IN_FLIGHT, Pipeline
+from server.quote_history import QuoteHistory, QuoteValues
+from server.records import OrderRecord
+from server.state_bus import Bus, create_bus
+from server.storage import OrderStorage, create_storage
 
+from server import message_processors, metrics, serializers, wire
 
-def quote_condition():
-    return True if RUN_FROM_PYTEST else randrange(0, 1000) % 5 == 0
+QUOTES_CHANNEL = 'quotes'
+ORDERS_NAMESPACE = 'orders'
 
+# The task, connection and correlation id of the request being processed;
+# replies the task sends to that connection carry the id. Tasks started from
+# the request inherit the variable, hence the task check.
+_REQUEST: contextvars.ContextVar[tuple | None] = contextvars.ContextVar('ntpro_request', default=None)
 
-TIMEOUT = 0.5 if RUN_FROM_PYTEST else 10
+
+def _shared_value(value):
+    if isinstance(value, enum.Enum):
+        return value.name
+    if isinstance(value, (uuid.UUID, decimal.Decimal)):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
 
 
 class NTProServer:
-    def __init__(self):
-        self.connections: dict[starlette.datastructures.Address, fastapi.WebSocket] = {}
+    def __init__(self, bus: Bus | None = None, storage: OrderStorage | None = None):
+        self.connections: dict[starlette.datastructures.Address, ClientConnection] = {}
         self.subscribes: dict[starlette.datastructures.Address, bidict] = {}
-        self.orders: dict[starlette.datastructures.Address, dict[uuid.UUID, base.OrderIn]] = {}
-        self.quotes: dict[Instrument, List[base.Quote]] = dict(zip(Instrument, [[] for _ in range(len(Instrument))]))
+        self.subscribers: dict[Instrument, dict[starlette.datastructures.Address, uuid.UUID]] = {
+            instrument: {} for instrument in Instrument}
+        self.delta_subscriptions: set[uuid.UUID] = set()
+        self.orders: dict[starlette.datastructures.Address, ClientOrders] = {}
+        self.accounts: OrderedDict[str, ClientOrders] = OrderedDict()
+        self.order_books: dict[Instrument, OrderBook] = {instrument: OrderBook() for instrument in Instrument}
+        self.quotes: dict[Instrument, QuoteHistory] = {instrument: QuoteHistory() for instrument in Instrument}
+        self.bus = bus or create_bus()
+        self.storage = storage or create_storage()
+        self.bus.subscribe(QUOTES_CHANNEL, self._on_quote)
+        self.journal = OrderJournal(self._write_orders)
+        self.market_data = MarketDataEngine(self)
+        self.order_engine = OrderEngine(self)
+        self.retention = OrderRetention(self.storage.archive_orders)
+        self.loop_lag = metrics.LoopLagMonitor()
+        self.max_in_flight = PIPELINE_MAX_IN_FLIGHT
+        self._started_on_connect = False
+
+    @property
+    def is_running(self) -> bool:
+        return self.journal.is_running
+
+    async def start(self):
+        await self.bus.start()
+        await self.journal.start()
+        await self.bus.elect(self._on_elected, self._on_lost)
+        await self.order_engine.start()
+        await self.loop_lag.start()
+
+    async def stop(self):
+        await self.loop_lag.stop()
+        await self.order_engine.stop()
+        await self._on_lost()
+        await self.journal.stop()
+        await self.bus.stop()
+
+    async def _on_elected(self):
+        # Jobs that must run in a single worker.
+        await self.market_data.start()
+        await self.retention.start()
+
+    async def _on_lost(self):
+        await self.retention.stop()
+        await self.market_data.stop()
+
+    async def publish_quote(self, instrument: Instrument, quote: QuoteValues):
+        await self.bus.publish(QUOTES_CHANNEL, [instrument.value, list(quote)])
+
+    async def _on_quote(self, payload: list):
+        instrument, values = payload
+        await message_processors.fan_out_quote(self, Instrument(instrument), tuple(values))
+
+    async def _write_orders(self, inserts: list[dict], updates: list[dict]):
+        # Active orders are shared with the other workers once they are
+        # persisted; finished ones are looked up in the database.
+        await self.storage.write_orders(inserts, updates)
+        for row in itertools.chain(inserts, updates):
+            shared = None
+            if row['status'] == OrderStatus.active:
+                shared = {key: _shared_value(value) for key, value in row.items()}
+            await self.bus.put(ORDERS_NAMESPACE, str(row['uuid']), shared)
+
+    async def get_order(self, order_id: uuid.UUID) -> dict | None:
+        order = await self.bus.get(ORDERS_NAMESPACE, str(order_id))
+        if order is None:
+            row = await self.storage.read_order(order_id)
+            if row is not None:
+                order = {key: _shared_value(value) for key, value in row.items()}
+        return order
+
+    async def load_orders(self, orders: ClientOrders, *, active: bool):
+        rows = await self.storage.read_account_orders(
+            orders.account, active=active, limit=ACCOUNT_ACTIVE_ORDERS_LIMIT if active else ACCOUNT_HISTORY_LIMIT)
+        orders.load((row['uuid'], OrderRecord.from_row(row)) for row in rows)
+
+    async def load_history(self, orders: ClientOrders):
+        if not orders.history_loaded:
+            await self.load_orders(orders, active=False)
+            orders.history_loaded = True
+
+    async def account_orders(self, account: str | None) -> ClientOrders:
+        # Orders of an account stay in memory while it is connected and for a
+        # while after; otherwise only its active orders are read back.
+        if account is None:
+            return ClientOrders()
+        orders = self.accounts.get(account)
+        if orders is None:
+            orders = ClientOrders(account)
+            await self.load_orders(orders, active=True)
+            self.accounts[account] = orders
+        self.accounts.move_to_end(account)
+        return orders
+
+    @staticmethod
+    def identify(websocket: fastapi.WebSocket) -> str | None:
+        return websocket.query_params.get('account') or None
 
     async def connect(self, websocket: fastapi.WebSocket):
-        await websocket.accept()
-        self.connections[websocket.client] = websocket
+        if not self.is_running:
+            await self.start()
+            self._started_on_connect = True
+        orders = await self.account_orders(self.identify(websocket))
+        codec, subprotocol = wire.negotiate(websocket)
+        await websocket.accept(subprotocol=subprotocol)
+        self.connections[websocket.client] = ClientConnection(websocket, codec=codec)
         self.subscribes[websocket.client] = bidict()
-        self.orders[websocket.client] = {}
+        self.orders[websocket.client] = orders
+        orders.websockets.append(websocket)
+        # Another connection of the account already has its orders scheduled.
+        if len(orders.websockets) == 1:
+            active_orders, _ = orders.query(status=OrderStatus.active)
+            for order_id, _ in active_orders:
+                self.order_engine.schedule(orders, order_id)
 
     async def disconnect(self, websocket: fastapi.WebSocket):
-        self.connections.pop(websocket.client)
-        self.subscribes.pop(websocket.client)
-        self.orders.pop(websocket.client)
+        self.connections.pop(websocket.client).close()
+        for subscription_id, instrument in self.subscribes.pop(websocket.client).items():
+            self.subscribers[instrument].pop(websocket.client, None)
+            self.delta_subscriptions.discard(subscription_id)
+        orders = self.orders.pop(websocket.client)
+        orders.websockets.remove(websocket)
+        # While the account stays connected its remaining connections get the
+        # fills and reports of its orders, see ClientOrders.websocket.
+        if not orders.websockets:
+            active_orders, _ = orders.query(status=OrderStatus.active)
+            for order_id, order in active_orders:
+                self.order_books[order.instrument].cancel(order_id)
+            self._evict_accounts()
+        if self._started_on_connect and not self.connections:
+            # Without lifespan events (TestClient sessions each run their own
+            # loop) storage opened lazily in this loop is closed in it too.
+            await self.stop()
+            await self.storage.disconnect()
+            self._started_on_connect = False
+
+    def _evict_accounts(self):
+        connected = {orders.account for orders in self.orders.values()}
+        for account in list(itertools.islice(self.accounts, max(len(self.accounts) - ACCOUNT_CACHE_SIZE, 0))):
+            if account not in connected:
+                del self.accounts[account]
 
     async def serve(self, websocket: fastapi.WebSocket):
-        while True:
-            try:
-                raw_envelope = await asyncio.wait_for(websocket.receive_json(), timeout=TIMEOUT)
-                envelope = client_messages.ClientEnvelope.parse_obj(raw_envelope)
-                message = envelope.get_parsed_message()
-                response = await message.process(self, websocket)
-                await self.send(response, websocket)
+        # Frames keep being read while earlier requests wait, e.g. for the
+        # database; see Pipeline for the limits and the ordering.
+        codec = self.connections[websocket.client].codec
+        pipeline = Pipeline(self.max_in_flight)
+        try:
+            while True:
+                frame = await self.receive(websocket)
+                correlation_id = None
+                try:
+                    envelope, correlation_id = codec.unwrap(frame)
+                    message = codec.decode_envelope(envelope)
+                except json.decoder.JSONDecodeError:
+                    await self._reply(server_messages.ErrorInfo(reason='The message is not a valid JSON'),
+                                      websocket, correlation_id)
+                    continue
+                except ValueError as ex:
+                    # Validation and decoding errors, a bad correlation id.
+                    await self._reply(server_messages.ErrorInfo(reason=str(ex)), websocket, correlation_id)
+                    continue
+                await pipeline.submit(message.ordering_keys(), self._process(message, websocket, correlation_id))
+        finally:
+            await pipeline.close()
 
-            except asyncio.TimeoutError:
-                await gen_order(self, websocket)
+    async def _process(self, message: base.MessageT, websocket: fastapi.WebSocket,
+                       correlation_id: base.CorrelationId | None):
+        _REQUEST.set((asyncio.current_task(), websocket.client, correlation_id))
+        started = time.perf_counter()
+        try:
+            responses = await message.process(self, websocket)
+        except (pydantic.ValidationError, JournalWriteError) as ex:
+            responses = server_messages.ErrorInfo(reason=str(ex))
+        else:
+            metrics.MESSAGE_PROCESS_SECONDS.observe(time.perf_counter() - started, message.get_type().name)
+        for response in responses if isinstance(responses, list) else [responses]:
+            await self.send(response, websocket)
 
-                if quote_condition():
-                    await gen_quote(self)
+    async def _reply(self, message: base.MessageT, websocket: fastapi.WebSocket,
+                     correlation_id: base.CorrelationId | None):
+        token = _REQUEST.set((asyncio.current_task(), websocket.client, correlation_id))
+        try:
+            await self.send(message, websocket)
+        finally:
+            _REQUEST.reset(token)
 
-            except pydantic.ValidationError as ex:
-                await self.send(server_messages.ErrorInfo(reason=str(ex)), websocket)
+    async def drain(self, websocket: fastapi.WebSocket):
+        connection = self.connections.get(websocket.client)
+        if connection is not None:
+            await connection.drain()
 
-            except json.decoder.JSONDecodeError:
-                await self.send(server_messages.ErrorInfo(
-                    reason='The message is not a valid JSON'), websocket)
+    @staticmethod
+    async def receive(websocket: fastapi.WebSocket) -> str | bytes:
+        message = await websocket.receive()
+        if message['type'] == 'websocket.disconnect':
+            raise fastapi.WebSocketDisconnect(message.get('code', 1000))
+        return message['text'] if message.get('text') is not None else message['bytes']
 
     @staticmethod
-    async def send(message: base.MessageT, websocket: fastapi.WebSocket):
-        await websocket.send_text(
-            server_messages.ServerEnvelope(message_type=message.get_type(),
-                                           message=message.dict(by_alias=True)
-                                           ).json(by_alias=True)
-        )
+    def serialize(message: base.MessageT) -> str:
+        return serializers.serialize(message)
+
+    async def send(self, message: base.MessageT, websocket: fastapi.WebSocket):
+        connection = self.connections.get(websocket.client)
+        if connection is not None:
+            request = _REQUEST.get()
+            correlation_id = None
+            if request is not None and request[0] is asyncio.current_task() and request[1] == websocket.client:
+                correlation_id = request[2]
+            started = time.perf_counter()
+            connection.send(connection.codec.encode(message, correlation_id))
+            metrics.SEND_SECONDS.observe(time.perf_counter() - started)
+            metrics.SEND_QUEUE_DEPTH.observe(connection.depth)
+
+    async def broadcast(self, instrument: Instrument, update: server_messages.MarketDataUpdate,
+                        delta: server_messages.MarketDataDelta | None = None):
+        subscribers = self.subscribers[instrument]
+        if not subscribers:
+            return
+
+        # The payload only differs by subscription id, so it is rendered once
+        # per codec around a placeholder id and the real one is spliced in per client.
+        # Incremental subscribers get the delta unless their connection lost a
+        # frame of the subscription or would conflate it, then a fresh snapshot.
+        frames = {}
+        for client, subscription_id in subscribers.items():
+            connection = self.connections[client]
+            message = update
+            if (delta is not None and subscription_id in self.delta_subscriptions
+                    and not connection.needs_snapshot(subscription_id)):
+                message = delta
+            codec = connection.codec
+            parts = frames.get((codec.name, message.get_type()))
+            if parts is None:
+                parts = frames[codec.name, message.get_type()] = codec.encode(message).split(
+                    codec.encode_id(message.subscription_id), 1)
+            connection.send_market_data(subscription_id, parts[0] + codec.encode_id(subscription_id) + parts[1],
+                                        snapshot=message is update)
+
+    def collect_metrics(self) -> list[metrics.Gauge]:
+        connections = metrics.Gauge('ntpro_connections', 'Open websocket connections')
+        connections.set(len(self.connections))
+        queue_depth = metrics.Gauge('ntpro_outbound_queue_depth', 'Messages waiting in outbound queues')
+        queue_depth.set(sum(connection.depth for connection in self.connections.values()))
+        subscriptions = metrics.Gauge('ntpro_subscriptions', 'Market data subscriptions', ('instrument',))
+        for instrument, subscribers in self.subscribers.items():
+            subscriptions.set(len(subscribers), instrument.name)
+        orders = metrics.Gauge('ntpro_orders', 'Orders held in memory', ('status',))
+        stores = {id(store): store for store in itertools.chain(self.orders.values(), self.accounts.values())}
+        for status in OrderStatus:
+            orders.set(sum(store.count(status) for store in stores.values()), status.name)
+        lag = metrics.Gauge('ntpro_event_loop_lag_last_seconds', 'Event loop lag at the last measurement')
+        lag.set(self.loop_lag.last_lag)
+        return [connections, queue_depth, subscriptions, orders, lag]
+
+    def stats(self) -> dict:
+        connections = {str(client): connection.stats() for client, connection in self.connections.items()}
+        return {
+            'connections': len(connections),
+            'queue_depth': sum(stats['queue_depth'] for stats in connections.values()),
+            'dropped': sum(stats['dropped'] for stats in connections.values()),
+            'conflated': sum(stats['conflated'] for stats in connections.values()),
+            'per_connection': connections,
+        }
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import bisect
+import uuid
+from collections import OrderedDict
+from typing import Any, NamedTuple
+
+from server.enums import OrderSide
+
+
+class RestingOrder:
+    __slots__ = ('order_id', 'side', 'price', 'amount', 'owner')
+
+    def __init__(self, order_id: uuid.UUID, side: OrderSide, price: int, amount: int, owner: Any):
+        self.order_id = order_id
+        self.side = side
+        self.price = price
+        self.amount = amount
+        self.owner = owner
+
+
+class Fill(NamedTuple):
+    maker: RestingOrder
+    price: int
+    amount: int
+    taker_remaining: int
+
+
+class OrderBook:
+    """Limit order book of one instrument with price-time priority.
+
+    Prices are fixed-point integers (see ``server.records``). Every side keeps
+    a dict of price levels, each an ``OrderedDict`` of resting orders in
+    arrival order, and a sorted list of level keys whose last element is the
+    best price. Orders can be cancelled by id in O(1),
+    plus O(levels) when their level becomes empty.
+    """
+
+    def __init__(self):
+        self._levels: dict[OrderSide, dict[int, OrderedDict[uuid.UUID, RestingOrder]]] = {
+            OrderSide.buy: {}, OrderSide.sell: {}}
+        self._keys: dict[OrderSide, list[int]] = {OrderSide.buy: [], OrderSide.sell: []}
+        self._orders: dict[uuid.UUID, RestingOrder] = {}
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __contains__(self, order_id: uuid.UUID) -> bool:
+        return order_id in self._orders
+
+    @staticmethod
+    def _key(side: OrderSide, price: int) -> int:
+        return price if side is OrderSide.buy else -price
+
+    def best_price(self, side: OrderSide) -> int | None:
+        keys = self._keys[side]
+        return self._key(side, keys[-1]) if keys else None
+
+    def depth(self, side: OrderSide) -> list[tuple[int, int]]:
+        levels = self._levels[side]
+        return [(price, sum(order.amount for order in levels[price].values()))
+                for price in (self._key(side, key) for key in reversed(self._keys[side]))]
+
+    def add(self, order_id: uuid.UUID, side: OrderSide, price: int, amount: int, owner: Any = None) -> list[Fill]:
+        fills = []
+        opposite = OrderSide.sell if side is OrderSide.buy else OrderSide.buy
+        levels, keys = self._levels[opposite], self._keys[opposite]
+        while amount and keys:
+            best = self._key(opposite, keys[-1])
+            if best > price if side is OrderSide.buy else best < price:
+                break
+            level = levels[best]
+            while amount and level:
+                maker = next(iter(level.values()))
+                traded = min(amount, maker.amount)
+                maker.amount -= traded
+                amount -= traded
+                if not maker.amount:
+                    del level[maker.order_id]
+                    del self._orders[maker.order_id]
+                fills.append(Fill(maker, best, traded, amount))
+            if not level:
+                del levels[best]
+                keys.pop()
+
+        if amount:
+            self._rest(RestingOrder(order_id, side, price, amount, owner))
+        return fills
+
+    def _rest(self, order: RestingOrder):
+        levels = self._levels[order.side]
+        level = levels.get(order.price)
+        if level is None:
+            level = levels[order.price] = OrderedDict()
+            bisect.insort(self._keys[order.side], self._key(order.side, order.price))
+        level[order.order_id] = order
+        self._orders[order.order_id] = order
+
+    def cancel(self, order_id: uuid.UUID) -> RestingOrder | None:
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return None
+        levels = self._levels[order.side]
+        level = levels[order.price]
+        del level[order_id]
+        if not level:
+            del levels[order.price]
+            keys = self._keys[order.side]
+            del keys[bisect.bisect_left(keys, self._key(order.side, order.price))]
+        return order
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import uuid
+from typing import TYPE_CHECKING
+
+from server.message_processors import gen_order
+from server.pytest_conditions import RUN_FROM_PYTEST
+
+if TYPE_CHECKING:
+    from server.ntpro_server import NTProServer
+    from server.order_store import ClientOrders
+
+ORDER_FILL_DELAY_MIN = float(os.getenv('ORDER_FILL_DELAY_MIN', '0.5' if RUN_FROM_PYTEST else '5'))
+ORDER_FILL_DELAY_MAX = float(os.getenv('ORDER_FILL_DELAY_MAX', '0.5' if RUN_FROM_PYTEST else '15'))
+
+
+class OrderEngine:
+    """Moves active orders to filled or rejected at their scheduled time.
+
+    Orders are kept in a heap keyed by the time they are due, so every tick
+    costs O(log n) in the number of scheduled orders instead of a scan of all
+    stored orders. Cancelled orders are skipped when they come due, and so
+    are the orders of accounts that are not connected by then.
+    """
+
+    def __init__(self, server: NTProServer, *,
+                 min_delay: float = ORDER_FILL_DELAY_MIN,
+                 max_delay: float = ORDER_FILL_DELAY_MAX,
+                 seed: int | None = None):
+        self.server = server
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.random = random.Random(seed)
+        self.processed = 0
+        self._queue: list[tuple[float, int, ClientOrders, uuid.UUID]] = []
+        self._sequence = itertools.count()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def scheduled(self) -> int:
+        return len(self._queue)
+
+    @property
+    def is_running(self) -> bool:
+        return (self._task is not None and not self._task.done()
+                and self._task.get_loop() is asyncio.get_running_loop())
+
+    async def start(self):
+        if not self.is_running:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if not self.is_running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def schedule(self, orders: ClientOrders, order_id: uuid.UUID):
+        due = asyncio.get_running_loop().time() + self.random.uniform(self.min_delay, self.max_delay)
+        entry = (due, next(self._sequence), orders, order_id)
+        heapq.heappush(self._queue, entry)
+        if self._queue[0] is entry and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            if not self._queue:
+                await self._wakeup.wait()
+                continue
+
+            due = self._queue[0][0]
+            if due > loop.time():
+                timer = loop.call_at(due, self._wakeup.set)
+                try:
+                    await self._wakeup.wait()
+                finally:
+                    timer.cancel()
+                continue
+
+            _, _, orders, order_id = heapq.heappop(self._queue)
+            await gen_order(self.server, orders, order_id)
+            self.processed += 1
+
+    def stats(self) -> dict:
+        return {'scheduled': self.scheduled, 'processed': self.processed}
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import logging
+import os
+import uuid
+from itertools import islice
+from typing import Awaitable, Callable
+
+from server.records import OrderRecord, from_ns
+
+logger = logging.getLogger(__name__)
+
+ORDER_JOURNAL_BATCH_SIZE = int(os.getenv('ORDER_JOURNAL_BATCH_SIZE', '500'))
+ORDER_JOURNAL_FLUSH_INTERVAL = float(os.getenv('ORDER_JOURNAL_FLUSH_INTERVAL', '0.05'))
+ORDER_JOURNAL_MAX_PENDING = int(os.getenv('ORDER_JOURNAL_MAX_PENDING', '10000'))
+ORDER_JOURNAL_DURABLE = os.getenv('ORDER_JOURNAL_DURABLE', 'false').lower() in ('1', 'true', 'yes')
+ORDER_JOURNAL_STOP_TIMEOUT = float(os.getenv('ORDER_JOURNAL_STOP_TIMEOUT', '10'))
+ORDER_JOURNAL_RETRY_DELAY = 0.5
+
+Writer = Callable[[list[dict], list[dict]], Awaitable[None]]
+
+# Commit waiters of the durable writes made inside ``OrderJournal.batch``.
+_batch_waiters: contextvars.ContextVar[list[asyncio.Future] | None] = contextvars.ContextVar(
+    'order_journal_batch_waiters', default=None)
+
+
+class JournalWriteError(Exception):
+    """The writes of an order were dropped without being committed."""
+
+
+class _Entry:
+    __slots__ = ('insert', 'update', 'waiters')
+
+    def __init__(self):
+        self.insert: dict | None = None
+        self.update: dict | None = None
+        self.waiters: list[asyncio.Future] = []
+
+    def apply_update(self, values: dict):
+        if self.insert is not None:
+            self.insert.update(values)
+        else:
+            self.update = values
+
+    def merge(self, later: _Entry):
+        if later.insert is not None:
+            self.insert = later.insert
+        if later.update is not None:
+            self.apply_update(later.update)
+        self.waiters.extend(later.waiters)
+
+
+class OrderJournal:
+    """Write-behind journal of order inserts and status updates.
+
+    Writes for the same order are coalesced while they wait in memory and are
+    flushed in batches by a single background task, so an order's insert is
+    always written before its updates. A batch is flushed once it is full or
+    ``flush_interval`` after its first write; an empty journal does not wake
+    up. ``insert``/``update`` block while the journal holds ``max_pending``
+    orders and, when ``durable`` is set, until the write is committed.
+
+    A failed batch is split to write the orders the database accepts. Orders
+    it rejects while accepting others are dropped; everything else is retried
+    until it is written, with ``max_pending`` holding writers back meanwhile.
+    Only ``stop`` gives up on the retries when it runs out of time. Dropped
+    rows are logged and their durable writers get a ``JournalWriteError``.
+    """
+
+    def __init__(self, writer: Writer, *,
+                 batch_size: int = ORDER_JOURNAL_BATCH_SIZE,
+                 flush_interval: float = ORDER_JOURNAL_FLUSH_INTERVAL,
+                 max_pending: int = ORDER_JOURNAL_MAX_PENDING,
+                 durable: bool = ORDER_JOURNAL_DURABLE,
+                 retry_delay: float = ORDER_JOURNAL_RETRY_DELAY,
+                 stop_timeout: float = ORDER_JOURNAL_STOP_TIMEOUT):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.durable = durable
+        self.retry_delay = retry_delay
+        self.stop_timeout = stop_timeout
+        self.flushed_batches = 0
+        self.flushed_orders = 0
+        self.failed_flushes = 0
+        self.dropped_orders = 0
+        self._pending: dict[uuid.UUID, _Entry] = {}
+        self._flushing: dict[uuid.UUID, _Entry] = {}
+        self._task: asyncio.Task | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._space: asyncio.Event | None = None
+        self._flush_timer: asyncio.TimerHandle | None = None
+        self._stopping = False
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def is_running(self) -> bool:
+        return (self._task is not None and not self._task.done()
+                and self._task.get_loop() is asyncio.get_running_loop())
+
+    async def start(self):
+        if self.is_running:
+            return
+        for entry in self._pending.values():
+            entry.waiters.clear()
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._stopping = False
+        self._flush_timer = None
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        if self._pending:
+            self._schedule_flush()
+
+    async def stop(self):
+        if not self.is_running:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        done, _ = await asyncio.wait([self._task], timeout=self.stop_timeout)
+        if not done:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            unwritten = {**self._flushing, **self._pending}
+            self._flushing, self._pending = {}, {}
+            logger.critical('Order journal stopped with %d orders not written in %s s, dropping them',
+                            len(unwritten), self.stop_timeout)
+            self._drop(unwritten, 'the journal was stopped before the database took it')
+            self._space.set()
+        self._task = None
+        self._cancel_flush_timer()
+
+    @contextlib.asynccontextmanager
+    async def batch(self):
+        """Flush the writes made inside together on exit instead of waiting
+        for the next interval, and wait for them once when ``durable``.
+
+        Failed writes do not raise: the yielded list holds the futures of the
+        writes in the order they were made, to check which of them failed.
+        """
+        waiters = []
+        token = _batch_waiters.set(waiters)
+        try:
+            yield waiters
+        finally:
+            _batch_waiters.reset(token)
+            if self.is_running:
+                self._wakeup.set()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+    async def insert(self, address: str, order_id: uuid.UUID, order: OrderRecord, account: str | None = None):
+        row = dict(uuid=order_id, address=address, account=account, **order.row())
+        await self._submit(order_id, 'insert', row)
+
+    async def update(self, order_id: uuid.UUID, order: OrderRecord):
+        values = dict(status=order.status, change_time=from_ns(order.change_time))
+        await self._submit(order_id, 'update', values)
+
+    async def _submit(self, order_id: uuid.UUID, kind: str, values: dict):
+        if not self.is_running:
+            await self.start()
+
+        while order_id not in self._pending and len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+            self._space.clear()
+            await self._space.wait()
+
+        entry = self._pending.get(order_id)
+        if entry is None:
+            entry = self._pending[order_id] = _Entry()
+        if kind == 'insert':
+            entry.insert = values
+        else:
+            entry.apply_update(values)
+
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        else:
+            self._schedule_flush()
+
+        if self.durable:
+            waiter = asyncio.get_running_loop().create_future()
+            entry.waiters.append(waiter)
+            batch_waiters = _batch_waiters.get()
+            if batch_waiters is None:
+                await waiter
+            else:
+                batch_waiters.append(waiter)
+
+    async def _run(self):
+        while not (self._stopping and not self._pending):
+            if not self._stopping and len(self._pending) < self.batch_size:
+                await self._wakeup.wait()
+            self._wakeup.clear()
+            self._cancel_flush_timer()
+            if self._pending and not await self._flush():
+                await asyncio.sleep(self.retry_delay)
+            if self._pending:
+                self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(self.flush_interval, self._wakeup.set)
+
+    def _cancel_flush_timer(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+    async def _flush(self) -> bool:
+        batch = {order_id: self._pending.pop(order_id)
+                 for order_id in list(islice(self._pending, self.batch_size))}
+        self._flushing = dict(batch)
+        rejected, failed, error = await self._write_splitting(batch)
+        self._flushing = {}
+        self._space.set()
+        self._drop(rejected, f'rejected by the database: {error!r}')
+        if not failed:
+            return True
+
+        logger.error('Failed to flush %d orders, retrying', len(failed), exc_info=error)
+        for order_id, entry in self._pending.items():
+            if order_id in failed:
+                failed[order_id].merge(entry)
+            else:
+                failed[order_id] = entry
+        self._pending = failed
+        return False
+
+    async def _write_splitting(self, batch: dict[uuid.UUID, _Entry]) -> tuple[dict, dict, Exception | None]:
+        """Write ``batch``; while only one half of a failed batch fails again,
+        narrow the failure down to it. Returns the order the database rejects
+        again after accepting the others, the orders to retry and the last
+        error."""
+        error = await self._write(batch)
+        narrowed = False
+        while error is not None and len(batch) > 1:
+            items = list(batch.items())
+            halves = dict(items[:len(items) // 2]), dict(items[len(items) // 2:])
+            errors = [await self._write(half) for half in halves]
+            if all(errors):
+                return {}, batch, errors[-1]
+            narrowed = True
+            batch, error = (halves[0], errors[0]) if errors[0] else (halves[1], errors[1])
+        if narrowed and error is not None:
+            # The database took the other half, unless it has just recovered.
+            error = await self._write(batch)
+        if error is None:
+            return {}, {}, None
+        return (batch, {}, error) if narrowed else ({}, batch, error)
+
+    async def _write(self, batch: dict[uuid.UUID, _Entry]) -> Exception | None:
+        inserts = [entry.insert for entry in batch.values() if entry.insert is not None]
+        updates = [dict(uuid=order_id, **entry.update)
+                   for order_id, entry in batch.items() if entry.insert is None]
+        try:
+            await self.writer(inserts, updates)
+        except Exception as ex:
+            self.failed_flushes += 1
+            return ex
+
+        self.flushed_batches += 1
+        self.flushed_orders += len(batch)
+        for order_id, entry in batch.items():
+            self._flushing.pop(order_id, None)
+            for waiter in entry.waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+        return None
+
+    def _drop(self, entries: dict[uuid.UUID, _Entry], reason: str):
+        for order_id, entry in entries.items():
+            logger.error('Dropped the writes of order %s, %s: insert=%s update=%s',
+                         order_id, reason, entry.insert, entry.update)
+            self.dropped_orders += 1
+            for waiter in entry.waiters:
+                if not waiter.done():
+                    waiter.set_exception(JournalWriteError(f'The order {order_id} was not saved'))
+
+    def stats(self) -> dict:
+        return {
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'flushed_batches': self.flushed_batches,
+            'flushed_orders': self.flushed_orders,
+            'failed_flushes': self.failed_flushes,
+            'dropped_orders': self.dropped_orders,
+        }
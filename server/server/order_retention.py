@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+import os
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+ORDER_RETENTION_DAYS = float(os.getenv('ORDER_RETENTION_DAYS', '30'))
+ORDER_RETENTION_INTERVAL = float(os.getenv('ORDER_RETENTION_INTERVAL', '3600'))
+ORDER_RETENTION_BATCH_SIZE = int(os.getenv('ORDER_RETENTION_BATCH_SIZE', '10000'))
+
+Mover = Callable[[datetime.datetime, int], Awaitable[int]]
+
+
+class OrderRetention:
+    """Moves orders finished more than ``age`` ago from the hot table to the archive.
+
+    Runs every ``interval`` seconds and moves ``batch_size`` orders per
+    transaction until nothing old is left, so locks are held briefly. A zero
+    ``age`` disables the job.
+    """
+
+    def __init__(self, mover: Mover, *,
+                 age: datetime.timedelta = datetime.timedelta(days=ORDER_RETENTION_DAYS),
+                 interval: float = ORDER_RETENTION_INTERVAL,
+                 batch_size: int = ORDER_RETENTION_BATCH_SIZE):
+        self.mover = mover
+        self.age = age
+        self.interval = interval
+        self.batch_size = batch_size
+        self.runs = 0
+        self.archived = 0
+        self.failed_runs = 0
+        self._task: asyncio.Task | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return (self._task is not None and not self._task.done()
+                and self._task.get_loop() is asyncio.get_running_loop())
+
+    async def start(self):
+        if not self.is_running and self.age:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if not self.is_running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run_once(self) -> int:
+        cutoff = datetime.datetime.now() - self.age
+        archived = 0
+        while True:
+            moved = await self.mover(cutoff, self.batch_size)
+            archived += moved
+            self.archived += moved
+            if moved < self.batch_size:
+                break
+        self.runs += 1
+        return archived
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                archived = await self.run_once()
+            except Exception:
+                logger.exception('Failed to archive finished orders')
+                self.failed_runs += 1
+            else:
+                logger.info('Archived %d finished orders', archived)
+
+    def stats(self) -> dict:
+        return {'runs': self.runs, 'archived': self.archived, 'failed_runs': self.failed_runs}
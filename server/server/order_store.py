@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import bisect
+import itertools
+import os
+import uuid
+from array import array
+from datetime import datetime
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+from server.enums import Instrument, OrderStatus
+from server.records import OrderRecord, now_ns, to_ns
+
+if TYPE_CHECKING:
+    import fastapi
+
+GET_ORDERS_FRAME_SIZE = int(os.getenv('GET_ORDERS_FRAME_SIZE', '1000'))
+ACCOUNT_ACTIVE_ORDERS_LIMIT = int(os.getenv('ACCOUNT_ACTIVE_ORDERS_LIMIT', '10000'))
+ACCOUNT_HISTORY_LIMIT = int(os.getenv('ACCOUNT_HISTORY_LIMIT', '10000'))
+ACCOUNT_CACHE_SIZE = int(os.getenv('ACCOUNT_CACHE_SIZE', '1000'))
+
+
+class ClientOrders:
+    """Orders of one client in creation order, indexed by status and instrument.
+
+    Every order gets a sequence number when it is added; the indexes are
+    sorted lists of those numbers, so filtered queries and cursors are
+    resolved with bisection instead of scanning the whole history. Status
+    changes have to go through ``set_status`` to keep the indexes right.
+
+    Orders of an ``account`` outlive its connections; ``history_loaded`` tells
+    whether its finished orders were already read from the database. The
+    store is also the owner of its orders in the books and the order engine:
+    fills and reports go to ``websocket``, the oldest open connection of the
+    account at that moment.
+    """
+
+    def __init__(self, account: str | None = None):
+        self.account = account
+        self.history_loaded = account is None
+        self.websockets: list[fastapi.WebSocket] = []
+        self._reset()
+
+    @property
+    def websocket(self) -> fastapi.WebSocket | None:
+        return self.websockets[0] if self.websockets else None
+
+    def _reset(self):
+        self._orders: dict[uuid.UUID, OrderRecord] = {}
+        self._sequences: dict[uuid.UUID, int] = {}
+        self._ids: list[uuid.UUID] = []
+        self._created = array('q')
+        self._by_status: dict[OrderStatus, list[int]] = {status: [] for status in OrderStatus}
+        self._by_instrument: dict[Instrument, list[int]] = {instrument: [] for instrument in Instrument}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, order_id: uuid.UUID) -> bool:
+        return order_id in self._orders
+
+    def __getitem__(self, order_id: uuid.UUID) -> OrderRecord:
+        return self._orders[order_id]
+
+    def get(self, order_id: uuid.UUID, default: OrderRecord | None = None) -> OrderRecord | None:
+        return self._orders.get(order_id, default)
+
+    def items(self):
+        return self._orders.items()
+
+    def count(self, status: OrderStatus) -> int:
+        return len(self._by_status[status])
+
+    def add(self, order_id: uuid.UUID, order: OrderRecord):
+        sequence = len(self._ids)
+        self._orders[order_id] = order
+        self._sequences[order_id] = sequence
+        self._ids.append(order_id)
+        # Clamped to stay sorted for bisection even if the clock goes back.
+        self._created.append(max(order.creation_time, self._created[-1]) if self._created else order.creation_time)
+        self._by_status[order.status].append(sequence)
+        self._by_instrument[order.instrument].append(sequence)
+
+    def load(self, orders: Iterable[tuple[uuid.UUID, OrderRecord]]):
+        """Merge orders read from the database, skipping the known ones.
+
+        The indexes are rebuilt in creation order, so cursors handed out
+        before the merge no longer apply.
+        """
+        loaded = [(order_id, order) for order_id, order in orders if order_id not in self._orders]
+        if not loaded:
+            return
+        merged = sorted(itertools.chain(loaded, self._orders.items()), key=lambda item: item[1].creation_time)
+        self._reset()
+        for order_id, order in merged:
+            self.add(order_id, order)
+
+    def set_status(self, order_id: uuid.UUID, status: OrderStatus):
+        order = self._orders[order_id]
+        sequence = self._sequences[order_id]
+        previous = self._by_status[order.status]
+        del previous[bisect.bisect_left(previous, sequence)]
+        bisect.insort(self._by_status[status], sequence)
+        order.status = status
+        order.change_time = now_ns()
+
+    def query(self, *, status: OrderStatus | None = None, instrument: Instrument | None = None,
+              since: datetime | None = None, until: datetime | None = None,
+              after: int | None = None, limit: int | None = None,
+              ) -> tuple[list[tuple[uuid.UUID, OrderRecord]], int | None]:
+        """Orders matching every given filter, oldest first.
+
+        ``since``/``until`` bound the creation time (inclusive/exclusive),
+        ``after`` is the cursor returned by the previous page. Returns the page
+        and the cursor of the next one, or None when nothing is left.
+        """
+        start = 0 if since is None else bisect.bisect_left(self._created, to_ns(since))
+        if after is not None:
+            start = max(start, after + 1)
+        stop = len(self._ids) if until is None else bisect.bisect_left(self._created, to_ns(until))
+
+        page, cursor = [], None
+        for sequence in self._candidates(status, instrument, start, stop):
+            order_id = self._ids[sequence]
+            order = self._orders[order_id]
+            if (status is None or order.status == status) and (instrument is None or order.instrument == instrument):
+                if limit is not None and len(page) == limit:
+                    return page, cursor
+                page.append((order_id, order))
+                cursor = sequence
+        return page, None
+
+    def _candidates(self, status: OrderStatus | None, instrument: Instrument | None,
+                    start: int, stop: int) -> Iterator[int]:
+        indexes = []
+        if status is not None:
+            indexes.append(self._by_status[status])
+        if instrument is not None:
+            indexes.append(self._by_instrument[instrument])
+        if not indexes:
+            return iter(range(start, stop))
+        index = min(indexes, key=len)
+        return (index[position] for position in range(bisect.bisect_left(index, start),
+                                                      bisect.bisect_left(index, stop)))
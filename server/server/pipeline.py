@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Coroutine, Hashable, Iterable
+
+PIPELINE_MAX_IN_FLIGHT = int(os.getenv('PIPELINE_MAX_IN_FLIGHT', '32'))
+
+
+class Pipeline:
+    """Runs the requests of one connection concurrently.
+
+    ``submit`` waits while ``max_in_flight`` requests are running, so a busy
+    connection stops being read instead of queueing without bound. Requests
+    sharing an ordering key (an order id) run one after another in arrival
+    order; a request with ``keys=None`` waits for everything submitted before
+    it and holds back everything submitted after it.
+
+    The first unexpected error of a request is raised by the next ``submit``
+    or by ``close``, like it used to be raised by the read loop itself.
+    """
+
+    def __init__(self, max_in_flight: int = PIPELINE_MAX_IN_FLIGHT):
+        if max_in_flight < 1:
+            raise ValueError('At least one request must be allowed in flight')
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._tasks: dict[asyncio.Task, tuple[Hashable, ...]] = {}
+        self._tails: dict[Hashable, asyncio.Task] = {}
+        self._barrier: asyncio.Task | None = None
+        self._failure: BaseException | None = None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def submit(self, keys: Iterable[Hashable] | None, request: Coroutine):
+        try:
+            self._raise_failure()
+            await self._slots.acquire()
+        except BaseException:
+            request.close()
+            raise
+        barrier = keys is None
+        if barrier:
+            keys, previous = (), list(self._tasks)
+        else:
+            keys = tuple(keys)
+            previous = [self._tails[key] for key in keys if key in self._tails]
+            if self._barrier is not None:
+                previous.append(self._barrier)
+        task = asyncio.get_running_loop().create_task(self._run(previous, request))
+        self._tasks[task] = keys
+        for key in keys:
+            self._tails[key] = task
+        if barrier:
+            self._barrier = task
+        task.add_done_callback(self._done)
+
+    @staticmethod
+    async def _run(previous: list[asyncio.Task], request: Coroutine):
+        pending = [task for task in previous if not task.done()]
+        try:
+            if pending:
+                await asyncio.wait(pending)
+        except BaseException:
+            request.close()
+            raise
+        await request
+
+    def _done(self, task: asyncio.Task):
+        self._slots.release()
+        for key in self._tasks.pop(task):
+            if self._tails.get(key) is task:
+                del self._tails[key]
+        if self._barrier is task:
+            self._barrier = None
+        if not task.cancelled() and task.exception() is not None and self._failure is None:
+            self._failure = task.exception()
+
+    def _raise_failure(self):
+        if self._failure is not None:
+            failure, self._failure = self._failure, None
+            raise failure
+
+    async def close(self):
+        """Wait for the requests in flight."""
+        if self._tasks:
+            await asyncio.wait(list(self._tasks))
+        self._raise_failure()
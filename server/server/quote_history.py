@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import os
+from array import array
+
+from server.models.base import Quote
+from server.records import quote_model
+
+QUOTE_HISTORY_DEPTH = int(os.getenv('QUOTE_HISTORY_DEPTH', '1000'))
+MARKET_DATA_QUOTES = int(os.getenv('MARKET_DATA_QUOTES', '10'))
+
+QuoteValues = tuple[int, int, int, int, int]
+
+
+class QuoteHistory:
+    """Fixed-capacity ring buffer of the most recent quotes of an instrument.
+
+    Quotes are kept as columns of fixed-point integers (see ``server.records``)
+    rather than as models. The models of the newest ``cached`` quotes are kept
+    once built, since every market data update sends the same few quotes.
+
+    ``sequence`` counts every quote ever appended and numbers the market data
+    stream of the instrument.
+    """
+
+    __slots__ = ('capacity', 'cached', 'sequence', '_columns', '_models', '_next', '_size')
+
+    def __init__(self, capacity: int = QUOTE_HISTORY_DEPTH, cached: int = MARKET_DATA_QUOTES):
+        if capacity < 1:
+            raise ValueError('The quote history capacity must be positive')
+        self.capacity = capacity
+        self.cached = cached
+        self.sequence = 0
+        # bid, offer, min_amount, max_amount, timestamp
+        self._columns = tuple(array('q', bytes(8 * capacity)) for _ in range(5))
+        self._models: dict[int, Quote] = {}
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, bid: int, offer: int, min_amount: int, max_amount: int, timestamp: int):
+        position = self._next
+        for column, value in zip(self._columns, (bid, offer, min_amount, max_amount, timestamp)):
+            column[position] = value
+        self._next = (position + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self.sequence += 1
+        self._models.pop(self.sequence - self.cached, None)
+
+    def values(self, count: int | None = None) -> list[QuoteValues]:
+        """The newest ``count`` quotes, oldest first, as tuples of integers."""
+        count = self._size if count is None else max(min(count, self._size), 0)
+        return [self._values((self._next - count + offset) % self.capacity) for offset in range(count)]
+
+    def latest(self, count: int | None = None) -> list[Quote]:
+        count = self._size if count is None else max(min(count, self._size), 0)
+        return [self._model(self.sequence - count + offset) for offset in range(1, count + 1)]
+
+    def last(self) -> Quote | None:
+        return self._model(self.sequence) if self._size else None
+
+    def _values(self, position: int) -> QuoteValues:
+        return tuple(column[position] for column in self._columns)
+
+    def _model(self, sequence: int) -> Quote:
+        model = self._models.get(sequence)
+        if model is None:
+            model = quote_model(*self._values((self._next - 1 - self.sequence + sequence) % self.capacity))
+            if sequence > self.sequence - self.cached:
+                self._models[sequence] = model
+        return model
@@ -0,0 +1,147 @@
+"""Compact in-memory records of quotes and orders.
+
+Prices, and the minimum and maximum amounts of quotes, are integers scaled
+by ``10 ** PRICE_DECIMALS``, the same scale the binary protocol puts on the
+wire; order amounts are whole units and are kept as they are. Timestamps are
+nanoseconds since the naive epoch. Pydantic models are only built at the API
+edge.
+
+Prices of every instrument are multiples of its tick size; client prices off
+the grid are rejected, or rounded to the nearest tick with
+``PRICE_ROUNDING=round``.
+"""
+from __future__ import annotations
+
+import datetime
+import decimal
+import fractions
+import math
+import os
+import uuid
+
+from server.enums import Instrument, OrderSide, OrderStatus
+from server.models.base import OrderIn, OrderOut, Quote
+
+PRICE_ROUNDING = os.getenv('PRICE_ROUNDING', 'reject')
+
+PRICE_DECIMALS = 8
+PRICE_SCALE = 10 ** PRICE_DECIMALS
+# Digits of the price column; the scaled price still fits a signed 64-bit integer.
+PRICE_MAX_DIGITS = 18
+MAX_PRICE = decimal.Decimal(10) ** (PRICE_MAX_DIGITS - PRICE_DECIMALS)
+# The amount column is a 32-bit integer.
+MAX_AMOUNT = 2 ** 31 - 1
+TICK_SIZES = {
+    Instrument.eur_usd: decimal.Decimal('0.00001'),
+    Instrument.eur_rub: decimal.Decimal('0.0001'),
+    Instrument.usd_rub: decimal.Decimal('0.0001'),
+}
+EPOCH = datetime.datetime(1970, 1, 1)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def to_fixed(value: decimal.Decimal | float) -> int:
+    if isinstance(value, float):
+        return round(value * PRICE_SCALE)
+    return int(value.scaleb(PRICE_DECIMALS).to_integral_value())
+
+
+def from_fixed(value: int) -> decimal.Decimal:
+    # Without trailing zeros whole prices still render as JSON integers.
+    whole, fraction = divmod(value, PRICE_SCALE)
+    if not fraction:
+        return decimal.Decimal(whole)
+    return decimal.Decimal(value).scaleb(-PRICE_DECIMALS).normalize()
+
+
+TICKS = {instrument: to_fixed(size) for instrument, size in TICK_SIZES.items()}
+
+
+def round_to_tick(instrument: Instrument, price: int) -> int:
+    """Nearest multiple of the instrument's tick, halves rounded up."""
+    tick = TICKS[instrument]
+    return (price + tick // 2) // tick * tick
+
+
+def tick_price(instrument: Instrument, price: decimal.Decimal) -> decimal.Decimal:
+    """``price`` on the tick grid of the instrument, see ``PRICE_ROUNDING``."""
+    tick = TICK_SIZES[instrument]
+    # Exact, unlike dividing decimals in a 28-digit context, which puts
+    # prices such as 1.0000000000000000000000000001 on the grid.
+    ticks = fractions.Fraction(price) / fractions.Fraction(tick)
+    if ticks.denominator != 1:
+        if PRICE_ROUNDING != 'round':
+            raise ValueError(f'The price must be a multiple of {tick} for {instrument.name}')
+        ticks = math.floor(ticks + fractions.Fraction(1, 2))
+        if not ticks:
+            raise ValueError(f'The price is less than the tick size {tick} of {instrument.name}')
+    return from_fixed(int(ticks) * TICKS[instrument])
+
+
+def to_ns(value: datetime.datetime) -> int:
+    return (value - EPOCH) // MICROSECOND * 1000
+
+
+def from_ns(value: int) -> datetime.datetime:
+    return EPOCH + datetime.timedelta(microseconds=value // 1000)
+
+
+def now_ns() -> int:
+    return to_ns(datetime.datetime.now())
+
+
+def quote_values(quote: Quote) -> tuple[int, int, int, int, int]:
+    """``bid, offer, min_amount, max_amount, timestamp`` of a model as stored by ``QuoteHistory``."""
+    return (to_fixed(quote.bid), to_fixed(quote.offer), to_fixed(quote.min_amount), to_fixed(quote.max_amount),
+            to_ns(quote.timestamp))
+
+
+def quote_model(bid: int, offer: int, min_amount: int, max_amount: int, timestamp: int) -> Quote:
+    return Quote.construct(bid=from_fixed(bid), offer=from_fixed(offer), min_amount=from_fixed(min_amount),
+                           max_amount=from_fixed(max_amount), timestamp=from_ns(timestamp))
+
+
+class OrderRecord:
+    """An order held by the server: the fields of ``OrderIn`` with a fixed-point
+    price and nanosecond timestamps."""
+
+    __slots__ = ('instrument', 'side', 'status', 'amount', 'price', 'creation_time', 'change_time')
+
+    def __init__(self, instrument: Instrument, side: OrderSide, price: int, amount: int,
+                 status: OrderStatus = OrderStatus.active, creation_time: int | None = None,
+                 change_time: int | None = None):
+        if creation_time is None:
+            creation_time = now_ns()
+        self.instrument = instrument
+        self.side = side
+        self.status = status
+        self.amount = amount
+        self.price = price
+        self.creation_time = creation_time
+        self.change_time = creation_time if change_time is None else change_time
+
+    def __repr__(self) -> str:
+        return (f'OrderRecord({self.instrument.name}, {self.side.name}, {self.status.name}, '
+                f'amount={self.amount}, price={self.price})')
+
+    @classmethod
+    def from_model(cls, order: OrderIn) -> OrderRecord:
+        return cls(order.instrument, order.side, to_fixed(order.price), order.amount, order.status,
+                   to_ns(order.creation_time), to_ns(order.change_time))
+
+    @classmethod
+    def from_row(cls, row: dict) -> OrderRecord:
+        return cls(row['instrument'], row['side'], to_fixed(row['price']), row['amount'], row['status'],
+                   to_ns(row['creation_time']), to_ns(row['change_time']))
+
+    def row(self) -> dict:
+        """Values of the ``orders`` table columns other than the ids."""
+        return dict(instrument=self.instrument, side=self.side, status=self.status, amount=self.amount,
+                    price=from_fixed(self.price), creation_time=from_ns(self.creation_time),
+                    change_time=from_ns(self.change_time))
+
+    def to_model(self) -> OrderIn:
+        return OrderIn.construct(**self.row())
+
+    def to_out(self, order_id: uuid.UUID) -> OrderOut:
+        return OrderOut.construct(uuid=order_id, **self.row())
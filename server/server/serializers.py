@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import datetime
+import decimal
+import enum
+import json
+import os
+import typing
+import uuid
+from typing import Any, Callable
+
+import pydantic
+from server.models import server_messages
+from server.models.base import CorrelationId
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = os.getenv('JSON_BACKEND', 'json')
+
+Encoder = Callable[[Any], Any]
+
+_ONE = decimal.Decimal(1)
+
+
+def encode_decimal(value: decimal.Decimal) -> int | float:
+    # Same result as pydantic's decimal_encoder (int for a non-negative
+    # exponent, float otherwise) without building as_tuple() for the common cases.
+    if value.same_quantum(_ONE):
+        return int(value)
+    if value != value.to_integral_value():
+        return float(value)
+    return int(value) if value.as_tuple().exponent >= 0 else float(value)
+
+
+def _enum_encoder(enum_class: type[enum.Enum]) -> Encoder:
+    json_encoder = server_messages.ServerEnvelope.__config__.json_encoders.get(enum_class)
+    if json_encoder is None:
+        return lambda value: value.value
+    return {member: json_encoder(member) for member in enum_class}.__getitem__
+
+
+def _optional(encoder: Encoder) -> Encoder:
+    return lambda value: None if value is None else encoder(value)
+
+
+def _type_encoder(type_: Any) -> Encoder | None:
+    if typing.get_origin(type_) is list:
+        item_encoder = _type_encoder(typing.get_args(type_)[0])
+        if item_encoder is None:
+            return list
+        return lambda values: [item_encoder(value) for value in values]
+    if isinstance(type_, type):
+        if issubclass(type_, pydantic.BaseModel):
+            return model_encoder(type_)
+        if issubclass(type_, enum.Enum):
+            return _enum_encoder(type_)
+        if issubclass(type_, decimal.Decimal):
+            return encode_decimal
+        if issubclass(type_, uuid.UUID):
+            return str
+        if issubclass(type_, (datetime.datetime, datetime.date, datetime.time)):
+            return type_.isoformat
+        if issubclass(type_, (str, int, float, bool)):
+            return None
+    if type_ is Any:
+        return None
+    raise TypeError(f'No fast encoder for {type_!r}')
+
+
+def model_encoder(model: type[pydantic.BaseModel]) -> Encoder:
+    """Build a function rendering ``model`` like ``ServerEnvelope.json(by_alias=True)`` does.
+
+    Aliases, enum names and value converters are resolved once per class, so
+    encoding a message only walks its values.
+    """
+    fields = []
+    for field in model.__fields__.values():
+        encoder = _type_encoder(field.outer_type_)
+        if encoder is not None and field.allow_none:
+            encoder = _optional(encoder)
+        fields.append((field.name, field.alias, encoder))
+
+    def encode(message: pydantic.BaseModel) -> dict:
+        values = message.__dict__
+        return {alias: values[name] if encoder is None else encoder(values[name])
+                for name, alias, encoder in fields}
+
+    return encode
+
+
+def _dumps_json(envelope: dict) -> str:
+    return json.dumps(envelope)
+
+
+def _dumps_orjson(envelope: dict) -> str:
+    return orjson.dumps(envelope).decode()
+
+
+_ENCODERS = {
+    message_class: model_encoder(message_class)
+    for message_class in server_messages._SERVER_MESSAGE_TYPE_BY_CLASS
+}
+_dumps = _dumps_orjson if JSON_BACKEND == 'orjson' and orjson is not None else _dumps_json
+
+
+def to_envelope(message: server_messages.ServerMessage) -> dict:
+    return {'messageType': int(message.get_type()), 'message': _ENCODERS[message.__class__](message)}
+
+
+def serialize(message: server_messages.ServerMessage, correlation_id: CorrelationId | None = None) -> str:
+    envelope = to_envelope(message)
+    if correlation_id is not None:
+        envelope['correlationId'] = correlation_id
+    return _dumps(envelope)
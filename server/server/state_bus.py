@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import abc
+import asyncio
+import itertools
+import logging
+import os
+import struct
+from collections import defaultdict
+from typing import Any, Awaitable, Callable
+
+from server.binary_protocol import packb, unpackb
+
+logger = logging.getLogger(__name__)
+
+STATE_BUS = os.getenv('STATE_BUS', 'local')
+STATE_BUS_PATH = os.getenv('STATE_BUS_PATH', '/tmp/ntpro-bus.sock')
+STATE_BUS_CONNECT_TIMEOUT = float(os.getenv('STATE_BUS_CONNECT_TIMEOUT', '5'))
+STATE_BUS_RETRY_DELAY = 1.0
+
+Handler = Callable[[Any], Awaitable[None]]
+Callback = Callable[[], Awaitable[None]]
+
+_LENGTH = struct.Struct('>I')
+
+
+def frame(message: list) -> bytes:
+    data = packb(message)
+    return _LENGTH.pack(len(data)) + data
+
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple[list, bytes]:
+    size, = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    data = await reader.readexactly(size)
+    return unpackb(data), data
+
+
+def store_value(store: dict[str, Any], key: str, value: Any):
+    if value is None:
+        store.pop(key, None)
+    elif isinstance(value, dict) and isinstance(store.get(key), dict):
+        store[key].update(value)
+    else:
+        store[key] = value
+
+
+class Bus(abc.ABC):
+    """State shared by the server workers.
+
+    ``publish`` delivers a payload to the handlers of a channel in every
+    worker, the publisher included. ``put``/``get`` work on a key-value store
+    split by namespace, ``put`` merges dict values into the stored ones and
+    removes the key when the value is None.
+    ``elect`` runs ``on_elected`` in exactly one worker at a time and
+    ``on_lost`` when that worker loses the role. Payloads and values must be
+    msgpack-serializable.
+    """
+
+    def __init__(self):
+        self.handlers: dict[str, list[Handler]] = defaultdict(list)
+
+    def subscribe(self, channel: str, handler: Handler):
+        self.handlers[channel].append(handler)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @abc.abstractmethod
+    async def publish(self, channel: str, payload: Any):
+        ...
+
+    @abc.abstractmethod
+    async def elect(self, on_elected: Callback, on_lost: Callback):
+        ...
+
+    @abc.abstractmethod
+    async def put(self, namespace: str, key: str, value: Any):
+        ...
+
+    @abc.abstractmethod
+    async def get(self, namespace: str, key: str) -> Any:
+        ...
+
+    def stats(self) -> dict:
+        return {'bus': self.__class__.__name__}
+
+
+class LocalBus(Bus):
+    """Bus of a single worker: handlers are called directly."""
+
+    def __init__(self):
+        super().__init__()
+        self.store: dict[str, dict[str, Any]] = defaultdict(dict)
+
+    async def publish(self, channel: str, payload: Any):
+        for handler in self.handlers[channel]:
+            await handler(payload)
+
+    async def elect(self, on_elected: Callback, on_lost: Callback):
+        await on_elected()
+
+    async def put(self, namespace: str, key: str, value: Any):
+        store_value(self.store[namespace], key, value)
+
+    async def get(self, namespace: str, key: str) -> Any:
+        return self.store[namespace].get(key)
+
+
+class BrokerBus(Bus):
+    """Bus shared by workers through the broker listening on a Unix socket.
+
+    The connection is re-established after a broker restart; while it is
+    down ``publish`` and ``put`` are dropped and ``get`` raises
+    ``ConnectionError``. ``start`` waits ``connect_timeout`` for the broker
+    and then goes on without it the same way.
+    """
+
+    def __init__(self, path: str = STATE_BUS_PATH, *, connect_timeout: float = STATE_BUS_CONNECT_TIMEOUT):
+        super().__init__()
+        self.path = path
+        self.connect_timeout = connect_timeout
+        self.is_leader = False
+        self.published = 0
+        self.delivered = 0
+        self.reconnects = 0
+        self._writer: asyncio.StreamWriter | None = None
+        self._task: asyncio.Task | None = None
+        self._connected: asyncio.Event | None = None
+        self._election: tuple[Callback, Callback] | None = None
+        self._requests: dict[int, asyncio.Future] = {}
+        self._request_ids = itertools.count()
+
+    @property
+    def is_running(self) -> bool:
+        return (self._task is not None and not self._task.done()
+                and self._task.get_loop() is asyncio.get_running_loop())
+
+    async def start(self):
+        if self.is_running:
+            return
+        self._election = None
+        self._connected = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=self.connect_timeout)
+        except asyncio.TimeoutError:
+            logger.error('State bus broker at %s is not reachable after %s s, running without it '
+                         'until it is', self.path, self.connect_timeout)
+
+    async def stop(self):
+        if not self.is_running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._lose_leadership()
+
+    def subscribe(self, channel: str, handler: Handler):
+        super().subscribe(channel, handler)
+        self._send(['sub', channel])
+
+    async def publish(self, channel: str, payload: Any):
+        self.published += 1
+        self._send(['pub', channel, payload])
+
+    async def elect(self, on_elected: Callback, on_lost: Callback):
+        self._election = (on_elected, on_lost)
+        self._send(['lead'])
+
+    async def put(self, namespace: str, key: str, value: Any):
+        self._send(['put', namespace, key, value])
+
+    async def get(self, namespace: str, key: str) -> Any:
+        if self._writer is None:
+            raise ConnectionError('The state bus is not connected')
+        request_id = next(self._request_ids)
+        future = self._requests[request_id] = asyncio.get_running_loop().create_future()
+        try:
+            self._send(['get', request_id, namespace, key])
+            return await future
+        finally:
+            self._requests.pop(request_id, None)
+
+    def stats(self) -> dict:
+        return {
+            'bus': self.__class__.__name__,
+            'connected': self._writer is not None,
+            'leader': self.is_leader,
+            'published': self.published,
+            'delivered': self.delivered,
+            'reconnects': self.reconnects,
+        }
+
+    def _send(self, message: list):
+        if self._writer is not None:
+            self._writer.write(frame(message))
+
+    async def _run(self):
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+            except OSError as ex:
+                logger.warning('State bus broker at %s is unavailable: %s', self.path, ex)
+                await asyncio.sleep(STATE_BUS_RETRY_DELAY)
+                continue
+
+            for channel in self.handlers:
+                self._send(['sub', channel])
+            if self._election is not None:
+                self._send(['lead'])
+            self._connected.set()
+            try:
+                while True:
+                    await self._dispatch(*await read_frame(reader))
+            except (asyncio.IncompleteReadError, OSError):
+                logger.warning('Lost the state bus broker connection, reconnecting')
+            finally:
+                self._writer.close()
+                self._writer = None
+                for future in self._requests.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError('The state bus connection was lost'))
+            self.reconnects += 1
+            await self._lose_leadership()
+
+    async def _dispatch(self, message: list, data: bytes):
+        kind = message[0]
+        if kind == 'pub':
+            self.delivered += 1
+            for handler in self.handlers[message[1]]:
+                try:
+                    await handler(message[2])
+                except Exception:
+                    logger.exception('State bus handler of %r failed', message[1])
+        elif kind == 'got':
+            future = self._requests.get(message[1])
+            if future is not None and not future.done():
+                future.set_result(message[2])
+        elif kind == 'leader' and self._election is not None and not self.is_leader:
+            self.is_leader = True
+            await self._election[0]()
+
+    async def _lose_leadership(self):
+        if self.is_leader:
+            self.is_leader = False
+            await self._election[1]()
+
+
+def create_bus(kind: str = STATE_BUS) -> Bus:
+    if kind == 'local':
+        return LocalBus()
+    if kind == 'broker':
+        return BrokerBus()
+    raise ValueError(f'Unknown state bus {kind!r}')
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import abc
+import asyncio
+import datetime
+import decimal
+import enum
+import os
+import tempfile
+import uuid
+
+import aiosqlite
+from server import utils
+from server.enums import Instrument, OrderSide, OrderStatus
+from server.metrics import DB_SECONDS
+from server.models.dbase import database
+
+STORAGE = os.getenv('STORAGE', 'postgres')
+SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'ntpro.sqlite3'))
+
+
+class OrderStorage(abc.ABC):
+    """Where orders are persisted.
+
+    Rows are dicts keyed by the ``orders`` table columns. ``write_orders``
+    gets whole batches from the order journal and writes each in one
+    transaction; ``archive_orders`` moves finished orders older than the
+    cutoff out of the hot set and returns how many it moved.
+    """
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    @abc.abstractmethod
+    async def write_orders(self, inserts: list[dict], updates: list[dict]):
+        ...
+
+    @abc.abstractmethod
+    async def read_order(self, order_id: uuid.UUID) -> dict | None:
+        ...
+
+    @abc.abstractmethod
+    async def read_account_orders(self, account: str, *, active: bool, limit: int) -> list[dict]:
+        """Newest ``limit`` active or finished orders of the account, oldest first."""
+
+    @abc.abstractmethod
+    async def archive_orders(self, cutoff: datetime.datetime, limit: int) -> int:
+        ...
+
+    def stats(self) -> dict:
+        return {'backend': self.__class__.__name__}
+
+
+class PostgresStorage(OrderStorage):
+    """The shared asyncpg pool; the schema is managed by alembic."""
+
+    async def connect(self):
+        await database.connect()
+
+    async def disconnect(self):
+        await database.disconnect()
+
+    async def write_orders(self, inserts: list[dict], updates: list[dict]):
+        await utils.write_orders(inserts, updates)
+
+    async def read_order(self, order_id: uuid.UUID) -> dict | None:
+        return await utils.read_order(order_id)
+
+    async def read_account_orders(self, account: str, *, active: bool, limit: int) -> list[dict]:
+        return await utils.read_account_orders(account, active=active, limit=limit)
+
+    async def archive_orders(self, cutoff: datetime.datetime, limit: int) -> int:
+        return await utils.archive_orders(cutoff, limit)
+
+    def stats(self) -> dict:
+        return {'backend': self.__class__.__name__, **database.stats.as_dict()}
+
+
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS {table} (
+    uuid TEXT PRIMARY KEY,
+    instrument TEXT NOT NULL,
+    side TEXT NOT NULL,
+    status TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    price TEXT NOT NULL,
+    address TEXT NOT NULL,
+    account TEXT,
+    creation_time TEXT NOT NULL,
+    change_time TEXT NOT NULL
+);
+'''
+SQLITE_INDEXES = '''
+CREATE INDEX IF NOT EXISTS ix_orders_account_status_creation_time ON orders (account, status, creation_time);
+CREATE INDEX IF NOT EXISTS ix_orders_finished_change_time ON orders (change_time) WHERE status <> 'active';
+CREATE INDEX IF NOT EXISTS ix_orders_archive_account_creation_time ON orders_archive (account, creation_time);
+'''
+SQLITE_COLUMNS = ', '.join(utils.ORDER_COLUMNS)
+SQLITE_INSERT = f'INSERT INTO orders ({SQLITE_COLUMNS}) VALUES ({", ".join("?" * len(utils.ORDER_COLUMNS))})'
+SQLITE_UPDATE = 'UPDATE orders SET status = ?, change_time = ? WHERE uuid = ?'
+SQLITE_RETENTION_BATCH = ("SELECT uuid FROM orders WHERE status <> 'active' AND change_time < ? "
+                          "ORDER BY change_time, uuid LIMIT ?")
+
+_SQLITE_READERS = {
+    'uuid': uuid.UUID,
+    'instrument': Instrument.__getitem__,
+    'side': OrderSide.__getitem__,
+    'status': OrderStatus.__getitem__,
+    'price': decimal.Decimal,
+    'creation_time': datetime.datetime.fromisoformat,
+    'change_time': datetime.datetime.fromisoformat,
+}
+
+
+def _sqlite_value(value):
+    if isinstance(value, enum.Enum):
+        return value.name
+    if isinstance(value, (uuid.UUID, decimal.Decimal)):
+        return str(value)
+    if isinstance(value, datetime.datetime):
+        # Fixed width keeps the text sortable.
+        return value.isoformat(timespec='microseconds')
+    return value
+
+
+def _sqlite_row(row) -> dict:
+    return {column: _SQLITE_READERS[column](value) if column in _SQLITE_READERS and value is not None else value
+            for column, value in zip(utils.ORDER_COLUMNS, row)}
+
+
+class SqliteStorage(OrderStorage):
+    """A single SQLite file in WAL mode, for single-node deployments.
+
+    Every journal batch is committed as one transaction. The connection is
+    opened on first use and creates the schema itself.
+    """
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self.commits = 0
+        self._db: aiosqlite.Connection | None = None
+        self._lock: asyncio.Lock | None = None
+        self._lock_loop: asyncio.AbstractEventLoop | None = None
+
+    def _transaction_lock(self) -> asyncio.Lock:
+        # aiosqlite works from any loop, a lock only from the one it was created in.
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            self._lock, self._lock_loop = asyncio.Lock(), loop
+        return self._lock
+
+    async def connect(self):
+        async with self._transaction_lock():
+            if self._db is not None:
+                return
+            db = aiosqlite.connect(self.path)
+            # Without lifespan events nothing closes the connection, its thread
+            # must not keep the process alive; WAL keeps commits atomic anyway.
+            db.daemon = True
+            await db
+            await db.execute('PRAGMA journal_mode=WAL')
+            await db.execute('PRAGMA synchronous=NORMAL')
+            await db.executescript(SQLITE_SCHEMA.format(table='orders') + SQLITE_SCHEMA.format(table='orders_archive')
+                                   + SQLITE_INDEXES)
+            await db.commit()
+            self._db = db
+
+    async def disconnect(self):
+        if self._db is not None:
+            db, self._db = self._db, None
+            await db.close()
+
+    async def _connection(self) -> aiosqlite.Connection:
+        if self._db is None:
+            await self.connect()
+        return self._db
+
+    @DB_SECONDS.time('sqlite', 'write_orders')
+    async def write_orders(self, inserts: list[dict], updates: list[dict]):
+        db = await self._connection()
+        async with self._transaction_lock():
+            try:
+                if inserts:
+                    await db.executemany(SQLITE_INSERT, [tuple(_sqlite_value(row.get(column))
+                                                              for column in utils.ORDER_COLUMNS)
+                                                        for row in inserts])
+                if updates:
+                    await db.executemany(SQLITE_UPDATE, [
+                        (_sqlite_value(update['status']), _sqlite_value(update['change_time']),
+                         _sqlite_value(update['uuid'])) for update in updates])
+                await db.commit()
+            except BaseException:
+                await db.rollback()
+                raise
+            self.commits += 1
+
+    @DB_SECONDS.time('sqlite', 'read_order')
+    async def read_order(self, order_id: uuid.UUID) -> dict | None:
+        db = await self._connection()
+        for table in ('orders', 'orders_archive'):
+            rows = await db.execute_fetchall(
+                f'SELECT {SQLITE_COLUMNS} FROM {table} WHERE uuid = ?', (str(order_id),))
+            if rows:
+                return _sqlite_row(rows[0])
+        return None
+
+    @DB_SECONDS.time('sqlite', 'read_account_orders')
+    async def read_account_orders(self, account: str, *, active: bool, limit: int) -> list[dict]:
+        db = await self._connection()
+        if active:
+            rows = await db.execute_fetchall(
+                f"SELECT {SQLITE_COLUMNS} FROM orders WHERE account = ? AND status = 'active' "
+                f"ORDER BY creation_time DESC LIMIT ?", (account, limit))
+        else:
+            rows = await db.execute_fetchall(
+                f"SELECT {SQLITE_COLUMNS} FROM ("
+                f"SELECT {SQLITE_COLUMNS} FROM orders WHERE account = ? AND status <> 'active' "
+                f"UNION ALL SELECT {SQLITE_COLUMNS} FROM orders_archive WHERE account = ?"
+                f") ORDER BY creation_time DESC LIMIT ?", (account, account, limit))
+        return [_sqlite_row(row) for row in reversed(rows)]
+
+    @DB_SECONDS.time('sqlite', 'archive_orders')
+    async def archive_orders(self, cutoff: datetime.datetime, limit: int) -> int:
+        db = await self._connection()
+        async with self._transaction_lock():
+            try:
+                await db.execute(f'INSERT INTO orders_archive SELECT {SQLITE_COLUMNS} FROM orders '
+                                 f'WHERE uuid IN ({SQLITE_RETENTION_BATCH})', (_sqlite_value(cutoff), limit))
+                cursor = await db.execute(f'DELETE FROM orders WHERE uuid IN ({SQLITE_RETENTION_BATCH})',
+                                          (_sqlite_value(cutoff), limit))
+                await db.commit()
+            except BaseException:
+                await db.rollback()
+                raise
+            self.commits += 1
+            return cursor.rowcount
+
+    def stats(self) -> dict:
+        return {'backend': self.__class__.__name__, 'path': self.path, 'commits': self.commits}
+
+
+class MemoryStorage(OrderStorage):
+    """Orders kept in the process only, lost on restart. For tests, load
+    tests and measuring what the database costs."""
+
+    def __init__(self):
+        self.orders: dict[uuid.UUID, dict] = {}
+        self.archive: dict[uuid.UUID, dict] = {}
+        self._accounts: dict[str, dict[uuid.UUID, dict]] = {}
+
+    async def write_orders(self, inserts: list[dict], updates: list[dict]):
+        for row in inserts:
+            row = self.orders[row['uuid']] = dict(row)
+            if row.get('account') is not None:
+                self._accounts.setdefault(row['account'], {})[row['uuid']] = row
+        for update in updates:
+            row = self.orders.get(update['uuid'])
+            if row is not None:
+                row.update(status=update['status'], change_time=update['change_time'])
+
+    async def read_order(self, order_id: uuid.UUID) -> dict | None:
+        row = self.orders.get(order_id) or self.archive.get(order_id)
+        return None if row is None else dict(row)
+
+    async def read_account_orders(self, account: str, *, active: bool, limit: int) -> list[dict]:
+        rows = [row for row in self._accounts.get(account, {}).values()
+                if (row['status'] == OrderStatus.active) == active]
+        rows.sort(key=lambda row: row['creation_time'])
+        return [dict(row) for row in rows[-limit:]]
+
+    async def archive_orders(self, cutoff: datetime.datetime, limit: int) -> int:
+        finished = sorted((row for row in self.orders.values()
+                           if row['status'] != OrderStatus.active and row['change_time'] < cutoff),
+                          key=lambda row: row['change_time'])[:limit]
+        for row in finished:
+            self.archive[row['uuid']] = self.orders.pop(row['uuid'])
+        return len(finished)
+
+    def stats(self) -> dict:
+        return {'backend': self.__class__.__name__, 'orders': len(self.orders), 'archived': len(self.archive)}
+
+
+def create_storage(kind: str = STORAGE) -> OrderStorage:
+    if kind == 'postgres':
+        return PostgresStorage()
+    if kind == 'sqlite':
+        return SqliteStorage()
+    if kind == 'memory':
+        return MemoryStorage()
+    raise ValueError(f'Unknown storage {kind!r}')
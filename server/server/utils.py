@@ -1,28 +1,118 @@
-from server.models.dbase import database, orders_table
+import enum
+import os
 
+import sqlalchemy
+from server.enums import OrderStatus
+from server.metrics import DB_SECONDS
+from server.models.dbase import database, finished_orders, orders_archive_table, orders_table
 
-async def create_order(websocket, uuid, new_order):
-    create_query = orders_table.insert().values(
-        uuid=uuid, address=str(websocket.client),
-        **new_order.dict()).returning(orders_table.c.uuid)
-    await database.connect()
-    record = await database.fetch_one(create_query)
+DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', 'true').lower() in ('1', 'true', 'yes')
 
-    await database.disconnect()
-    uuid_from_db = dict(zip(record, record._mapping.values())).get('uuid')
+ORDER_COLUMNS = [column.name for column in orders_table.columns]
+INSERT_ORDER = 'INSERT INTO {} ({}) VALUES ({})'.format(
+    orders_table.name, ', '.join(ORDER_COLUMNS), ', '.join(f'${number}' for number in range(1, len(ORDER_COLUMNS) + 1)))
+UPDATE_ORDER = f'UPDATE {orders_table.name} SET status = $2, change_time = $3 WHERE uuid = $1'
 
-    return uuid_from_db
 
+def _argument(value):
+    return value.name if isinstance(value, enum.Enum) else value
 
-async def update_order(uuid, order):
-    update_query = orders_table.update().where(
-        orders_table.c.uuid == uuid).values(
-        status=order.dict().get('status'),
-        change_time=order.dict().get('change_time')).returning(
-        orders_table.c.uuid
-    )
-    await database.connect()
-    record = await database.execute(update_query)
-    await database.disconnect()
 
-    return record
+def insert_arguments(row):
+    return tuple(_argument(row.get(column)) for column in ORDER_COLUMNS)
+
+
+def update_arguments(update):
+    return update['uuid'], _argument(update['status']), update['change_time']
+
+
+@DB_SECONDS.time('postgres', 'write_orders')
+async def write_orders(inserts, updates):
+    if DB_PREPARED_STATEMENTS:
+        await _write_prepared(inserts, updates)
+    else:
+        await _write_compiled(inserts, updates)
+
+
+async def _write_prepared(inserts, updates):
+    # The statement texts never change, so asyncpg prepares them once per
+    # pooled connection and reuses the server-side statements afterwards.
+    async with database.connection() as connection:
+        async with connection.transaction():
+            raw_connection = connection.raw_connection
+            if inserts:
+                await raw_connection.executemany(INSERT_ORDER, [insert_arguments(row) for row in inserts])
+            if updates:
+                await raw_connection.executemany(UPDATE_ORDER, [update_arguments(update) for update in updates])
+
+
+async def _write_compiled(inserts, updates):
+    async with database.connection() as connection:
+        async with connection.transaction():
+            if inserts:
+                await connection.execute(orders_table.insert().values(inserts))
+            for update in updates:
+                update_query = orders_table.update().where(
+                    orders_table.c.uuid == update['uuid']).values(
+                    status=update['status'],
+                    change_time=update['change_time'])
+                await connection.execute(update_query)
+
+
+def _as_dict(row):
+    return {column.name: row[column.name] for column in orders_table.columns}
+
+
+@DB_SECONDS.time('postgres', 'read_order')
+async def read_order(order_id):
+    async with database.connection() as connection:
+        row = await connection.fetch_one(orders_table.select().where(orders_table.c.uuid == order_id))
+        if row is None:
+            row = await connection.fetch_one(
+                orders_archive_table.select().where(orders_archive_table.c.uuid == order_id))
+    return None if row is None else _as_dict(row)
+
+
+def account_orders_query(account, *, active, limit):
+    # Newest first, served by the (account, status, creation_time) index;
+    # history also reads the archive.
+    if active:
+        condition = orders_table.c.status == OrderStatus.active
+    else:
+        condition = finished_orders
+    query = orders_table.select().where(orders_table.c.account == account, condition).order_by(
+        orders_table.c.creation_time.desc()).limit(limit)
+    if active:
+        return query
+    archived = orders_archive_table.select().where(orders_archive_table.c.account == account).order_by(
+        orders_archive_table.c.creation_time.desc()).limit(limit)
+    history = sqlalchemy.union_all(query.subquery().select(), archived.subquery().select()).subquery()
+    return sqlalchemy.select(history).order_by(history.c.creation_time.desc()).limit(limit)
+
+
+@DB_SECONDS.time('postgres', 'read_account_orders')
+async def read_account_orders(account, *, active, limit):
+    async with database.connection() as connection:
+        rows = await connection.fetch_all(account_orders_query(account, active=active, limit=limit))
+    return [_as_dict(row) for row in reversed(rows)]
+
+
+def retention_batch_query(cutoff, limit):
+    return sqlalchemy.select(orders_table.c.uuid).where(
+        finished_orders, orders_table.c.change_time < cutoff).order_by(
+        orders_table.c.change_time).limit(limit).with_for_update(skip_locked=True)
+
+
+@DB_SECONDS.time('postgres', 'archive_orders')
+async def archive_orders(cutoff, limit):
+    """Move up to ``limit`` orders finished before ``cutoff`` to the archive
+    in one statement; returns how many were moved."""
+    columns = [column.name for column in orders_table.columns]
+    moved = orders_table.delete().where(
+        orders_table.c.uuid.in_(retention_batch_query(cutoff, limit).scalar_subquery())).returning(
+        *orders_table.columns).cte('moved')
+    query = orders_archive_table.insert().from_select(
+        columns, sqlalchemy.select(*(moved.c[name] for name in columns))).returning(orders_archive_table.c.uuid)
+    async with database.connection() as connection:
+        async with connection.transaction():
+            return len(await connection.fetch_all(query))
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import uuid
+from typing import Any, Callable, NamedTuple
+
+import fastapi
+from server.models.base import CorrelationId, Message
+from server.models.client_messages import ClientMessage
+
+from server import binary_protocol, decoders, serializers
+
+Frame = str | bytes
+
+
+class Codec(NamedTuple):
+    name: str
+    decode: Callable[[Frame], ClientMessage]
+    encode: Callable[[Message, CorrelationId | None], Frame]
+    encode_id: Callable[[uuid.UUID], Frame]
+    # Envelopes already parsed out of a frame, for the items of a batch.
+    decode_envelope: Callable[[Any], ClientMessage]
+    to_envelope: Callable[[Message], Any]
+    # Splits a frame into the envelope and the correlation id of the request.
+    unwrap: Callable[[Frame], tuple[Any, CorrelationId | None]]
+
+
+JSON = Codec('json', decoders.decode, serializers.serialize, str,
+             decoders.decode_envelope, serializers.to_envelope, decoders.unwrap)
+MSGPACK = Codec('msgpack', binary_protocol.decode, binary_protocol.encode, lambda value: value.bytes,
+                binary_protocol.decode_envelope, binary_protocol.to_envelope, binary_protocol.unwrap)
+CODECS = {codec.name: codec for codec in (JSON, MSGPACK)}
+
+
+def negotiate(websocket: fastapi.WebSocket) -> tuple[Codec, str | None]:
+    """Pick the codec of a new connection and the subprotocol to accept.
+
+    Binary mode is requested with the ``ntpro.msgpack`` subprotocol or the
+    ``protocol=msgpack`` query parameter; anything else gets JSON.
+    """
+    if binary_protocol.SUBPROTOCOL in websocket.scope.get('subprotocols', ()):
+        return MSGPACK, binary_protocol.SUBPROTOCOL
+    return CODECS.get(websocket.query_params.get('protocol'), JSON), None
@@ -1,8 +1,14 @@
 import os
+import tempfile
+
+# SQLite runs of the suite keep their database out of the checkout and out
+# of the default path; set before the storage module reads it.
+os.environ.setdefault('SQLITE_PATH', os.path.join(tempfile.mkdtemp(prefix='ntpro-tests-'), 'ntpro.sqlite3'))
 
 import pytest
 from alembic import command
 from alembic.config import Config
+from server import storage
 from server.models import dbase
 from sqlalchemy_utils import create_database, drop_database
 
@@ -11,6 +17,9 @@ os.environ['DB_NAME'] = 'test_db'
 
 @pytest.fixture(scope="module")
 def temp_db():
+    if storage.STORAGE != 'postgres':
+        yield
+        return
     create_database(dbase.TEST_SQLALCHEMY_DATABASE_URL)
     base_dir = os.path.dirname(os.path.dirname(__file__))
     alembic_cfg = Config(os.path.join(base_dir, "alembic.ini"))
@@ -93,3 +102,8 @@ def cancel_noexist_order_message():
 @pytest.fixture
 def get_all_orders_message():
     return r'{"messageType": 5, "message": {}}'
+
+
+@pytest.fixture
+def market_data_snapshot_message():
+    return r'{"messageType": 7, "message": {"instrument": 1, "depth": 5}}'
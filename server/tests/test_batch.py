@@ -0,0 +1,92 @@
+import asyncio
+
+import pydantic
+import pytest
+from server import binary_protocol
+from server.enums import Instrument, OrderSide, OrderStatus
+from server.models import client_messages, server_messages
+from server.ntpro_server import NTProServer
+from server.order_journal import OrderJournal
+from server.storage import MemoryStorage
+from tests.utils_for_tests import MemorySocket
+
+PLACE = {'messageType': 3, 'message': {'instrument': 2, 'side': 1, 'amount': 3, 'price': 20}}
+
+
+def run(websocket, messages):
+    async def scenario():
+        server = NTProServer(storage=MemoryStorage())
+        writes = []
+
+        async def writer(inserts, updates):
+            writes.append(len(inserts))
+
+        server.journal = OrderJournal(writer, flush_interval=10)
+        await server.connect(websocket)
+        result = await client_messages.Batch(messages=messages).process(server, websocket)
+        await asyncio.sleep(0.01)
+        await server.disconnect(websocket)
+        await server.journal.stop()
+        return result, writes
+
+    return asyncio.run(scenario())
+
+
+def test_items_answered_in_order_with_isolated_errors():
+    sell = {'messageType': 3, 'message': {'instrument': 2, 'side': 2, 'amount': 1, 'price': 19}}
+    unknown = {'messageType': 4, 'message': {'orderId': '00000000-0000-0000-0000-000000000000'}}
+    off_tick = {'messageType': 3, 'message': {'instrument': 2, 'side': 1, 'amount': 3, 'price': 20.00001}}
+    nested = {'messageType': 9, 'message': {'messages': [PLACE]}}
+    result, writes = run(MemorySocket('client'), [PLACE, sell, unknown, off_tick, nested, PLACE])
+
+    assert isinstance(result, server_messages.BatchResult)
+    assert [[reply['messageType'] for reply in item] for item in result.results] == [[3], [3, 8, 3], [2], [2], [2], [3]]
+    assert result.results[2][0]['message']['reason'] == 'The order does not exist'
+    assert 'multiple of 0.0001' in result.results[3][0]['message']['reason']
+    assert writes == [3]
+
+
+def test_rejected_write_fails_only_its_item():
+    async def scenario():
+        server = NTProServer(storage=MemoryStorage())
+        written = []
+
+        async def writer(inserts, updates):
+            if any(insert['amount'] == 13 for insert in inserts):
+                raise ValueError('numeric field overflow')
+            written.extend(insert['amount'] for insert in inserts)
+
+        server.journal = OrderJournal(writer, flush_interval=10, durable=True, retry_delay=0.001)
+        websocket = MemorySocket('client')
+        await server.connect(websocket)
+        places = [{'messageType': 3, 'message': {'instrument': 2, 'side': 1, 'amount': amount, 'price': 20}}
+                  for amount in (3, 13, 5)]
+        result = await client_messages.Batch(messages=places).process(server, websocket)
+        await server.disconnect(websocket)
+        await server.journal.stop()
+        return result, written
+
+    result, written = asyncio.run(scenario())
+    assert [[reply['messageType'] for reply in item] for item in result.results] == [[3], [2], [3]]
+    assert result.results[1][0]['message']['reason'].endswith('was not saved')
+    assert [item[0]['message']['orderStatus'] for item in (result.results[0], result.results[2])] == ['active'] * 2
+    assert sorted(written) == [3, 5]
+
+
+def test_binary_batch():
+    websocket = MemorySocket('client')
+    websocket.scope = {'subprotocols': [binary_protocol.SUBPROTOCOL]}
+    place = client_messages.PlaceOrder(instrument=Instrument.eur_usd.value, side=OrderSide.buy, amount=1, price=30)
+    result, _ = run(websocket, [binary_protocol.to_envelope(place), [99, {}]])
+
+    decoded = binary_protocol.decode(binary_protocol.encode(result), binary_protocol.SERVER_MESSAGE_CLASSES)
+    assert [[reply[0] for reply in item] for item in decoded.results] == [[3], [2]]
+    report = binary_protocol.decode_envelope(decoded.results[0][0], binary_protocol.SERVER_MESSAGE_CLASSES)
+    assert report.order_status == OrderStatus.active
+
+
+def test_batch_size_is_bounded():
+    with pytest.raises(pydantic.ValidationError):
+        client_messages.Batch(messages=[])
+    with pytest.raises(pydantic.ValidationError):
+        client_messages.Batch(messages=[PLACE] * (client_messages.BATCH_MAX_SIZE + 1))
@@ -0,0 +1,112 @@
+import datetime
+import uuid
+from decimal import Decimal
+
+import pytest
+from fastapi.testclient import TestClient
+from server import binary_protocol
+from server.app import api
+from server.enums import Instrument, OrderSide, OrderStatus
+from server.models import client_messages, server_messages
+from server.models.base import OrderOut, Quote
+
+TIMESTAMP = datetime.datetime(2023, 1, 1, 12, 30, 15, 120)
+VALUES = [None, True, False, 0, 127, 128, 255, 256, 65536, 2 ** 32, 2 ** 63, -1, -32, -33, -129, -32769,
+          -2 ** 31 - 1, 1.5, '', 'é' * 40, 'x' * 300, b'\x00' * 16, b'y' * 70000, list(range(20)),
+          {1: 'a', 2: [1, 2]}, {tag: tag for tag in range(20)}]
+
+
+@pytest.mark.parametrize('value', VALUES, ids=repr)
+def test_pack_round_trip(value):
+    assert binary_protocol.unpackb(binary_protocol.packb(value)) == value
+
+
+def test_message_round_trip():
+    messages = [
+        server_messages.MarketDataUpdate(
+            subscription_id=uuid.uuid4(), instrument=Instrument.eur_rub,
+            quotes=[Quote(bid=Decimal('32.649247'), offer=Decimal(20), min_amount=Decimal('1.5'),
+                          max_amount=Decimal(100), timestamp=TIMESTAMP)]),
+        server_messages.OrdersList(orders=[OrderOut(
+            uuid=uuid.uuid4(), side=OrderSide.sell, price=Decimal('50.25'), amount=5, instrument=Instrument.usd_rub,
+            status=OrderStatus.rejected, creation_time=TIMESTAMP, change_time=TIMESTAMP)]),
+        server_messages.ErrorInfo(reason='bad'),
+    ]
+    for message in messages:
+        raw = binary_protocol.encode(message)
+        assert binary_protocol.decode(raw, binary_protocol.SERVER_MESSAGE_CLASSES) == message
+
+
+def test_prices_are_scaled_integers():
+    raw = binary_protocol.encode(client_messages.PlaceOrder(instrument=1, side=OrderSide.buy,
+                                                            amount=Decimal(3), price=Decimal('20.5')))
+    assert binary_protocol.unpackb(raw) == [3, {1: 1, 2: 1, 3: 300000000, 4: 2050000000}]
+
+
+def test_field_tags_are_pinned():
+    # Changing a tag breaks deployed clients; only new tags may be added here.
+    assert {model.__name__: tags for model, tags in binary_protocol.FIELD_TAGS.items()} == {
+        'SubscribeMarketData': {'instrument': 1, 'mode': 2},
+        'UnsubscribeMarketData': {'subscription_id': 1},
+        'PlaceOrder': {'instrument': 1, 'side': 2, 'amount': 3, 'price': 4},
+        'CancelOrder': {'order_id': 1},
+        'GetOrders': {'status': 1, 'instrument': 2, 'since': 3, 'until': 4, 'cursor': 5, 'limit': 6},
+        'GetMarketDataSnapshot': {'instrument': 1, 'depth': 2},
+        'ResnapshotMarketData': {'subscription_id': 1},
+        'Batch': {'messages': 1},
+        'SuccessInfo': {'subscription_id': 1},
+        'ErrorInfo': {'reason': 1},
+        'ExecutionReport': {'order_id': 1, 'order_status': 2},
+        'MarketDataUpdate': {'subscription_id': 1, 'instrument': 2, 'quotes': 3, 'sequence': 4},
+        'OrdersList': {'orders': 1, 'next_cursor': 2, 'partial': 3},
+        'MarketDataSnapshot': {'instrument': 1, 'quotes': 2},
+        'TradeReport': {'order_id': 1, 'instrument': 2, 'side': 3, 'price': 4, 'amount': 5, 'remaining_amount': 6},
+        'MarketDataDelta': {'subscription_id': 1, 'instrument': 2, 'sequence': 3, 'quotes': 4, 'removed': 5},
+        'BatchResult': {'results': 1},
+        'Quote': {'bid': 1, 'offer': 2, 'min_amount': 3, 'max_amount': 4, 'timestamp': 5},
+        'OrderOut': {'creation_time': 1, 'change_time': 2, 'status': 3, 'side': 4, 'price': 5, 'amount': 6,
+                     'instrument': 7, 'uuid': 8},
+    }
+
+
+def test_untagged_field_is_an_error():
+    class Renamed(server_messages.ErrorInfo):
+        details: str
+
+    with pytest.raises(TypeError, match='Renamed: reason, details'):
+        binary_protocol.model_encoder(Renamed)
+
+
+def test_correlation_id_is_third_element():
+    message = client_messages.SubscribeMarketData(instrument=Instrument.eur_usd)
+    envelope, correlation_id = binary_protocol.unwrap(binary_protocol.encode(message, 'request-1'))
+    assert correlation_id == 'request-1'
+    assert binary_protocol.decode_envelope(envelope) == message
+    assert binary_protocol.unwrap(binary_protocol.encode(message)) == (binary_protocol.to_envelope(message), None)
+    with pytest.raises(binary_protocol.DecodeError):
+        binary_protocol.unwrap(binary_protocol.packb([1, {1: 1}, 1.5]))
+
+
+@pytest.mark.parametrize('raw', [b'\xc1', b'\x93\x01\x02\x03', b'\x92\x0a\x80', b'\x92\x01\x81\x09\x01', 'text'])
+def test_decode_errors(raw):
+    with pytest.raises(binary_protocol.DecodeError):
+        binary_protocol.decode(raw)
+
+
+@pytest.mark.parametrize('url, subprotocols', [('/ws/', [binary_protocol.SUBPROTOCOL]),
+                                               ('/ws/?protocol=msgpack', None)])
+def test_binary_session(url, subprotocols):
+    client = TestClient(api)
+    with client.websocket_connect(url, subprotocols=subprotocols) as websocket:
+        websocket.send_bytes(binary_protocol.encode(
+            client_messages.SubscribeMarketData(instrument=Instrument.eur_usd)))
+        reply = binary_protocol.decode(websocket.receive_bytes(), binary_protocol.SERVER_MESSAGE_CLASSES)
+        assert isinstance(reply, server_messages.SuccessInfo)
+
+        update = binary_protocol.decode(websocket.receive_bytes(), binary_protocol.SERVER_MESSAGE_CLASSES)
+        assert update.subscription_id == reply.subscription_id
+        assert update.quotes
+
+        websocket.send_bytes(b'\xc1')
+        error = binary_protocol.decode(websocket.receive_bytes(), binary_protocol.SERVER_MESSAGE_CLASSES)
+        assert error == server_messages.ErrorInfo(reason='The message is not a valid MessagePack')
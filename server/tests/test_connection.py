@@ -0,0 +1,97 @@
+import asyncio
+
+from server.connection import ClientConnection
+from server.enums import SlowConsumerPolicy
+
+
+class StalledSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+        self.unblock = asyncio.Event()
+
+    async def send_text(self, text):
+        await self.unblock.wait()
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def run_policy(policy, market_data):
+    async def scenario():
+        websocket = StalledSocket()
+        connection = ClientConnection(websocket, queue_size=2, policy=policy)
+        connection.send('report')
+        for key, text in market_data:
+            connection.send_market_data(key, text)
+        connection.send('second report')
+        await asyncio.sleep(0)
+        stats = connection.stats()
+        websocket.unblock.set()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        connection.close()
+        return websocket, stats
+
+    return asyncio.run(scenario())
+
+
+def test_conflate_keeps_latest_per_subscription():
+    websocket, stats = run_policy(SlowConsumerPolicy.conflate, [('a', 'a1'), ('b', 'b1'), ('a', 'a2')])
+    assert websocket.sent == ['report', 'second report', 'a2', 'b1']
+    assert stats['conflated'] == 1
+    assert stats['dropped'] == 0
+
+
+def test_drop_oldest_never_drops_reports():
+    websocket, stats = run_policy(SlowConsumerPolicy.drop_oldest, [('a', 'a1'), ('a', 'a2'), ('a', 'a3')])
+    assert websocket.sent == ['report', 'second report', 'a2', 'a3']
+    assert stats['dropped'] == 1
+
+
+def test_disconnect_slow_consumer():
+    websocket, stats = run_policy(SlowConsumerPolicy.disconnect, [('a', 'a1'), ('a', 'a2'), ('a', 'a3')])
+    assert websocket.closed_with == 1008
+    assert websocket.sent == []
+
+
+def test_writer_runs_only_while_queued():
+    async def scenario():
+        websocket = StalledSocket()
+        websocket.unblock.set()
+        connection = ClientConnection(websocket)
+        idle = connection._writer
+        connection.send('report')
+        busy = connection._writer is not None
+        await asyncio.sleep(0)
+        connection.send_market_data('a', 'a1')
+        for _ in range(3):
+            await asyncio.sleep(0)
+        return idle, busy, connection._writer, websocket.sent
+
+    idle, busy, after, sent = asyncio.run(scenario())
+    assert idle is None and after is None
+    assert busy
+    assert sent == ['report', 'a1']
+
+
+def test_drop_oldest_marks_subscription_for_snapshot():
+    async def scenario():
+        connection = ClientConnection(StalledSocket(), queue_size=2, policy=SlowConsumerPolicy.drop_oldest)
+        connection.send_market_data('a', 'a1')
+        connection.send_market_data('b', 'b1', snapshot=False)
+        queued = connection.needs_snapshot('a')
+        connection.send_market_data('a', 'a2', snapshot=False)
+        dropped = connection.needs_snapshot('a'), connection.needs_snapshot('b')
+        connection.send_market_data('a', 'a3')
+        connection.send_market_data('a', 'a4', snapshot=False)
+        # a2 is dropped behind the a3 snapshot, which covers it.
+        resent = connection.needs_snapshot('a'), connection.needs_snapshot('b')
+        connection.close()
+        return queued, dropped, resent
+
+    queued, dropped, resent = asyncio.run(scenario())
+    assert not queued
+    assert dropped == (True, False)
+    assert resent == (False, True)
@@ -0,0 +1,48 @@
+import json
+
+import pydantic
+import pytest
+from server import decoders
+from server.models import client_messages
+
+FRAMES = [
+    r'{"messageType": 1, "message": {"instrument": 1}}',
+    r'{"messageType": 2, "message": {"subscriptionId": "0c11e37fc1e1433ea2732c39600ea577"}}',
+    r'{"messageType": 3, "message": {"instrument": 2, "side": 1, "amount": 3, "price": 20.5}}',
+    r'{"messageType": 4, "message": {"orderId": "0c11e37fc1e1433ea2732c39600ea577"}}',
+    r'{"messageType": 5, "message": {}}',
+    r'{"messageType": 7, "message": {"instrument": 1, "depth": 3}}',
+    r'{"messageType": "1", "message": {"instrument": 1}}',
+    r'{"messageType": 10}',
+    r'{"messageType": 10, "message": {}}',
+    r'{"messageType": 1, "message": {"instrument": 20}}',
+    r'{"messageType": 2, "message": {"subscriptionId": "not a uuid"}}',
+    r'{"messageType": 1, "message": {"instrument": 1}, "extra": 1}',
+    r'{"messageType": 1, "message": [["instrument", 1]]}',
+    r'[1, 2]',
+]
+
+
+def envelope_decode(raw):
+    return client_messages.ClientEnvelope.parse_obj(json.loads(raw)).get_parsed_message()
+
+
+def outcome(decode, raw):
+    try:
+        return decode(raw)
+    except pydantic.ValidationError as ex:
+        return str(ex)
+
+
+@pytest.mark.parametrize('raw', FRAMES)
+def test_same_result_as_envelope(raw):
+    assert outcome(decoders.decode, raw) == outcome(envelope_decode, raw)
+
+
+def test_bytes_frame():
+    assert decoders.decode(FRAMES[0].encode()) == envelope_decode(FRAMES[0])
+
+
+def test_invalid_json():
+    with pytest.raises(json.JSONDecodeError):
+        decoders.decode('non json message')
@@ -0,0 +1,98 @@
+import asyncio
+import random
+
+from server.connection import ClientConnection
+from server.enums import Instrument, MarketDataMode, SlowConsumerPolicy
+from server.market_data import MarketDataEngine, parse_rates
+from server.message_processors import gen_quote
+from server.models import client_messages
+from server.ntpro_server import NTProServer
+from server.order_journal import OrderJournal
+from server.quote_history import MARKET_DATA_QUOTES
+from tests.utils_for_tests import MemorySocket, discard
+
+
+def run_engine(seed, rates, seconds):
+    async def scenario():
+        server = NTProServer()
+        engine = MarketDataEngine(server, rates=rates, seed=seed)
+        await engine.start()
+        await asyncio.sleep(seconds)
+        await engine.stop()
+        return server.quotes
+
+    return asyncio.run(scenario())
+
+
+def test_quotes_generated_without_connections():
+    quotes = run_engine(1, {Instrument.eur_usd: 100, Instrument.usd_rub: 20}, 0.3)
+    assert 20 <= len(quotes[Instrument.eur_usd]) <= 40
+    assert 4 <= len(quotes[Instrument.usd_rub]) <= 8
+    assert len(quotes[Instrument.eur_rub]) == 0
+
+
+def test_seeded_engine_is_deterministic():
+    first = run_engine(7, {Instrument.eur_usd: 100}, 0.1)[Instrument.eur_usd].latest()
+    second = run_engine(7, {Instrument.eur_usd: 100}, 0.1)[Instrument.eur_usd].latest()
+    common = min(len(first), len(second))
+    assert common > 0
+    assert [quote.bid for quote in first[:common]] == [quote.bid for quote in second[:common]]
+
+
+def test_parse_rates():
+    rates = parse_rates('eur_usd=5, usd_rub=0', 1)
+    assert rates == {Instrument.eur_usd: 5, Instrument.eur_rub: 1, Instrument.usd_rub: 0}
+
+
+def test_incremental_stream():
+    async def scenario():
+        server = NTProServer()
+        server.journal = OrderJournal(discard)
+        websocket = MemorySocket('client')
+        await server.connect(websocket)
+        rng = random.Random(1)
+        for _ in range(MARKET_DATA_QUOTES):
+            await gen_quote(server, Instrument.eur_usd, rng)
+        subscribe = client_messages.SubscribeMarketData(instrument=Instrument.eur_usd, mode=MarketDataMode.incremental)
+        success, snapshot = await subscribe.process(server, websocket)
+
+        await gen_quote(server, Instrument.eur_usd, rng)
+        await asyncio.sleep(0.01)
+        await gen_quote(server, Instrument.eur_usd, rng)
+        await gen_quote(server, Instrument.eur_usd, rng)
+        await asyncio.sleep(0.01)
+        await server.disconnect(websocket)
+        return snapshot, websocket.frames
+
+    snapshot, (delta, conflated) = asyncio.run(scenario())
+    assert (snapshot.sequence, len(snapshot.quotes)) == (MARKET_DATA_QUOTES, MARKET_DATA_QUOTES)
+    assert delta['messageType'] == 9
+    assert (delta['message']['sequence'], delta['message']['removed']) == (MARKET_DATA_QUOTES + 1, 1)
+    assert len(delta['message']['quotes']) == 1
+    assert conflated['messageType'] == 4
+    assert conflated['message']['sequence'] == MARKET_DATA_QUOTES + 3
+
+
+def test_incremental_stream_resnapshots_after_drop():
+    async def scenario():
+        server = NTProServer()
+        server.journal = OrderJournal(discard)
+        websocket = MemorySocket('client')
+        await server.connect(websocket)
+        server.connections['client'] = ClientConnection(websocket, queue_size=2,
+                                                        policy=SlowConsumerPolicy.drop_oldest)
+        rng = random.Random(1)
+        subscribe = client_messages.SubscribeMarketData(instrument=Instrument.eur_usd, mode=MarketDataMode.incremental)
+        await subscribe.process(server, websocket)
+
+        for _ in range(4):
+            await gen_quote(server, Instrument.eur_usd, rng)
+        await asyncio.sleep(0.01)
+        await gen_quote(server, Instrument.eur_usd, rng)
+        await asyncio.sleep(0.01)
+        await server.disconnect(websocket)
+        return websocket.frames
+
+    frames = asyncio.run(scenario())
+    # The first delta is dropped, so the fourth quote goes out as a snapshot.
+    assert [(frame['messageType'], frame['message']['sequence']) for frame in frames] == [(9, 3), (4, 4), (9, 5)]
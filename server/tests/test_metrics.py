@@ -0,0 +1,31 @@
+from fastapi.testclient import TestClient
+from server import metrics
+from server.app import api
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram('test_seconds', 'Test', ('kind',), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value, 'a')
+    assert list(histogram.render()) == [
+        '# HELP test_seconds Test',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{kind="a",le="0.1"} 1',
+        'test_seconds_bucket{kind="a",le="1"} 3',
+        'test_seconds_bucket{kind="a",le="+Inf"} 4',
+        'test_seconds_sum{kind="a"} 4.25',
+        'test_seconds_count{kind="a"} 4',
+    ]
+
+
+def test_metrics_endpoint(subscribe_normal_message):
+    client = TestClient(api)
+    with client.websocket_connect("/ws/") as websocket:
+        websocket.send_text(subscribe_normal_message)
+        websocket.receive_json()
+        text = client.get('/metrics').text
+
+    assert 'ntpro_connections 1' in text
+    assert 'ntpro_subscriptions{instrument="eur_usd"} 1' in text
+    assert 'ntpro_message_process_seconds_count{message_type="subscribe_market_data"}' in text
+    assert 'ntpro_send_queue_depth_bucket{le="+Inf"}' in text
@@ -0,0 +1,68 @@
+import asyncio
+import uuid
+from decimal import Decimal
+
+from server.enums import Instrument, OrderSide, OrderStatus
+from server.models import client_messages
+from server.ntpro_server import NTProServer
+from server.order_book import OrderBook
+from server.order_journal import OrderJournal
+from tests.utils_for_tests import MemorySocket, discard
+
+
+def test_price_time_priority_and_partial_fill():
+    book = OrderBook()
+    first, second, better = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    book.add(first, OrderSide.sell, 11, 5)
+    book.add(second, OrderSide.sell, 11, 5)
+    book.add(better, OrderSide.sell, 10, 2)
+
+    fills = book.add(uuid.uuid4(), OrderSide.buy, 11, 8)
+
+    assert [(fill.maker.order_id, fill.price, fill.amount) for fill in fills] == [
+        (better, 10, 2), (first, 11, 5), (second, 11, 1)]
+    assert fills[-1].taker_remaining == 0
+    assert book.depth(OrderSide.sell) == [(11, 4)]
+    assert len(book) == 1
+
+
+def test_unmatched_remainder_rests_and_cancel():
+    book = OrderBook()
+    resting = uuid.uuid4()
+    book.add(resting, OrderSide.buy, 9, 3)
+    fills = book.add(uuid.uuid4(), OrderSide.sell, 10, 4)
+    assert fills == []
+    assert book.best_price(OrderSide.buy) == 9
+    assert book.best_price(OrderSide.sell) == 10
+
+    assert book.cancel(resting).amount == 3
+    assert book.cancel(resting) is None
+    assert book.best_price(OrderSide.buy) is None
+
+
+def test_place_order_matches_other_client():
+    async def scenario():
+        server = NTProServer()
+        server.journal = OrderJournal(discard)
+        seller, buyer = MemorySocket('seller'), MemorySocket('buyer')
+        for websocket in (seller, buyer):
+            await server.connect(websocket)
+
+        sell = client_messages.PlaceOrder(instrument=Instrument.eur_usd.value, side=OrderSide.sell,
+                                          amount=5, price=10)
+        buy = client_messages.PlaceOrder(instrument=Instrument.eur_usd.value, side=OrderSide.buy,
+                                         amount=3, price=11)
+        await sell.process(server, seller)
+        responses = await buy.process(server, buyer)
+        await asyncio.sleep(0)
+        for websocket in (seller, buyer):
+            await server.disconnect(websocket)
+        return responses, seller.frames
+
+    responses, seller_frames = asyncio.run(scenario())
+    ack, trade, filled = responses
+    assert ack.order_status == OrderStatus.active
+    assert (trade.price, trade.amount, trade.remaining_amount) == (Decimal(10), 3, 0)
+    assert filled.order_status == OrderStatus.filled
+    assert seller_frames[0]['messageType'] == 8
+    assert seller_frames[0]['message']['remainingAmount'] == 2
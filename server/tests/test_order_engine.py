@@ -0,0 +1,100 @@
+import asyncio
+import uuid
+from decimal import Decimal
+from types import SimpleNamespace
+
+from server.enums import Instrument, OrderSide, OrderStatus
+from server.models import client_messages
+from server.ntpro_server import NTProServer
+from server.order_engine import OrderEngine
+from server.order_journal import OrderJournal
+from server.order_store import ClientOrders
+from server.records import OrderRecord, to_fixed
+from server.storage import MemoryStorage
+from tests.utils_for_tests import MemorySocket
+
+
+async def discard(inserts, updates):
+    pass
+
+
+def test_orders_processed_in_due_order_and_cancel_skipped():
+    async def scenario():
+        server = NTProServer()
+        server.journal = OrderJournal(discard)
+        engine = OrderEngine(server, min_delay=0.01, max_delay=0.05, seed=3)
+        websocket = SimpleNamespace(client='client')
+        orders = server.orders['client'] = ClientOrders()
+        orders.websockets.append(websocket)
+        for _ in range(20):
+            order_id = uuid.uuid4()
+            orders.add(order_id, OrderRecord(Instrument.eur_usd, OrderSide.buy, to_fixed(1.0), 1))
+            engine.schedule(orders, order_id)
+        cancelled_id, cancelled = next(iter(orders.items()))
+        orders.set_status(cancelled_id, OrderStatus.cancelled)
+
+        await engine.start()
+        await asyncio.sleep(0.1)
+        await engine.stop()
+        await server.journal.stop()
+        return engine, orders, cancelled
+
+    engine, orders, cancelled = asyncio.run(scenario())
+    assert engine.scheduled == 0
+    assert engine.processed == 20
+    assert cancelled.status == OrderStatus.cancelled
+    assert all(order.status in (OrderStatus.filled, OrderStatus.rejected)
+               for _, order in orders.items() if order is not cancelled)
+
+
+def test_sibling_connection_takes_over_orders():
+    async def scenario():
+        server = NTProServer(storage=MemoryStorage())
+        server.journal = OrderJournal(discard)
+        server.order_engine = OrderEngine(server, min_delay=0.05, max_delay=0.05)
+        first, second = MemorySocket('first'), MemorySocket('second')
+        for websocket in (first, second):
+            websocket.query_params = {'account': 'alice'}
+        await server.connect(first)
+        [report] = await client_messages.PlaceOrder(instrument=Instrument.eur_rub.value, side=OrderSide.buy,
+                                                    amount=1, price=Decimal(1)).process(server, first)
+        await server.connect(second)
+        scheduled = server.order_engine.scheduled
+        await server.disconnect(first)
+        book = server.order_books[Instrument.eur_rub]
+        resting = book.best_price(OrderSide.buy)
+        await asyncio.sleep(0.1)
+        order = server.orders[second.client][report.order_id]
+        await server.disconnect(second)
+        return scheduled, resting, order, book, second.frames
+
+    scheduled, resting, order, book, frames = asyncio.run(scenario())
+    assert scheduled == 1
+    assert resting == to_fixed(1.0)
+    assert order.status in (OrderStatus.filled, OrderStatus.rejected)
+    assert len(book) == 0
+    assert [frame['messageType'] for frame in frames] == [3]
+
+
+def test_fill_of_resting_order_reaches_remaining_connection():
+    async def scenario():
+        server = NTProServer(storage=MemoryStorage())
+        server.journal = OrderJournal(discard)
+        first, second = MemorySocket('first'), MemorySocket('second')
+        for websocket in (first, second):
+            websocket.query_params = {'account': 'alice'}
+        await server.connect(first)
+        await server.connect(second)
+        [placed] = await client_messages.PlaceOrder(instrument=Instrument.eur_rub.value, side=OrderSide.buy,
+                                                    amount=1, price=Decimal(1)).process(server, first)
+        await server.disconnect(first)
+        await client_messages.PlaceOrder(instrument=Instrument.eur_rub.value, side=OrderSide.sell,
+                                         amount=1, price=Decimal(1)).process(server, second)
+        await asyncio.sleep(0.01)
+        await server.disconnect(second)
+        return placed.order_id, first.frames, second.frames
+
+    order_id, first_frames, second_frames = asyncio.run(scenario())
+    assert first_frames == []
+    assert {frame['message']['orderId'] for frame in second_frames} == {str(order_id)}
+    assert [frame['messageType'] for frame in second_frames] == [8, 3]
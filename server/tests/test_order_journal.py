@@ -0,0 +1,179 @@
+import asyncio
+import uuid
+
+import pytest
+from server.enums import Instrument, OrderSide, OrderStatus
+from server.order_journal import JournalWriteError, OrderJournal
+from server.records import OrderRecord, to_fixed
+
+
+def make_order():
+    return OrderRecord(Instrument.eur_usd, OrderSide.buy, to_fixed(20.0), 3)
+
+
+class RecordingWriter:
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    async def __call__(self, inserts, updates):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('database is down')
+        self.batches.append((inserts, updates))
+
+
+def test_insert_and_update_coalesced():
+    async def scenario():
+        writer = RecordingWriter()
+        journal = OrderJournal(writer, flush_interval=10)
+        order_id, order = uuid.uuid4(), make_order()
+        await journal.insert('client', order_id, order)
+        order.status = OrderStatus.cancelled
+        await journal.update(order_id, order)
+        await journal.stop()
+        return writer.batches
+
+    batches = asyncio.run(scenario())
+    assert len(batches) == 1
+    inserts, updates = batches[0]
+    assert updates == []
+    assert inserts[0]['status'] == OrderStatus.cancelled
+
+
+def test_update_after_flushed_insert_keeps_order():
+    async def scenario():
+        writer = RecordingWriter()
+        journal = OrderJournal(writer, flush_interval=0.01)
+        order_id, order = uuid.uuid4(), make_order()
+        await journal.insert('client', order_id, order)
+        await asyncio.sleep(0.05)
+        order.status = OrderStatus.filled
+        await journal.update(order_id, order)
+        await journal.stop()
+        return writer.batches
+
+    batches = asyncio.run(scenario())
+    assert [len(inserts) for inserts, _ in batches] == [1, 0]
+    assert batches[1][1][0]['status'] == OrderStatus.filled
+
+
+def test_durable_waits_for_flush():
+    async def scenario():
+        writer = RecordingWriter()
+        journal = OrderJournal(writer, flush_interval=0.01, durable=True)
+        await journal.insert('client', uuid.uuid4(), make_order())
+        flushed = len(writer.batches)
+        await journal.stop()
+        return flushed
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_durable_batch_written_and_awaited_once():
+    async def scenario():
+        writer = RecordingWriter()
+        journal = OrderJournal(writer, flush_interval=10, durable=True)
+        await journal.start()
+        async with journal.batch():
+            for _ in range(3):
+                await journal.insert('client', uuid.uuid4(), make_order())
+            assert writer.batches == []
+        flushed = list(writer.batches)
+        await journal.stop()
+        return flushed
+
+    assert [len(inserts) for inserts, _ in asyncio.run(scenario())] == [3]
+
+
+def test_backpressure_and_retry():
+    async def scenario():
+        writer = RecordingWriter(failures=2)
+        journal = OrderJournal(writer, batch_size=2, max_pending=2, flush_interval=0.01)
+        for _ in range(5):
+            await journal.insert('client', uuid.uuid4(), make_order())
+            assert journal.pending <= 2
+        await journal.stop()
+        return writer.batches, journal.failed_flushes
+
+    batches, failed_flushes = asyncio.run(scenario())
+    assert failed_flushes == 2
+    assert sum(len(inserts) for inserts, _ in batches) == 5
+
+
+def test_flushes_an_interval_after_the_first_write():
+    async def scenario():
+        writer = RecordingWriter()
+        journal = OrderJournal(writer, flush_interval=0.05)
+        await journal.start()
+        idle_timer = journal._flush_timer
+        await journal.insert('client', uuid.uuid4(), make_order())
+        await asyncio.sleep(0.03)
+        await journal.insert('client', uuid.uuid4(), make_order())
+        await asyncio.sleep(0.03)
+        flushed = [len(inserts) for inserts, _ in writer.batches]
+        timer_after_flush = journal._flush_timer
+        await journal.stop()
+        return idle_timer, flushed, timer_after_flush
+
+    idle_timer, flushed, timer_after_flush = asyncio.run(scenario())
+    assert idle_timer is None and timer_after_flush is None
+    assert flushed == [2]
+
+
+class RejectingWriter(RecordingWriter):
+    """Fails every write holding an order with the rejected amount."""
+
+    async def __call__(self, inserts, updates):
+        if any(insert['amount'] == 13 for insert in inserts):
+            raise ValueError('numeric field overflow')
+        self.batches.append((inserts, updates))
+
+
+def test_stop_returns_while_writer_keeps_failing():
+    async def scenario():
+        writer = RecordingWriter(failures=10 ** 9)
+        journal = OrderJournal(writer, flush_interval=0.01, durable=True, retry_delay=0.01, stop_timeout=0.2)
+        write = asyncio.get_running_loop().create_task(journal.insert('client', uuid.uuid4(), make_order()))
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(journal.stop(), timeout=2)
+        with pytest.raises(JournalWriteError):
+            await write
+        return journal
+
+    journal = asyncio.run(scenario())
+    assert journal.pending == 0
+    assert journal.dropped_orders == 1
+
+
+def test_rejected_order_split_out_and_dropped():
+    async def scenario():
+        writer = RejectingWriter()
+        journal = OrderJournal(writer, flush_interval=10, retry_delay=0.01)
+        await journal.start()
+        async with journal.batch():
+            for amount in (1, 2, 13, 4, 5):
+                await journal.insert('client', uuid.uuid4(), OrderRecord(
+                    Instrument.eur_usd, OrderSide.buy, to_fixed(20.0), amount))
+        await asyncio.sleep(0.01)
+        written = sorted(insert['amount'] for inserts, _ in writer.batches for insert in inserts)
+        await journal.stop()
+        return written, journal
+
+    written, journal = asyncio.run(scenario())
+    assert written == [1, 2, 4, 5]
+    assert journal.dropped_orders == 1
+    assert journal.pending == 0
+
+
+def test_outage_retried_until_written():
+    async def scenario():
+        writer = RecordingWriter(failures=50)
+        journal = OrderJournal(writer, flush_interval=0.001, retry_delay=0.001, durable=True)
+        await asyncio.gather(*(journal.insert('client', uuid.uuid4(), make_order()) for _ in range(3)))
+        await journal.stop()
+        return writer.batches, journal
+
+    batches, journal = asyncio.run(scenario())
+    assert sum(len(inserts) for inserts, _ in batches) == 3
+    assert journal.dropped_orders == 0
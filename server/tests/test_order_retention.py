@@ -0,0 +1,54 @@
+import asyncio
+import datetime
+
+from server.order_retention import OrderRetention
+
+
+class FakeTable:
+    def __init__(self, finished, failures=0):
+        self.finished = finished
+        self.failures = failures
+        self.calls = []
+
+    async def __call__(self, cutoff, limit):
+        self.calls.append(cutoff)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('database is down')
+        moved = min(self.finished, limit)
+        self.finished -= moved
+        return moved
+
+
+def test_moves_in_batches_until_done():
+    table = FakeTable(25)
+    retention = OrderRetention(table, age=datetime.timedelta(days=1), batch_size=10)
+    before = datetime.datetime.now()
+    assert asyncio.run(retention.run_once()) == 25
+    assert len(table.calls) == 3
+    assert all(cutoff <= before - datetime.timedelta(days=1) + datetime.timedelta(seconds=1)
+               for cutoff in table.calls)
+    assert retention.stats() == {'runs': 1, 'archived': 25, 'failed_runs': 0}
+
+
+def test_periodic_runs_survive_failures():
+    async def scenario():
+        table = FakeTable(5, failures=1)
+        retention = OrderRetention(table, age=datetime.timedelta(days=1), interval=0.01, batch_size=10)
+        await retention.start()
+        await asyncio.sleep(0.05)
+        await retention.stop()
+        return table, retention
+
+    table, retention = asyncio.run(scenario())
+    assert table.finished == 0
+    assert retention.failed_runs == 1 and retention.archived == 5
+
+
+def test_zero_age_disables():
+    async def scenario():
+        retention = OrderRetention(FakeTable(5), age=datetime.timedelta(0), interval=0.01)
+        await retention.start()
+        return retention.is_running
+
+    assert asyncio.run(scenario()) is False
@@ -0,0 +1,152 @@
+import asyncio
+import datetime
+import json
+import uuid
+from decimal import Decimal
+
+from server import decoders, message_processors
+from server.enums import Instrument, OrderSide, OrderStatus
+from server.models import client_messages
+from server.ntpro_server import NTProServer
+from server.order_journal import OrderJournal
+from server.order_store import ClientOrders
+from server.records import OrderRecord, to_fixed, to_ns
+from server.storage import MemoryStorage
+from tests.utils_for_tests import MemorySocket, discard
+
+START = datetime.datetime(2023, 1, 1)
+
+
+def make_orders(count):
+    orders = ClientOrders()
+    ids = []
+    for number in range(count):
+        order_id = uuid.uuid4()
+        orders.add(order_id, OrderRecord(list(Instrument)[number % len(Instrument)], OrderSide.buy, to_fixed(1.0), 1,
+                                         creation_time=to_ns(START + datetime.timedelta(seconds=number))))
+        ids.append(order_id)
+    return orders, ids
+
+
+def test_status_index_follows_changes():
+    orders, ids = make_orders(10)
+    for order_id in ids[::3]:
+        orders.set_status(order_id, OrderStatus.filled)
+    assert (orders.count(OrderStatus.active), orders.count(OrderStatus.filled)) == (6, 4)
+    filled, cursor = orders.query(status=OrderStatus.filled)
+    assert [order_id for order_id, _ in filled] == ids[::3]
+    assert cursor is None
+
+
+def test_filters_and_time_range():
+    orders, ids = make_orders(12)
+    orders.set_status(ids[3], OrderStatus.cancelled)
+    page, _ = orders.query(status=OrderStatus.active, instrument=Instrument.eur_usd,
+                           since=START + datetime.timedelta(seconds=2), until=START + datetime.timedelta(seconds=9))
+    assert [order_id for order_id, _ in page] == [ids[6]]
+
+
+def test_cursor_pagination():
+    orders, ids = make_orders(25)
+    seen, cursor = [], None
+    while True:
+        page, cursor = orders.query(instrument=Instrument.eur_rub, after=cursor, limit=3)
+        seen.extend(order_id for order_id, _ in page)
+        if cursor is None:
+            break
+    assert seen == ids[1::3]
+
+
+def test_get_orders_streams_frames(monkeypatch):
+    monkeypatch.setattr(message_processors, 'GET_ORDERS_FRAME_SIZE', 4)
+
+    async def scenario():
+        server = NTProServer()
+        server.journal = OrderJournal(discard)
+        websocket = MemorySocket('client')
+        await server.connect(websocket)
+        orders, _ = make_orders(10)
+        orders.websockets.append(websocket)
+        server.orders[websocket.client] = orders
+        last = await client_messages.GetOrders(limit=9).process(server, websocket)
+        await asyncio.sleep(0.01)
+        await server.disconnect(websocket)
+        return websocket.frames, last
+
+    frames, last = asyncio.run(scenario())
+    assert [len(frame['message']['orders']) for frame in frames] == [4, 4]
+    assert all(frame['message']['partial'] for frame in frames)
+    assert (len(last.orders), last.next_cursor, last.partial) == (1, 8, False)
+
+
+def test_load_merges_in_creation_order():
+    orders, ids = make_orders(4)
+    older = [(uuid.uuid4(), OrderRecord(Instrument.eur_usd, OrderSide.sell, to_fixed(1.0), 1, OrderStatus.filled,
+                                        to_ns(START - datetime.timedelta(seconds=1))))]
+    orders.load(older + [(ids[2], orders[ids[2]])])
+    page, _ = orders.query()
+    assert [order_id for order_id, _ in page] == [older[0][0]] + ids
+    assert orders.count(OrderStatus.filled) == 1
+
+
+class RecordingStorage(MemoryStorage):
+    def __init__(self):
+        super().__init__()
+        self.reads = []
+
+    async def read_account_orders(self, account, *, active, limit):
+        self.reads.append((account, active))
+        return await super().read_account_orders(account, active=active, limit=limit)
+
+
+def test_account_orders_survive_reconnect():
+    stored, _ = make_orders(3)
+    stored.set_status(list(stored.items())[0][0], OrderStatus.filled)
+    storage = RecordingStorage()
+
+    async def scenario():
+        await storage.write_orders([dict(uuid=order_id, address='old', account='alice', **order.row())
+                                    for order_id, order in stored.items()], [])
+        server = NTProServer(storage=storage)
+        server.journal = OrderJournal(discard)
+        first = MemorySocket('first')
+        first.query_params = {'account': 'alice'}
+        await server.connect(first)
+        active = len(server.orders[first.client])
+        await client_messages.PlaceOrder(instrument=Instrument.eur_rub.value, side=OrderSide.buy,
+                                         amount=1, price=Decimal(1)).process(server, first)
+        await server.disconnect(first)
+
+        second = MemorySocket('second')
+        second.query_params = {'account': 'alice'}
+        await server.connect(second)
+        everything = await client_messages.GetOrders().process(server, second)
+        again = await client_messages.GetOrders().process(server, second)
+        await server.disconnect(second)
+        return active, everything, again
+
+    active, everything, again = asyncio.run(scenario())
+    assert active == 2
+    assert storage.reads == [('alice', True), ('alice', False)]
+    assert len(everything.orders) == len(again.orders) == 4
+    assert everything.orders[0].status == OrderStatus.filled
+
+
+def test_get_orders_with_utc_since():
+    async def scenario():
+        server = NTProServer(storage=MemoryStorage())
+        server.journal = OrderJournal(discard)
+        websocket = MemorySocket('client')
+        await server.connect(websocket)
+        await client_messages.PlaceOrder(instrument=Instrument.eur_rub.value, side=OrderSide.buy,
+                                         amount=1, price=Decimal(1)).process(server, websocket)
+        since = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1)).isoformat()
+        message = decoders.decode(json.dumps({'messageType': 5, 'message': {
+            'since': since.replace('+00:00', 'Z'), 'until': '2999-01-01T00:00:00+03:00'}}))
+        listed = await message.process(server, websocket)
+        await server.disconnect(websocket)
+        return message, listed
+
+    message, listed = asyncio.run(scenario())
+    assert message.since.tzinfo is None and message.until.tzinfo is None
+    assert len(listed.orders) == 1
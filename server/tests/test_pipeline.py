@@ -0,0 +1,95 @@
+import asyncio
+import uuid
+
+import fastapi
+import pytest
+from server.enums import Instrument, OrderSide
+from server.ntpro_server import NTProServer
+from server.order_journal import OrderJournal
+from server.pipeline import Pipeline
+from server.records import OrderRecord
+from server.storage import MemoryStorage
+from tests.utils_for_tests import MemorySocket
+
+PLACE = {'messageType': 3, 'message': {'instrument': 2, 'side': 1, 'amount': 3, 'price': 20}}
+SNAPSHOT = {'messageType': 7, 'message': {'instrument': 1}}
+
+
+def test_keys_order_requests_and_limit_in_flight():
+    async def scenario():
+        pipeline = Pipeline(2)
+        log = []
+
+        async def request(name, delay):
+            log.append(f'start {name}')
+            await asyncio.sleep(delay)
+            log.append(f'end {name}')
+
+        await pipeline.submit(('a',), request('first a', 0.02))
+        await pipeline.submit(('b',), request('b', 0))
+        await pipeline.submit(('a',), request('second a', 0))
+        in_flight = pipeline.in_flight
+        await pipeline.submit(None, request('barrier', 0))
+        await pipeline.submit((), request('after barrier', 0))
+        await pipeline.close()
+        return log, in_flight
+
+    log, in_flight = asyncio.run(scenario())
+    assert in_flight == 2
+    assert log.index('end first a') < log.index('start second a')
+    assert log.index('end second a') < log.index('start barrier') < log.index('end barrier') < log.index(
+        'start after barrier')
+
+
+def test_failure_raised_by_close():
+    async def scenario():
+        pipeline = Pipeline()
+
+        async def broken():
+            raise RuntimeError('broken')
+
+        await pipeline.submit((), broken())
+        await pipeline.close()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
+
+
+def serve(incoming, prepare=None, binary=False):
+    async def scenario():
+        server = NTProServer(storage=MemoryStorage())
+        # Durable replies wait for the journal flush, so a placed order is slow.
+        server.journal = OrderJournal(server.storage.write_orders, flush_interval=0.05, durable=True)
+        websocket = MemorySocket('client', incoming)
+        await server.connect(websocket)
+        if prepare is not None:
+            prepare(server, websocket)
+        with pytest.raises(fastapi.WebSocketDisconnect):
+            await server.serve(websocket)
+        await server.disconnect(websocket)
+        return websocket.frames
+
+    return asyncio.run(scenario())
+
+
+def test_replies_complete_out_of_order_with_correlation_ids():
+    frames = serve([dict(PLACE, correlationId='place'), dict(SNAPSHOT, correlationId=7),
+                    dict(SNAPSHOT, correlationId=[1])])
+    # A frame that cannot be decoded is answered by the reader right away.
+    assert [(frame['messageType'], frame.get('correlationId')) for frame in frames] == [(2, None), (7, 7),
+                                                                                         (3, 'place')]
+
+
+def test_requests_for_one_order_keep_their_order():
+    order_id = uuid.uuid4()
+
+    def prepare(server, websocket):
+        order = OrderRecord(Instrument.usd_rub, OrderSide.buy, 20 * 10 ** 8, 3)
+        server.orders[websocket.client].add(order_id, order)
+        server.order_books[order.instrument].add(order_id, order.side, order.price, order.amount,
+                                                 server.orders[websocket.client])
+
+    cancel = {'messageType': 4, 'message': {'orderId': str(order_id)}}
+    frames = serve([dict(cancel, correlationId=1), SNAPSHOT, dict(cancel, correlationId=2)], prepare)
+    assert [(frame['messageType'], frame.get('correlationId')) for frame in frames] == [(7, None), (3, 1), (2, 2)]
+    assert frames[2]['message']['reason'] == 'The order is cancelled'
@@ -0,0 +1,52 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+from server.models.base import Quote
+from server.quote_history import QuoteHistory
+from server.records import quote_values
+
+
+def quote(number):
+    return (number, number + 1, number + 2, number + 3, number * 1000)
+
+
+def test_keeps_last_quotes_in_order():
+    history = QuoteHistory(3)
+    for number in range(5):
+        history.append(*quote(number))
+    assert len(history) == 3
+    assert history.values() == [quote(2), quote(3), quote(4)]
+    assert history.values(2) == [quote(3), quote(4)]
+    assert history.values(10) == [quote(2), quote(3), quote(4)]
+    assert [model.bid for model in history.latest(2)] == [Decimal('3E-8'), Decimal('4E-8')]
+    assert history.last().timestamp == datetime.datetime(1970, 1, 1, microsecond=4)
+
+
+def test_models_of_newest_quotes_are_reused():
+    history = QuoteHistory(5, cached=2)
+    for number in range(4):
+        history.append(*quote(number))
+    latest = history.latest(3)
+    again = history.latest(3)
+    assert (again[0] is latest[0], again[1] is latest[1], again[2] is latest[2]) == (False, True, True)
+    assert history.latest(2)[1] is latest[2]
+    history.append(*quote(4))
+    assert history.last() is not latest[2]
+
+
+def test_quote_values_round_trip():
+    model = Quote(bid=Decimal('32.64924743'), offer=Decimal(20), min_amount=Decimal('1.5'),
+                  max_amount=Decimal(50), timestamp=datetime.datetime(2023, 1, 1, 12, 30, 1, 250))
+    history = QuoteHistory(1)
+    history.append(*quote_values(model))
+    assert history.last() == model
+
+
+def test_empty_history():
+    history = QuoteHistory(3)
+    assert history.latest() == []
+    assert history.values() == []
+    assert history.last() is None
+    with pytest.raises(ValueError):
+        QuoteHistory(0)
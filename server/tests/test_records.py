@@ -0,0 +1,52 @@
+import datetime
+from decimal import Decimal
+
+import pydantic
+import pytest
+from server import records
+from server.enums import Instrument, OrderSide
+from server.models import client_messages
+from server.records import OrderRecord, from_fixed, from_ns, round_to_tick, tick_price, to_fixed, to_ns
+
+
+def test_fixed_point_round_trip():
+    assert to_fixed(Decimal('35.125')) == to_fixed(35.125) == 3_512_500_000
+    assert (from_fixed(3_512_500_000), from_fixed(2_000_000_000)) == (Decimal('35.125'), Decimal(20))
+    assert str(from_fixed(2_000_000_000)) == '20'
+    moment = datetime.datetime(2023, 1, 1, 12, 0, 0, 123456)
+    assert from_ns(to_ns(moment)) == moment
+
+
+def test_order_record_row_round_trip():
+    record = OrderRecord(Instrument.usd_rub, OrderSide.sell, to_fixed(Decimal('91.5')), 7)
+    assert OrderRecord.from_row(record.row()).row() == record.row()
+    assert record.to_model().price == Decimal('91.5')
+
+
+def test_prices_on_the_tick_grid(monkeypatch):
+    assert round_to_tick(Instrument.eur_rub, to_fixed(Decimal('35.12345'))) == to_fixed(Decimal('35.1235'))
+    assert tick_price(Instrument.eur_usd, Decimal('35.12345')) == Decimal('35.12345')
+    with pytest.raises(ValueError):
+        tick_price(Instrument.eur_rub, Decimal('35.12345'))
+    # Off the grid by less than the precision of the default decimal context.
+    with pytest.raises(pydantic.ValidationError):
+        client_messages.PlaceOrder(instrument=Instrument.eur_rub.value, side=OrderSide.buy, amount=1,
+                                   price='1.0000000000000000000000000001')
+
+    monkeypatch.setattr(records, 'PRICE_ROUNDING', 'round')
+    assert tick_price(Instrument.eur_rub, Decimal('35.12345')) == Decimal('35.1235')
+    assert tick_price(Instrument.eur_rub, Decimal('1.0000000000000000000000000001')) == Decimal(1)
+    assert tick_price(Instrument.eur_rub, Decimal('1.00005')) == Decimal('1.0001')
+    with pytest.raises(ValueError):
+        tick_price(Instrument.eur_rub, Decimal('0.00001'))
+
+
+def test_place_order_price_bounds():
+    message = client_messages.PlaceOrder(instrument=Instrument.eur_rub.value, side=OrderSide.buy,
+                                         amount=1, price='35.50000000')
+    assert str(message.price) == '35.5'
+    for price in ('35.12345', '1e10'):
+        with pytest.raises(pydantic.ValidationError):
+            client_messages.PlaceOrder(instrument=Instrument.eur_rub.value, side=OrderSide.buy, amount=1, price=price)
+    with pytest.raises(pydantic.ValidationError):
+        client_messages.PlaceOrder(instrument=Instrument.eur_rub.value, side=OrderSide.buy, amount=2 ** 31, price=1)
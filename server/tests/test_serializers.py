@@ -0,0 +1,36 @@
+import datetime
+import uuid
+from decimal import Decimal
+
+import pytest
+from server import serializers
+from server.enums import Instrument, OrderSide, OrderStatus
+from server.models import server_messages
+from server.models.base import OrderOut, Quote
+
+TIMESTAMP = datetime.datetime(2023, 1, 1, 12, 30, 15, 120)
+QUOTE = Quote(bid=Decimal.from_float(32.6492474374773), offer=Decimal('20'),
+              min_amount=Decimal('1.50'), max_amount=Decimal('1E+2'), timestamp=TIMESTAMP)
+ORDER = OrderOut(uuid=uuid.uuid4(), side=OrderSide.sell, price=Decimal('50.25'), amount=5,
+                 instrument=Instrument.usd_rub, status=OrderStatus.rejected,
+                 creation_time=TIMESTAMP, change_time=TIMESTAMP)
+
+MESSAGES = [
+    server_messages.SuccessInfo(subscription_id=uuid.uuid4()),
+    server_messages.ErrorInfo(reason='The message is not a "valid" JSON é'),
+    server_messages.ExecutionReport(order_id=uuid.uuid4(), order_status=OrderStatus.filled),
+    server_messages.MarketDataUpdate(subscription_id=uuid.uuid4(), instrument=Instrument.eur_rub,
+                                     quotes=[QUOTE, QUOTE]),
+    server_messages.OrdersList(orders=[ORDER]),
+    server_messages.OrdersList(orders=[]),
+    server_messages.MarketDataSnapshot(instrument=Instrument.eur_usd, quotes=[QUOTE]),
+    server_messages.TradeReport(order_id=uuid.uuid4(), instrument=Instrument.eur_usd, side=OrderSide.buy,
+                                price=Decimal('10.5'), amount=3, remaining_amount=0),
+]
+
+
+@pytest.mark.parametrize('message', MESSAGES, ids=lambda message: message.__class__.__name__)
+def test_byte_compatible_with_pydantic(message):
+    expected = server_messages.ServerEnvelope(
+        message_type=message.get_type(), message=message.dict(by_alias=True)).json(by_alias=True)
+    assert serializers.serialize(message) == expected
@@ -0,0 +1,133 @@
+import asyncio
+import uuid
+
+from server import broker, ntpro_server, state_bus
+from server.enums import Instrument, OrderSide, OrderStatus
+from server.market_data import MarketDataEngine
+from server.ntpro_server import NTProServer
+from server.order_journal import OrderJournal
+from server.records import OrderRecord, to_fixed
+from server.state_bus import BrokerBus, LocalBus
+from server.storage import MemoryStorage
+from tests.utils_for_tests import discard
+
+
+def test_local_store_merges_and_deletes():
+    async def scenario():
+        bus = LocalBus()
+        await bus.put('orders', 'a', {'status': 'active', 'amount': 3})
+        await bus.put('orders', 'a', {'status': 'filled'})
+        merged = await bus.get('orders', 'a')
+        await bus.put('orders', 'a', None)
+        return merged, await bus.get('orders', 'a')
+
+    assert asyncio.run(scenario()) == ({'status': 'filled', 'amount': 3}, None)
+
+
+def test_broker_fan_out_store_and_election(tmp_path):
+    path = str(tmp_path / 'bus.sock')
+
+    async def scenario():
+        server = await broker.serve(path)
+        received = {'first': [], 'second': []}
+        leaders = []
+        buses = {}
+        for name in received:
+            bus = buses[name] = BrokerBus(path)
+
+            async def handler(payload, name=name):
+                received[name].append(payload)
+
+            async def elected(name=name):
+                leaders.append(name)
+
+            async def lost():
+                pass
+
+            bus.subscribe('quotes', handler)
+            await bus.start()
+            await bus.elect(elected, lost)
+
+        await buses['second'].publish('quotes', [1, {1: 2}])
+        await buses['first'].put('orders', 'a', {'status': 'active'})
+        await asyncio.sleep(0.05)
+        stored = await buses['second'].get('orders', 'a')
+        await buses['first'].stop()
+        await asyncio.sleep(0.05)
+        await buses['second'].stop()
+        server.close()
+        return received, stored, leaders
+
+    received, stored, leaders = asyncio.run(scenario())
+    assert received == {'first': [[1, {1: 2}]], 'second': [[1, {1: 2}]]}
+    assert stored == {'status': 'active'}
+    assert leaders == ['first', 'second']
+
+
+def test_quotes_generated_once_for_all_workers(tmp_path):
+    path = str(tmp_path / 'bus.sock')
+
+    async def scenario():
+        server = await broker.serve(path)
+        workers = [NTProServer(BrokerBus(path)) for _ in range(3)]
+        for worker in workers:
+            worker.journal = OrderJournal(discard)
+            worker.market_data = MarketDataEngine(worker, rates={Instrument.eur_usd: 100})
+            await worker.start()
+        await asyncio.sleep(0.2)
+        for worker in workers:
+            await worker.stop()
+        server.close()
+        return workers
+
+    workers = asyncio.run(scenario())
+    assert sum(worker.bus.published for worker in workers) == workers[0].bus.published > 0
+    histories = [worker.quotes[Instrument.eur_usd].latest() for worker in workers]
+    common = min(map(len, histories))
+    assert common > 0
+    assert histories[1][:common] == histories[0][:common] == histories[2][:common]
+
+
+def test_active_orders_shared_after_write():
+    async def scenario():
+        server = NTProServer(LocalBus(), MemoryStorage())
+        order_id, order = uuid.uuid4(), OrderRecord(Instrument.eur_usd, OrderSide.buy, to_fixed(20.0), 3)
+        await server.journal.insert('client', order_id, order)
+        await server.journal.stop()
+        shared = await server.get_order(order_id)
+        order.status = OrderStatus.filled
+        await server.journal.update(order_id, order)
+        await server.journal.stop()
+        return shared, await server.bus.get(ntpro_server.ORDERS_NAMESPACE, str(order_id))
+
+    shared, finished = asyncio.run(scenario())
+    assert (shared['status'], shared['price'], shared['address']) == ('active', '20', 'client')
+    assert finished is None
+
+
+def test_broker_bus_starts_without_broker(tmp_path, monkeypatch):
+    path = str(tmp_path / 'bus.sock')
+    monkeypatch.setattr(state_bus, 'STATE_BUS_RETRY_DELAY', 0.01)
+
+    async def scenario():
+        bus = BrokerBus(path, connect_timeout=0.05)
+        leaders = []
+
+        async def elected():
+            leaders.append('bus')
+
+        async def lost():
+            pass
+
+        await asyncio.wait_for(bus.start(), timeout=1)
+        await bus.elect(elected, lost)
+        await bus.publish('quotes', [1])
+        degraded = bus.stats()['connected']
+        server = await broker.serve(path)
+        await asyncio.sleep(0.1)
+        connected = bus.stats()['connected']
+        await bus.stop()
+        server.close()
+        return degraded, connected, leaders
+
+    assert asyncio.run(scenario()) == (False, True, ['bus'])
@@ -0,0 +1,85 @@
+import asyncio
+import datetime
+import uuid
+from decimal import Decimal
+
+import pytest
+from server.enums import Instrument, OrderSide, OrderStatus
+from server.models.base import OrderIn
+from server.storage import MemoryStorage, SqliteStorage
+
+START = datetime.datetime(2023, 1, 1)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storage(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStorage()
+    return SqliteStorage(str(tmp_path / 'orders.sqlite3'))
+
+
+def make_row(number, account='alice'):
+    order = OrderIn(side=OrderSide.buy, price=Decimal('35.125'), amount=number + 1, instrument=Instrument.eur_rub,
+                    creation_time=START + datetime.timedelta(minutes=number),
+                    change_time=START + datetime.timedelta(minutes=number))
+    return dict(uuid=uuid.uuid4(), address='127.0.0.1:5000', account=account, **order.dict())
+
+
+def test_write_read_and_archive(storage):
+    rows = [make_row(number) for number in range(6)] + [make_row(6, account='bob')]
+
+    async def scenario():
+        await storage.write_orders(rows[:4], [])
+        await storage.write_orders(rows[4:], [dict(uuid=row['uuid'], status=OrderStatus.filled,
+                                                   change_time=START + datetime.timedelta(hours=1))
+                                              for row in rows[:3]])
+        stored = await storage.read_order(rows[0]['uuid'])
+        active = await storage.read_account_orders('alice', active=True, limit=2)
+        archived = await storage.archive_orders(START + datetime.timedelta(hours=2), 2)
+        archived += await storage.archive_orders(START + datetime.timedelta(hours=2), 2)
+        history = await storage.read_account_orders('alice', active=False, limit=10)
+        moved = await storage.read_order(rows[0]['uuid'])
+        await storage.disconnect()
+        return stored, active, archived, history, moved
+
+    stored, active, archived, history, moved = asyncio.run(scenario())
+    assert stored == dict(rows[0], status=OrderStatus.filled, change_time=START + datetime.timedelta(hours=1))
+    assert [row['uuid'] for row in active] == [rows[4]['uuid'], rows[5]['uuid']]
+    assert archived == 3
+    assert [row['uuid'] for row in history] == [row['uuid'] for row in rows[:3]]
+    assert moved == stored
+
+
+class LoopStorage(MemoryStorage):
+    """Records the loops it is used and disconnected in, like the lazy pool."""
+
+    def __init__(self):
+        super().__init__()
+        self.used, self.disconnected = [], []
+
+    async def read_account_orders(self, account, *, active, limit):
+        self.used.append(asyncio.get_running_loop())
+        return await super().read_account_orders(account, active=active, limit=limit)
+
+    async def disconnect(self):
+        self.disconnected.append(asyncio.get_running_loop())
+
+
+def test_server_started_by_a_connection_disconnects_storage_in_its_loop():
+    from server.ntpro_server import NTProServer
+    from tests.utils_for_tests import MemorySocket
+
+    storage = LoopStorage()
+    server = NTProServer(storage=storage)
+
+    async def session(name):
+        websocket = MemorySocket(name)
+        websocket.query_params = {'account': name}
+        await server.connect(websocket)
+        await server.disconnect(websocket)
+
+    # Every TestClient websocket session runs on an event loop of its own.
+    asyncio.run(session('first'))
+    asyncio.run(session('second'))
+    assert len(storage.disconnected) == 2
+    assert storage.disconnected == storage.used
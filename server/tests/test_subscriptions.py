@@ -1,5 +1,6 @@
 from fastapi.testclient import TestClient
-from server.app import api
+from server.app import api, server
+from server.enums import Instrument
 from tests.utils_for_tests import is_valid_uuid
 
 
@@ -75,3 +76,46 @@ def test_quotes(subscribe_normal_message):
         fields_internal = ('bid', 'offer', 'minAmount',
                            'maxAmount', 'timestamp')
         assert all(map(quote.__contains__, fields_internal))
+
+
+def test_subscribers_index(subscribe_normal_message):
+    client = TestClient(api)
+    with client.websocket_connect("/ws/") as websocket:
+        websocket.send_text(subscribe_normal_message)
+        uuid = websocket.receive_json()['message']['subscriptionId']
+        assert list(map(str, server.subscribers[Instrument.eur_usd].values())) == [uuid]
+        websocket.send_text(f'{{"messageType": 2, "message": '
+                            f'{{"subscriptionId": "{uuid}"}}}}')
+        websocket.receive_json()
+        assert not server.subscribers[Instrument.eur_usd]
+        websocket.send_text(subscribe_normal_message)
+        websocket.receive_json()
+    assert not server.subscribers[Instrument.eur_usd]
+
+
+def test_market_data_snapshot(market_data_snapshot_message):
+    client = TestClient(api)
+    with client.websocket_connect("/ws/") as websocket:
+        websocket.send_text(market_data_snapshot_message)
+        data = websocket.receive_json()
+        assert data['messageType'] == 7
+        assert data['message']['instrument'] == 'EUR/USD'
+        assert len(data['message']['quotes']) <= 5
+
+
+def test_incremental_subscription():
+    client = TestClient(api)
+    with client.websocket_connect("/ws/") as websocket:
+        websocket.send_text(r'{"messageType": 1, "message": {"instrument": 1, "mode": 2}}')
+        uuid = websocket.receive_json()['message']['subscriptionId']
+        snapshot = websocket.receive_json()
+        assert snapshot['messageType'] == 4
+        delta = websocket.receive_json()
+        assert delta['messageType'] == 9
+        assert delta['message']['subscriptionId'] == uuid
+        assert delta['message']['sequence'] == snapshot['message']['sequence'] + 1
+        websocket.send_text(f'{{"messageType": 8, "message": {{"subscriptionId": "{uuid}"}}}}')
+        resnapshot = websocket.receive_json()
+        assert resnapshot['messageType'] == 4
+        assert resnapshot['message']['sequence'] >= delta['message']['sequence']
+    assert not server.delta_subscriptions
@@ -0,0 +1,20 @@
+import datetime
+import uuid
+from decimal import Decimal
+
+from server import utils
+from server.enums import Instrument, OrderSide, OrderStatus
+from server.models.base import OrderIn
+
+
+def test_prepared_statement_arguments():
+    order_id = uuid.uuid4()
+    order = OrderIn(side=OrderSide.sell, price=Decimal('35.5'), amount=3, instrument=Instrument.usd_rub,
+                    creation_time=datetime.datetime(2023, 1, 1))
+    row = dict(uuid=order_id, address='client', account='alice', **order.dict())
+    arguments = dict(zip(utils.ORDER_COLUMNS, utils.insert_arguments(row)))
+    assert arguments == dict(row, instrument='usd_rub', side='sell', status='active')
+    assert utils.INSERT_ORDER.count('$') == len(utils.ORDER_COLUMNS)
+
+    update = dict(uuid=order_id, status=OrderStatus.filled, change_time=order.change_time)
+    assert utils.update_arguments(update) == (order_id, 'filled', order.change_time)
@@ -1,3 +1,4 @@
+import json
 import uuid
 
 
@@ -7,3 +8,28 @@ def is_valid_uuid(uuid_to_test, version=4):
     except ValueError:
         return False
     return str(uuid_obj) == uuid_to_test
+
+
+class MemorySocket:
+    def __init__(self, name, incoming=()):
+        self.client = name
+        self.frames = []
+        self.incoming = list(incoming)
+        self.scope = {'subprotocols': []}
+        self.query_params = {}
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def receive(self):
+        if not self.incoming:
+            return {'type': 'websocket.disconnect'}
+        frame = self.incoming.pop(0)
+        return {'type': 'websocket.receive', 'text': json.dumps(frame)}
+
+    async def send_text(self, text):
+        self.frames.append(json.loads(text))
+
+
+async def discard(inserts, updates):
+    pass